@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""基准脚本共用的部分：把 src 加入 sys.path，以及不写文件的假 store
+
+各脚本在导入 function 之前 import _common（脚本所在目录就在 sys.path 中）。
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+
+class FakeStore:
+    """代替 save.CaptionStore 交给 CaptureState：不写文件
+
+    提交的片段交给 on_save(text)，没有 on_save 时记在 fragments 中。
+    """
+
+    is_paused = False
+
+    def __init__(self, on_save=None):
+        self.on_save = on_save
+        self.fragments = []
+
+    async def save_to_cache(self, text):
+        if self.on_save is not None:
+            self.on_save(text)
+        else:
+            self.fragments.append(text)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""追加 10 万条字幕，比较原 safe_save_caption（每次读取整个文件）与持久追加器的单次开销
+
+原实现是 O(n²)，默认只跑前 10000 条。
+用法: python benchmarks/bench_appender.py [--count 100000] [--old-count 10000]
+"""
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+import _common  # 把 src 加入 sys.path
+
+from function.appender import CaptionAppender
+
+CAPTION = "This is a fairly typical caption line captured from Live Captions."
+
+
+def old_save(filename, caption):
+    """main_vertical_control_fixed 原来的写法"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    existing_content = ""
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            existing_content = f.read()
+    with open(filename, 'a', encoding='utf-8') as f:
+        if existing_content and not existing_content.endswith('\n'):
+            f.write('\n')
+        f.write(f"[{timestamp}] {caption}\n")
+
+
+def run(name, append, count, blocks=10):
+    block = max(1, count // blocks)
+    costs = []
+    start = time.perf_counter()
+    for i in range(count):
+        append(CAPTION)
+        if (i + 1) % block == 0:
+            now = time.perf_counter()
+            costs.append((now - start) / block * 1e6)
+            start = now
+    print(f"{name:<9} per-append us by block of {block}: " + " ".join(f"{c:7.1f}" for c in costs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--old-count", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_file = os.path.join(tmp, "old_captions.txt")
+        run("old", lambda c: old_save(old_file, c), args.old_count)
+
+        new_file = os.path.join(tmp, "new_captions.txt")
+        appender = CaptionAppender(new_file)
+        run("appender", appender.write_caption, args.count)
+        appender.close()
+
+
+if __name__ == "__main__":
+    main()
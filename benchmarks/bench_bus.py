@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""句子发布/订阅的延迟和丢弃策略测量
+
+1. 进程内：--subscribers 个订阅者用 async for 读取，测量 publish 到订阅者拿到句子的延迟，
+   以及没有订阅者时 publish 的开销。
+2. 慢订阅者：队列长度 --maxsize，分别使用三种满队列策略，确认发布端不被阻塞、丢弃计数正确。
+3. 本机 socket：ControlServer 推送 NDJSON，测量 publish 到客户端读到一行的延迟。
+用法: python benchmarks/bench_bus.py [--sentences 20000] [--subscribers 8] [--maxsize 64]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import _common  # 把 src 加入 sys.path
+
+from function.save import Sentence
+from function.bus import SentenceBus, sentence_bus, POLICIES
+from function.control import ControlServer, open_connection, encode
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def sentences(count):
+    stamp = time.time()
+    return [Sentence(f"Sentence number {n} of the benchmark.", stamp + n, stamp + n + 1) for n in range(count)]
+
+
+async def publisher(bus, items, published, batch=4):
+    """按批发布，每批之间让出事件循环，模拟 write_sentences 的调用方式"""
+    for n in range(0, len(items), batch):
+        published[bus.seq + 1] = time.perf_counter()
+        bus.publish(items[n:n + batch], "bench", "bench_captions.txt")
+        await asyncio.sleep(0)
+
+
+async def in_process(args):
+    bus = SentenceBus()
+    items = sentences(args.sentences)
+
+    start = time.perf_counter()
+    for n in range(0, len(items), 4):
+        bus.publish(items[n:n + 4], "bench")
+    idle = (time.perf_counter() - start) / len(items)
+
+    published, latencies = {}, []
+
+    async def consume(subscription):
+        count = 0
+        async for event in subscription:
+            count += 1
+            if event.seq in published:
+                latencies.append(time.perf_counter() - published[event.seq])
+        return count
+
+    subscriptions = [bus.subscribe(len(items)) for _ in range(args.subscribers)]
+    consumers = [asyncio.ensure_future(consume(s)) for s in subscriptions]
+    await publisher(bus, items, published)
+    bus.close()
+    counts = await asyncio.gather(*consumers)
+    print(f"publish with no subscribers: {idle * 1e9:.0f} ns/sentence")
+    print(f"{args.subscribers} subscribers: received {min(counts)}/{len(items)} each, "
+          f"latency p50={percentile(latencies, 0.5) * 1e6:.1f}us p99={percentile(latencies, 0.99) * 1e6:.1f}us")
+
+
+async def slow_subscribers(args):
+    items = sentences(args.sentences)
+    for policy in POLICIES:
+        bus = SentenceBus()
+        subscription = bus.subscribe(args.maxsize, policy)
+        start = time.perf_counter()
+        for n in range(0, len(items), 4):
+            bus.publish(items[n:n + 4])
+        elapsed = time.perf_counter() - start
+        first = subscription.get_nowait()
+        print(f"slow subscriber {policy:>11}: publish {elapsed / len(items) * 1e9:5.0f} ns/sentence, "
+              f"queued {subscription.pending() + 1}, dropped {subscription.dropped}, "
+              f"first seq {first.seq}, closed {subscription.closed}")
+
+
+async def over_socket(args, directory):
+    address = os.path.join(directory, "bus.sock") if os.name != "nt" else "127.0.0.1:47898"
+    server = await ControlServer(None, address).start()
+    reader, writer = await open_connection(address)
+    writer.write(encode({"cmd": "stream", "maxsize": args.sentences}))
+    await writer.drain()
+    await reader.readline()
+
+    items = sentences(args.sentences)
+    published, latencies = {}, []
+    task = asyncio.ensure_future(publisher(sentence_bus, items, published))
+    for _ in items:
+        event = json.loads(await reader.readline())
+        if event["seq"] in published:
+            latencies.append(time.perf_counter() - published[event["seq"]])
+    await task
+    writer.close()
+    await server.close()
+    print(f"unix socket NDJSON: {len(items)} sentences, "
+          f"latency p50={percentile(latencies, 0.5) * 1e3:.3f}ms p99={percentile(latencies, 0.99) * 1e3:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=20000)
+    parser.add_argument("--subscribers", type=int, default=8)
+    parser.add_argument("--maxsize", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(in_process(args))
+    asyncio.run(slow_subscribers(args))
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(over_socket(args, directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""比较整文件读入与 mmap 按需解析两种缓存回放方式的耗时和峰值内存
+
+生成指定大小的二进制缓存（默认每 20 个片段一个检查点，--no-checkpoints 时全部未合并），
+每种方式在独立子进程中回放两次：一次计时并取 ru_maxrss（含 mmap 映射进来的页缓存，
+可被系统随时回收），一次用 tracemalloc 统计 Python 堆的峰值（仅 Linux/macOS）。
+用法: python benchmarks/bench_cache_replay.py [--size-mb 100] [--no-checkpoints]
+      python benchmarks/bench_cache_replay.py --size-mb 500
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+
+from _common import SRC
+
+from function import save
+from function.journal import Journal, FRAGMENT, CHECKPOINT, decode
+
+_WORDS = ("the", "meeting", "starts", "now", "we", "will", "review", "numbers", "for",
+          "this", "quarter", "and", "then", "talk", "about", "plans", "我们", "今天", "会议")
+
+
+def generate(path, size_mb, checkpoint_every, seed=0):
+    """写一个约 size_mb 大小的缓存文件"""
+    rng = random.Random(seed)
+    journal = Journal()
+    target = size_mb * 1024 * 1024
+    written = 0
+    count = 0
+    t = 0.0
+    with open(path, "wb") as f:
+        chunk = []
+        while written < target:
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(2, 8))]
+            text = " " + " ".join(words)
+            if rng.random() < 0.2:
+                text += rng.choice(".?!")
+            t += 0.4
+            record = journal.fragment(text, t, 1.7e9 + t)
+            count += 1
+            if checkpoint_every and count % checkpoint_every == 0:
+                record += journal.checkpoint("", t, 1.7e9 + t)
+            chunk.append(record)
+            written += len(record)
+            if len(chunk) >= 4096:
+                f.write(b"".join(chunk))
+                chunk = []
+        f.write(b"".join(chunk))
+    return count
+
+
+def replay_read(path, assembler):
+    """之前的做法：整个文件读入内存，收集最后一个检查点之后的记录再回放"""
+    with open(path, "rb") as f:
+        data = f.read()
+    pending = []
+    for record in decode(data):
+        if record.kind == CHECKPOINT:
+            pending = [record]
+        elif record.kind == FRAGMENT:
+            pending.append(record)
+    for record in pending:
+        if record.kind == CHECKPOINT:
+            assembler.tail = ""
+            assembler.marks = []
+        if record.text:
+            yield from assembler.feed(record.text, record.wall)
+
+
+def worker(mode, path, trace=False):
+    if trace:
+        tracemalloc.start()
+    replay = replay_read if mode == "read" else save.replay_cache
+    assembler = save.SentenceAssembler()
+    start = time.perf_counter()
+    sentences = 0
+    for _ in replay(path, assembler):
+        sentences += 1
+    sentences += len(assembler.finish())
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+    print(f"{elapsed} {peak} {sentences}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--no-checkpoints", action="store_true")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker, trace=args.trace)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_cache.tmp")
+        start = time.perf_counter()
+        fragments = generate(path, args.size_mb, 0 if args.no_checkpoints else 20)
+        size = os.path.getsize(path)
+        print(f"cache: {size / 1e6:.0f} MB, {fragments:,} fragments, "
+              f"generated in {time.perf_counter() - start:.1f}s")
+
+        # 只导入模块的进程的内存，用于扣除解释器本身的占用
+        probe = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, resource; sys.path.insert(0, %r); import function.save; "
+             "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+             % SRC],
+            capture_output=True, text=True, check=True)
+        baseline = int(probe.stdout)
+        for mode in ("read", "mmap"):
+            command = [sys.executable, __file__, "--worker", mode, path]
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+            elapsed, peak, sentences = result.stdout.split()
+            elapsed, peak = float(elapsed), int(peak)
+            traced = subprocess.run(command + ["--trace"], capture_output=True, text=True, check=True)
+            heap = int(traced.stdout.split()[1])
+            print(f"{mode:>5}: {elapsed:6.2f}s  {size / 1e6 / elapsed:6.1f} MB/s  "
+                  f"RSS +{(peak - baseline) / 1024:7.1f} MiB  heap peak {heap / 1024:7.1f} MiB  "
+                  f"sentences={int(sentences):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""回放片段流，比较逐条 write+flush 与批量缓存写入的吞吐量和系统调用数
+
+片段默认由合成会话经过 CaptionModel 产生，也可以用 --fragments 指定每行一个片段的文件。
+系统调用数取自 /proc/self/io 的 syscw（仅 Linux）。
+用法: python benchmarks/bench_cache_writer.py [--minutes 60] [--fragments file.txt]
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function import save
+from function.texthook import CaptionModel
+from function.source import synthetic_snapshots
+
+
+def synthetic_fragments(minutes):
+    model = CaptionModel()
+    fragments = []
+    for t, window in synthetic_snapshots(minutes * 60, seed=1):
+        text = model.update(window.strip(), t).replace("\n", " ")
+        if len(text.strip()) > 1:
+            fragments.append(text)
+    return fragments
+
+
+def write_syscalls():
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("syscw:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def before(path, fragments):
+    """原来的实现：每个片段一次 aiofiles write + flush，并打印"""
+    import aiofiles
+    handle = await aiofiles.open(path, "a+", encoding="utf-8")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for text in fragments:
+            timestamp = time.strftime("%H:%M:%S", time.localtime())
+            await handle.write(f"{timestamp}|{text}\n")
+            await handle.flush()
+            print(f"Saved to cache file: {text}")
+    await handle.close()
+
+
+async def after(path, fragments):
+    """批量写入：save_to_cache 放入队列，close_cache 等待写完"""
+    save.reset_for_new_recording()
+    save.store.cache_filename = path
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for text in fragments:
+            await save.save_to_cache(text)
+        await save.close_cache()
+
+
+def measure(name, coro_func, fragments):
+    fd, path = tempfile.mkstemp(suffix="_cache.tmp")
+    os.close(fd)
+    try:
+        calls = write_syscalls()
+        start = time.perf_counter()
+        asyncio.run(coro_func(path, fragments))
+        elapsed = time.perf_counter() - start
+        calls = None if calls is None else write_syscalls() - calls
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    per_fragment = "n/a" if calls is None else f"{calls / len(fragments):.3f}"
+    print(f"{name:<7} fragments/s={len(fragments) / elapsed:>10,.0f} "
+          f"write_syscalls/fragment={per_fragment} bytes={size}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0, help="合成会话时长（分钟）")
+    parser.add_argument("--fragments", help="每行一个片段的录制文件")
+    args = parser.parse_args()
+
+    if args.fragments:
+        with open(args.fragments, encoding="utf-8") as f:
+            fragments = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        fragments = synthetic_fragments(args.minutes)
+
+    try:
+        import aiofiles  # noqa: F401  原实现依赖 aiofiles
+        measure("before", before, fragments)
+    except ImportError:
+        print("before  skipped (aiofiles not installed)")
+    measure("after", after, fragments)
+
+
+if __name__ == "__main__":
+    main()
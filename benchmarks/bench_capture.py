@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""对比轮询与事件驱动两种捕获方式的空闲开销和变化到缓存的延迟
+
+延迟按词统计：每个词从出现在假来源中到随提交的片段保存到缓存（假的 store）的时间。
+用法: python benchmarks/bench_capture.py [--speech 3] [--idle 6]
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from _common import FakeStore
+
+from function import texthook
+from function.source import FakeCaptionSource
+
+
+async def run_mode(event_driven, speech_seconds, idle_seconds, seed=1):
+    """用假来源跑一次 hook，返回读取次数、空闲 CPU 和延迟列表"""
+    source = FakeCaptionSource(event_driven=event_driven)
+    latencies = []
+    emitted_at = {}
+
+    def saved(text):
+        now = time.monotonic()
+        for word in text.split():
+            if word in emitted_at:
+                latencies.append(now - emitted_at.pop(word))
+
+    state = texthook.CaptureState(FakeStore(saved))
+    exit_event = asyncio.Event()
+    task = asyncio.ensure_future(texthook.hook("bench", exit_event, source=source, state=state))
+    await asyncio.sleep(0.05)
+
+    rng = random.Random(seed)
+    text = ""
+    end = time.monotonic() + speech_seconds
+    n = 0
+    while time.monotonic() < end:
+        # 每个词都不同，提交的片段中的词能对应到它出现的时间
+        n += 1
+        word = f"w{n}x{rng.randint(0, 999)}"
+        text += " " + word
+        emitted_at[word] = time.monotonic()
+        source.emit(text)
+        await asyncio.sleep(rng.uniform(0.1, 0.5))
+
+    # 空闲阶段：没有任何新字幕
+    reads_before = source.reads
+    cpu_before = time.process_time()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_before
+    idle_reads = source.reads - reads_before
+
+    exit_event.set()
+    await task
+    return source.reads, idle_reads, idle_cpu, latencies
+
+
+def report(name, result, idle_seconds):
+    reads, idle_reads, idle_cpu, latencies = result
+    latencies = sorted(latencies) or [0.0]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<8} reads={reads:<5} idle_wakeups/min={idle_reads * 60 / idle_seconds:7.1f} "
+          f"idle_cpu={idle_cpu * 1000:6.2f}ms "
+          f"latency_p50={statistics.median(latencies) * 1000:6.1f}ms p99={p99 * 1000:6.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speech", type=float, default=3.0, help="模拟说话阶段时长（秒）")
+    parser.add_argument("--idle", type=float, default=6.0, help="模拟静默阶段时长（秒）")
+    args = parser.parse_args()
+
+    polling = asyncio.run(run_mode(False, args.speech, args.idle))
+    events = asyncio.run(run_mode(True, args.speech, args.idle))
+    report("polling", polling, args.idle)
+    report("events", events, args.idle)
+
+
+if __name__ == "__main__":
+    main()
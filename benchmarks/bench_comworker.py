@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""UIA 调用阻塞事件循环的程度：直接在事件循环中调用与交给 ComWorker 线程的比较
+
+假的 UI Automation 树每次读取耗时 --read-ms 毫秒（模拟跨进程 COM 调用），其中 --slow-rate 的读取耗时
+--slow-ms 毫秒，另有一次读取卡住 --hang 秒。RecordingSession 回放合成字幕，同时一个探测任务每 5ms 醒来一次，
+记录实际醒来比预定晚了多少（事件循环被阻塞的时间），输出直方图、p50/p99/最大值，
+以及保存的句子数、读取超时次数。字幕在单独的线程中回放（Live Captions 不会等录制程序），
+事件循环被阻塞期间滚出窗口的句子会丢失。界面命令、文件写入和控制接口都在这个事件循环上，延迟与探测任务相同。
+用法: python benchmarks/bench_comworker.py [--seconds 120] [--speed 10] [--slow-rate 0.05] [--slow-ms 300] [--hang 5]
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import threading
+import tempfile
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function.comworker import ComWorker
+from function.element import ElementCache, FakeAutomationTree
+from function.recorder import RecordingSession
+from function.source import UIACaptionSource, synthetic_snapshots
+
+BUCKETS_MS = (0.5, 1, 5, 10, 50, 100, 500, 1000, float("inf"))
+PROBE_INTERVAL = 0.005
+
+
+class SlowTree(FakeAutomationTree):
+    """读取有固定耗时，偶尔很慢，第 hang_at 次读取卡住 hang 秒"""
+
+    def __init__(self, read_ms, slow_rate, slow_ms, hang, hang_at=50, seed=1):
+        super().__init__()
+        self.read_cost = read_ms / 1000
+        self.slow_rate = slow_rate
+        self.slow_cost = slow_ms / 1000
+        self.hang = hang
+        self.hang_at = hang_at
+        self.rng = random.Random(seed)
+
+    def read(self, element):
+        text = super().read(element)
+        if self.reads == self.hang_at:
+            time.sleep(self.hang)
+        elif self.rng.random() < self.slow_rate:
+            time.sleep(self.slow_cost)
+        else:
+            time.sleep(self.read_cost)
+        return text
+
+
+class FastUIACaptionSource(UIACaptionSource):
+    """字幕按 speed 倍速回放，字幕模型的时间也按同样的倍数放大（与 ReplayCaptionSource 一致）"""
+
+    def __init__(self, speed, **kwargs):
+        super().__init__(**kwargs)
+        self.speed = speed
+
+    def clock(self):
+        return time.perf_counter() * self.speed
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def histogram(lags):
+    counts = [0] * len(BUCKETS_MS)
+    for lag in lags:
+        ms = lag * 1000
+        counts[next(n for n, bound in enumerate(BUCKETS_MS) if ms <= bound)] += 1
+    lines, low = [], 0
+    for bound, count in zip(BUCKETS_MS, counts):
+        label = f"{low:g}-{bound:g}ms" if bound != float("inf") else f">{low:g}ms"
+        bar = "#" * (0 if not count else max(1, round(40 * count / len(lags))))
+        lines.append(f"        {label:>12} {count:7d} {bar}")
+        low = bound
+    return "\n".join(lines)
+
+
+async def run(args, worker, directory):
+    tree = SlowTree(args.read_ms, args.slow_rate, args.slow_ms, args.hang)
+    source = FastUIACaptionSource(args.speed, cache=ElementCache(tree), worker=worker)
+    if worker is None:
+        source.worker = None  # 原来的做法：在事件循环中直接调用
+    session = RecordingSession(directory, lambda: source)
+    await session.start()
+
+    lags, running = [], True
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while running:
+            due = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(max(0.0, loop.time() - due))
+
+    def play():
+        # Live Captions 是另一个进程，读取卡住时字幕照样滚动，所以回放不在事件循环中
+        last = 0.0
+        for t, text in synthetic_snapshots(args.seconds, seed=3):
+            time.sleep((t - last) / args.speed)
+            last = t
+            tree.emit(text)
+
+    probe_task = asyncio.ensure_future(probe())
+    player = threading.Thread(target=play)
+    player.start()
+    await asyncio.get_running_loop().run_in_executor(None, player.join)
+    await asyncio.sleep(0.5)
+    running = False
+    await probe_task
+    await session.stop()
+    with open(session.filename, encoding="utf-8") as f:
+        sentences = sum(1 for line in f if "] " in line)
+    return lags, sentences, tree.reads, worker.stats() if worker is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=120.0, help="合成字幕时长")
+    parser.add_argument("--speed", type=float, default=10.0, help="回放倍速")
+    parser.add_argument("--read-ms", type=float, default=1.0, help="普通读取的耗时")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="慢读取的比例")
+    parser.add_argument("--slow-ms", type=float, default=300.0, help="慢读取的耗时")
+    parser.add_argument("--hang", type=float, default=5.0, help="卡住的那次读取的秒数")
+    args = parser.parse_args()
+
+    for name, worker in (("on loop", None), ("worker", ComWorker(thread_init=lambda: None))):
+        with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                lags, sentences, reads, stats = asyncio.run(run(args, worker, directory))
+        if worker is not None:
+            worker.stop()
+        print(f"{name:>8}: loop lag p50={percentile(lags, 0.5) * 1e3:.2f}ms p99={percentile(lags, 0.99) * 1e3:.1f}ms "
+              f"max={max(lags) * 1e3:.0f}ms, {len(lags)} probes, {reads} reads, {sentences} sentences saved"
+              + (f", worker {stats['calls']} calls / {stats['timeouts']} timeouts / slowest {stats['slowest']:.1f}s"
+                 if stats else ""))
+        print(histogram(lags))
+
+
+if __name__ == "__main__":
+    main()
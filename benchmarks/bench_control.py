@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""本机控制接口的冒烟测试和延迟测量
+
+在临时 Unix socket（Windows 上是本机 TCP 端口）上启动 ControlServer，用合成会话录制；
+--streams 个客户端订阅新句子，--clients 个客户端同时反复发送 status/pause/resume/flush，
+最后检查每个订阅者都收到了写入最终文件的全部句子，并输出命令往返延迟。
+用法: python benchmarks/bench_control.py [--clients 8] [--streams 4] [--requests 200] [--seconds 120]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+
+import _common  # 把 src 加入 sys.path
+
+from function.recorder import RecordingSession
+from function.source import SyntheticCaptionSource
+from function.control import ControlServer, open_connection, encode
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def subscriber(address, received, ready):
+    reader, writer = await open_connection(address)
+    writer.write(encode({"cmd": "stream"}))
+    await writer.drain()
+    await reader.readline()
+    ready.release()
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        received.append(json.loads(line)["text"])
+    writer.close()
+
+
+async def commander(address, requests, latencies, errors):
+    reader, writer = await open_connection(address)
+    for n in range(requests):
+        command = ("status", "pause", "status", "resume", "flush")[n % 5]
+        sent = time.perf_counter()
+        writer.write(encode({"cmd": command, "id": n}))
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent)
+        if not reply["ok"] or reply["id"] != n:
+            errors.append(reply)
+    writer.close()
+
+
+async def run(args, directory):
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        address = os.path.join(directory, "control.sock")
+    else:
+        address = "127.0.0.1:47899"
+    recorder = RecordingSession(directory, lambda: SyntheticCaptionSource(args.seconds, speed=args.speed))
+    server = await ControlServer(recorder, address).start()
+
+    ready = asyncio.Semaphore(0)
+    streams = [[] for _ in range(args.streams)]
+    subscribers = [asyncio.ensure_future(subscriber(address, received, ready)) for received in streams]
+    for _ in streams:
+        await ready.acquire()
+
+    await recorder.start()
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(commander(address, args.requests, latencies, errors) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    await recorder.resume()
+    await recorder.wait()
+    await server.close()
+    await asyncio.gather(*subscribers)
+
+    with open(recorder.filename, encoding="utf-8") as f:
+        saved = [line.split("] ", 1)[1].rstrip("\n") for line in f if "] " in line]
+    complete = sum(received == saved for received in streams)
+    print(f"{len(latencies)} commands from {args.clients} clients in {elapsed:.2f}s, errors={len(errors)}  "
+          f"latency p50={percentile(latencies, 0.5) * 1000:.3f}ms p99={percentile(latencies, 0.99) * 1000:.3f}ms")
+    print(f"{len(saved)} sentences saved, {complete}/{len(streams)} subscribers received all of them")
+    return 0 if not errors and complete == len(streams) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of the synthetic session")
+    parser.add_argument("--speed", type=float, default=60.0, help="synthetic playback speed")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        sys.exit(asyncio.run(run(args, directory)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""合成 8 小时会话下，比较字符串集合与有界指纹索引的内存和去重行为
+
+用法: python benchmarks/bench_dedup.py [--hours 8] [--sentences-per-minute 20]
+"""
+import random
+import argparse
+import tracemalloc
+
+import _common  # 把 src 加入 sys.path
+
+from function.dedup import DedupIndex
+
+_WORDS = ("we", "should", "review", "the", "numbers", "for", "this", "quarter", "and", "then",
+          "talk", "about", "plans", "next", "week", "customer", "feedback", "release", "schedule")
+_REPEATS = ("Yes.", "Thank you.", "Okay.", "Right.", "Can you hear me?")
+
+
+def session(hours, per_minute, seed=0):
+    """生成 (秒, 句子)：大部分是不同的句子，夹杂常见的短句重复"""
+    rng = random.Random(seed)
+    total = int(hours * 60 * per_minute)
+    step = 60.0 / per_minute
+    for i in range(total):
+        if rng.random() < 0.1:
+            sentence = rng.choice(_REPEATS)
+        else:
+            sentence = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+        yield i * step, sentence
+
+
+def run(name, index, sentences, clock):
+    tracemalloc.start()
+    saved = 0
+    for t, sentence in sentences:
+        clock[0] = t
+        if sentence not in index:
+            index.add(sentence)
+            saved += 1
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} entries={len(index):<7} saved={saved:<7} "
+          f"retained={current / 1024:9.1f}KiB peak={peak / 1024:9.1f}KiB")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--sentences-per-minute", type=float, default=20.0)
+    args = parser.parse_args()
+
+    # 每次重新生成句子，让集合保留的字符串计入内存
+    clock = [0.0]
+    run("set", set(), session(args.hours, args.sentences_per_minute), clock)
+    index = run("index", DedupIndex(clock=lambda: clock[0]), session(args.hours, args.sentences_per_minute), clock)
+    print("index stats:", index.stats())
+
+
+if __name__ == "__main__":
+    main()
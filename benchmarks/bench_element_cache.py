@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""ElementCache 在 Live Captions 关闭、重启时的行为（假 UI Automation 树，Linux 上可运行）
+
+1. 模拟时钟：每 0.3 秒读取一次，中途关闭 Live Captions --outage 秒再打开，统计查找次数、
+   重试间隔和记录的中断时长；再测试窗口还在但滚动区域被重建的情况。
+2. 真实录制：RecordingSession + UIACaptionSource(FakeAutomationTree)，回放合成字幕，
+   录制中关闭 Live Captions 几秒再用新的字幕流重新打开，检查录制没有中断、
+   前后两段的句子都写入了文件、重新打开后事件订阅恢复。中断时长从第一次发现读取失败时算起
+   （事件模式下至少每 EVENT_FALLBACK 秒读取一次），所以可能比实际关闭的时间短。
+3. 每次读取的额外开销：缓存的句柄检查 + 读取，与直接读取元素比较。
+用法: python benchmarks/bench_element_cache.py [--outage 60] [--live-outage 3]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function.element import ElementCache, FakeAutomationTree
+from function.recorder import RecordingSession
+from function.source import UIACaptionSource, synthetic_snapshots
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulated(outage, interval=0.3):
+    """模拟时钟下的一次关闭/打开，返回是否符合预期"""
+    tree = FakeAutomationTree()
+    clock = Clock()
+    cache = ElementCache(tree, clock=clock)
+    tree.text = "hello"
+    reads = [cache.read() for _ in range(100)]
+    initial_searches = tree.searches
+
+    tree.close()
+    closed_at = clock.now
+    retries = []
+    while clock.now < closed_at + outage:
+        clock.now += interval
+        before = tree.searches
+        if cache.read() is not None:
+            break
+        if tree.searches != before:
+            retries.append(clock.now - closed_at)
+    tree.open("back again")
+    while cache.read() is None:
+        clock.now += interval
+    recovered = clock.now - closed_at - outage
+    polls = int(outage / interval)
+
+    gaps = [b - a for a, b in zip(retries, retries[1:])]
+    print(f"steady state: 100 reads, {initial_searches} searches (window + scrollviewer once)")
+    print(f"outage {outage:.0f}s polled every {interval}s: {len(retries)} searches instead of {polls}, "
+          f"retry gaps {', '.join(f'{g:.1f}' for g in gaps[:7])}{' ...' if len(gaps) > 7 else ''}s")
+    print(f"recovered {recovered:.1f}s after Live Captions came back, stats {cache.stats()}")
+
+    # 窗口还在、滚动区域被重建：读取失败一次，下一次读取立即重新查找
+    tree.rebuild()
+    failed = cache.read()
+    clock.now += interval
+    text = cache.read()
+    print(f"scrollviewer rebuilt: first read {failed!r}, next read {text!r}, resolves {cache.resolves}")
+
+    stats = cache.stats()
+    return (all(r == "hello" for r in reads) and initial_searches == 2 and stats["outages"] == 2
+            and outage <= cache.outages[0] <= outage + recovered and text == "back again"
+            and cache.resolves == 3 and len(retries) < polls / 5)
+
+
+async def live(outage, speed, directory):
+    """真实事件循环中录制，Live Captions 中途关闭 outage 秒后用新的字幕流重新打开"""
+    tree = FakeAutomationTree()
+    cache = ElementCache(tree)
+    source = UIACaptionSource(cache=cache)
+    session = RecordingSession(directory, lambda: source)
+    await session.start()
+
+    async def play(seed, seconds):
+        last = 0.0
+        for t, text in synthetic_snapshots(seconds, seed=seed):
+            await asyncio.sleep((t - last) / speed)
+            last = t
+            tree.emit(text)
+
+    await play(1, 60)
+    await session.flush()
+    before = len(read_sentences(session.filename))
+    notifications = source.notifications
+
+    tree.close()
+    await asyncio.sleep(outage)
+    state_during = session.state
+    tree.open()
+    await play(2, 60)
+    await asyncio.sleep(0.2)
+    await session.flush()
+    after = len(read_sentences(session.filename))
+    resubscribed = source.event_driven and source.notifications > notifications
+    await session.stop()
+
+    sentences = read_sentences(session.filename)
+    second = [text for t, text in synthetic_snapshots(60, seed=2)][-1].replace("\n", " ")
+    stats = cache.stats()
+    report = (f"live recording: {before} sentences before the outage, {after - before} after, "
+              f"state during outage {state_during!r}, events resubscribed {resubscribed}\n"
+              f"    outage {stats['outage_seconds']:.2f}s recorded for a {outage:.1f}s gap, resolves {stats['resolves']}, "
+              f"failed resolves {stats['failed_resolves']}, searches {tree.searches}")
+    # 第二段字幕流最后的句子应当写入了文件
+    saved = sentences[-1] in second
+    ok = state_during == "recording" and before > 0 and after > before and resubscribed \
+        and stats["outages"] == 1 and stats["resolves"] == 2 and saved
+    return ok, report
+
+
+def read_sentences(filename):
+    with open(filename, encoding="utf-8") as f:
+        return [line.split("] ", 1)[1].strip() for line in f if "] " in line]
+
+
+def overhead(count=200000):
+    tree = FakeAutomationTree()
+    tree.text = "hello"
+    cache = ElementCache(tree)
+    element = cache.get()
+    start = time.perf_counter()
+    for _ in range(count):
+        tree.read(element)
+    direct = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        cache.read()
+    cached = time.perf_counter() - start
+    print(f"per read: direct {direct / count * 1e9:.0f} ns, through the cache {cached / count * 1e9:.0f} ns "
+          f"(fake tree; a real Name read is a cross-process COM call of ~0.1-1 ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outage", type=float, default=60.0, help="模拟时钟下 Live Captions 关闭的秒数")
+    parser.add_argument("--live-outage", type=float, default=3.0, help="真实录制中 Live Captions 关闭的秒数")
+    parser.add_argument("--speed", type=float, default=20.0, help="真实录制中字幕回放的倍速")
+    args = parser.parse_args()
+
+    ok = simulated(args.outage)
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            live_ok, report = asyncio.run(live(args.live_outage, args.speed, directory))
+    print(report)
+    ok = live_ok and ok
+    overhead()
+    print("ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""用合成或录制的快照驱动 hook，测量无等待回放下的处理吞吐量
+
+用法:
+    python benchmarks/bench_hook_throughput.py --minutes 60
+    python benchmarks/bench_hook_throughput.py --replay snapshots.jsonl [--speed 10]
+"""
+import time
+import asyncio
+import argparse
+
+from _common import FakeStore
+
+from function import texthook
+from function.source import ReplayCaptionSource, SyntheticCaptionSource, load_snapshots
+
+
+async def run(source):
+    store = FakeStore()
+    state = texthook.CaptureState(store)
+    start = time.perf_counter()
+    await texthook.hook("bench", asyncio.Event(), source=source, state=state)
+    return time.perf_counter() - start, store.fragments
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0, help="合成会话时长（分钟）")
+    parser.add_argument("--language", default="en", choices=["en", "zh"])
+    parser.add_argument("--replay", help="回放 RecordingCaptionSource 录制的快照文件")
+    parser.add_argument("--speed", type=float, default=None, help="回放倍速，默认不等待")
+    args = parser.parse_args()
+
+    if args.replay:
+        source = ReplayCaptionSource(load_snapshots(args.replay), speed=args.speed)
+    else:
+        source = SyntheticCaptionSource(args.minutes * 60, language=args.language, seed=1)
+
+    import builtins
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: None  # 热路径上的 print 会淹没测量结果
+    try:
+        elapsed, fragments = asyncio.run(run(source))
+    finally:
+        builtins.print = real_print
+
+    chars = sum(len(f) for f in fragments)
+    print(f"snapshots={source.played} fragments={len(fragments)} chars={chars} "
+          f"elapsed={elapsed:.2f}s snapshots/s={source.played / elapsed:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""全文索引的建立速度、索引大小和查询延迟
+
+生成 --gb GB 的合成字幕文件（约 1 MB 一个，文件名按录制时间排列，词频近似 Zipf 分布，
+其中埋入少量固定词组和中文句子），用 TranscriptIndex 索引，测量索引速度和索引/原文大小之比；
+然后对词组、前缀、时间范围、词组+时间范围、中文词组几类查询各执行 --queries 次，报告 p50/p99 延迟，
+并检查词组查询的结果确实包含该词组。最后追加一批行，测量增量更新的耗时。
+--dir 指定语料目录时可以重复使用上次生成的语料（已有的文件不会重新生成）。
+用法: python benchmarks/bench_index.py [--gb 10] [--dir DIR] [--db FILE] [--queries 200]
+"""
+import os
+import sys
+import time
+import random
+import itertools
+import argparse
+import tempfile
+
+import _common  # 把 src 加入 sys.path
+
+from function.index import TranscriptIndex
+
+FILE_SIZE = 1 << 20
+PHRASES = ["quarterly revenue forecast", "share your screen", "action items for next week"]
+CHINESE = ["我们下周再讨论这个问题。", "请大家把屏幕共享出来。", "这个季度的收入预测不错。"]
+START = time.mktime((2025, 1, 1, 9, 0, 0, 0, 0, -1))
+
+
+def vocabulary(size=20000, seed=1):
+    rng = random.Random(seed)
+    letters = "etaoinshrdlucmfwypvbgkqjxz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(letters, k=rng.randint(2, 9))))
+    words = sorted(words, key=len)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(size)))
+    return words, weights
+
+
+def write_corpus(directory, total_bytes, seed=5):
+    """生成合成字幕文件，每个文件是一次约 4 小时的录制，返回 (文件列表, 总字节数)"""
+    words, weights = vocabulary()
+    rng = random.Random(seed)
+    files, written, n = [], 0, 0
+    while written < total_bytes:
+        start = START + n * 6 * 3600  # 每天 4 个文件，每个从整点开始
+        name = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(start)) + "_captions.txt"
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            lines, size, clock = [], 0, 0.0
+            while size < FILE_SIZE:
+                roll = rng.random()
+                if roll < 0.002:
+                    text = " ".join(rng.choices(words, cum_weights=weights, k=4)) + " " + rng.choice(PHRASES) + "."
+                elif roll < 0.004:
+                    text = rng.choice(CHINESE)
+                else:
+                    text = " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(5, 14))) + "."
+                stamp = time.strftime("%H:%M:%S", time.localtime(start + clock))
+                line = f"[{stamp}] {text}\n"
+                lines.append(line)
+                size += len(line.encode("utf-8"))
+                clock += 1.0  # 一个文件约 14000 行，约 4 小时
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(path + ".tmp", path)
+        files.append(path)
+        written += os.path.getsize(path)
+        n += 1
+    return files, written
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def measure(index, name, make_query, count, check=None):
+    latencies, hits, wrong = [], 0, 0
+    for n in range(count):
+        query, start, end = make_query(n)
+        began = time.perf_counter()
+        results = index.search(query, start, end, limit=20)
+        latencies.append(time.perf_counter() - began)
+        hits += len(results)
+        if check is not None:
+            wrong += sum(1 for stamp, path, text in results if not check(query, stamp, text))
+    print(f"{name:>22}: p50={percentile(latencies, 0.5) * 1e3:7.2f}ms p99={percentile(latencies, 0.99) * 1e3:7.2f}ms "
+          f"avg hits {hits / count:5.1f}" + (f", wrong {wrong}" if check is not None else ""))
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gb", type=float, default=10.0, help="合成语料大小（GB）")
+    parser.add_argument("--dir", help="语料目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--db", help="索引文件（默认在临时目录中；指定已有的索引时只增量更新）")
+    parser.add_argument("--queries", type=int, default=200, help="每类查询的次数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp:
+        directory = args.dir or temp
+        os.makedirs(directory, exist_ok=True)
+        began = time.perf_counter()
+        files, total = write_corpus(directory, int(args.gb * (1 << 30)))
+        print(f"corpus: {len(files)} files, {total / (1 << 20):,.0f} MiB ({time.perf_counter() - began:.0f}s to prepare)")
+
+        db = args.db or os.path.join(temp, "index.db")
+        with TranscriptIndex(db) as index:
+            began = time.perf_counter()
+            lines = index.update(files)
+            elapsed = time.perf_counter() - began
+            began = time.perf_counter()
+            index.optimize()
+            optimized = time.perf_counter() - began
+            db_size = sum(os.path.getsize(p) for p in (db, db + "-wal") if os.path.exists(p))
+            print(f"indexed {lines:,} lines in {elapsed:.1f}s: {total / (1 << 20) / elapsed:.1f} MiB/s, "
+                  f"{lines / elapsed:,.0f} lines/s, index {db_size / (1 << 20):,.0f} MiB "
+                  f"({db_size / total:.2f}x the transcripts, optimize {optimized:.1f}s)")
+
+            words, _ = vocabulary()
+            rng = random.Random(11)
+            span = len(files) * 6 * 3600
+            in_text = lambda query, stamp, text: query.strip('"').replace(" ", "") in text.replace(" ", "")
+            window = lambda: START + rng.random() * span
+
+            wrong = measure(index, "phrase", lambda n: (f'"{PHRASES[n % 3]}"', None, None), args.queries, in_text)
+            measure(index, "prefix", lambda n: (rng.choice(words[200:2000])[:3] + "*", None, None), args.queries)
+            measure(index, "two words", lambda n: (" ".join(rng.sample(words[50:500], 2)), None, None), args.queries)
+
+            def time_range(n):
+                start = window()
+                return None, start, start + 3600
+            measure(index, "time range (1h)", time_range, args.queries)
+
+            def phrase_in_range(n):
+                start = window()
+                return f'"{PHRASES[n % 3]}"', start, start + 7 * 86400
+            wrong += measure(index, "phrase + 7 days", phrase_in_range, args.queries,
+                             lambda query, stamp, text: in_text(query, stamp, text))
+            wrong += measure(index, "chinese phrase", lambda n: ("屏幕共享", None, None), args.queries,
+                             lambda query, stamp, text: query in text)
+
+            # 增量更新：向一个新文件追加 100 行（不改动语料，语料可以重复使用）
+            appended = os.path.join(temp, "2099-01-01_00-00-00_captions.txt")
+            with open(appended, "a", encoding="utf-8") as f:
+                for n in range(100):
+                    f.write(f"[00:00:{n % 60:02d}] appended line {n} share your screen.\n")
+            began = time.perf_counter()
+            added = index.update_file(appended)
+            print(f"incremental update: {added} lines in {(time.perf_counter() - began) * 1e3:.1f}ms")
+    return 1 if wrong or added != 100 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
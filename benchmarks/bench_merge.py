@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""比较整段合并（原 merge_cache_to_file）与流式句子拼接的停止耗时和峰值内存
+
+用法: python benchmarks/bench_merge.py [--hours 1 8]
+"""
+import re
+import time
+import argparse
+import tracemalloc
+
+import _common  # 把 src 加入 sys.path
+
+from function.save import SentenceAssembler
+from function.texthook import CaptionModel
+from function.source import synthetic_snapshots
+
+
+def fragments_for(hours):
+    model = CaptionModel()
+    fragments = []
+    for t, window in synthetic_snapshots(hours * 3600, seed=1):
+        text = model.update(window.strip(), t).replace("\n", " ")
+        if len(text.strip()) > 1:
+            fragments.append((time.strftime("%H:%M:%S", time.gmtime(t)), text))
+    return fragments
+
+
+def whole_session_merge(lines_data):
+    """原来的做法：录制时只缓存片段，停止时一次性拼接、切分"""
+    all_text = ""
+    for timestamp, text in lines_data:
+        all_text += text
+    all_text = re.sub(r'\s+', ' ', all_text).strip()
+    sentences = re.split(r'([.!?。！？])', all_text)
+    merged = []
+    i = 0
+    while i < len(sentences):
+        if i < len(sentences) - 1 and sentences[i+1] in '.!?。！？':
+            merged.append((sentences[i] + sentences[i+1]).strip())
+            i += 2
+        else:
+            if sentences[i].strip():
+                merged.append(sentences[i].strip())
+            i += 1
+    return merged
+
+
+def run_whole(fragments):
+    tracemalloc.start()
+    line_buffer = []
+    for fragment in fragments:
+        line_buffer.append(fragment)
+    start = time.perf_counter()
+    count = len(whole_session_merge(line_buffer))
+    stop_time = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, stop_time, peak
+
+
+def run_streaming(fragments):
+    tracemalloc.start()
+    assembler = SentenceAssembler()
+    count = 0
+    for timestamp, text in fragments:
+        count += len(assembler.feed(text, timestamp))
+    start = time.perf_counter()
+    count += len(assembler.finish())
+    stop_time = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, stop_time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    for hours in args.hours:
+        fragments = fragments_for(hours)
+        for name, func in (("whole", run_whole), ("stream", run_streaming)):
+            count, stop_time, peak = func(fragments)
+            print(f"{hours:>4}h {name:<7} fragments={len(fragments):<7} sentences={count:<6} "
+                  f"stop={stop_time * 1000:9.3f}ms peak_mem={peak / 1024:9.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
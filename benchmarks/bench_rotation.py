@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""分段录制的正确性和内存测试
+
+1. 同一段合成字幕分别不分段录制、按句子数 / 大小 / 时长分段录制，按清单顺序拼接各分段，
+   检查与不分段的结果逐句相同（分段之间没有缺口也没有重复），清单中的句子数与文件一致，
+   没有遗留的缓存文件。
+2. 分段录制 --hours 小时的合成字幕，按录制进度采样 tracemalloc 当前内存。
+   去重索引最多记住 DEDUP_MAX_ENTRIES 个句子（合成字幕约 3 小时达到上限），之后内存应保持不变。
+用法: python benchmarks/bench_rotation.py [--minutes 120] [--hours 8]
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function.recorder import RecordingSession
+from function.save import Rotation
+from function.source import SyntheticCaptionSource
+
+
+def read_sentences(filename):
+    with open(filename, encoding="utf-8") as f:
+        return [line.split("] ", 1)[1] for line in f if "] " in line]
+
+
+def record(directory, seconds, rotation, seed=7):
+    """录制一段合成字幕（不输出录制日志），返回 RecordingSession"""
+    async def run():
+        await session.start()
+        await session.wait()
+
+    session = RecordingSession(directory, lambda: SyntheticCaptionSource(seconds, seed=seed), rotation=rotation)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(run())
+    return session
+
+
+def check(name, seconds, rotation, expected):
+    with tempfile.TemporaryDirectory() as directory:
+        session = record(directory, seconds, rotation)
+        with open(session.store.manifest_filename, encoding="utf-8") as f:
+            parts = [json.loads(line) for line in f]
+        got = []
+        counted = True
+        for part in parts:
+            sentences = read_sentences(os.path.join(directory, part["file"]))
+            counted = counted and len(sentences) == part["sentences"]
+            got += sentences
+        leftovers = [n for n in os.listdir(directory) if n.endswith("_cache.tmp")]
+    duplicates = len(got) - len(set(got))
+    print(f"{name:>10}: {len(parts):3d} parts, {len(got)}/{len(expected)} sentences, "
+          f"identical={got == expected}, manifest counts ok={counted}, "
+          f"duplicates={duplicates}, leftover caches={len(leftovers)}")
+    return got == expected and counted and not leftovers
+
+
+def memory_profile(seconds, rotation, points=8):
+    """录制过程中每 50ms 采样一次内存，返回均匀取出的 points 个 (进度, 分段号, 当前内存)"""
+    samples = []
+    source = SyntheticCaptionSource(seconds, seed=3)
+    session = RecordingSession(None, lambda: source, rotation=rotation)
+
+    async def run(directory):
+        session.directory = directory
+        await session.start()
+        while session.state != "stopped":
+            await asyncio.sleep(0.05)
+            samples.append((session.store.part, tracemalloc.get_traced_memory()[0]))
+        await session.wait()
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        tracemalloc.start()
+        with contextlib.redirect_stdout(devnull):
+            asyncio.run(run(directory))
+        tracemalloc.stop()
+    picked = [samples[min(len(samples) - 1, len(samples) * n // points)] for n in range(1, points + 1)]
+    return [(n / points, part, current) for n, (part, current) in zip(range(1, points + 1), picked)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=120.0, help="正确性测试的合成字幕时长")
+    parser.add_argument("--hours", type=float, default=8.0, help="内存测试的合成字幕时长（小时）")
+    args = parser.parse_args()
+    seconds = args.minutes * 60
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = read_sentences(record(directory, seconds, None).filename)
+    ok = True
+    for name, rotation in (("sentences", Rotation(sentences=37)),
+                           ("bytes", Rotation(bytes=2000)),
+                           ("seconds", Rotation(seconds=0.02))):
+        ok = check(name, seconds, rotation, expected) and ok
+
+    for fraction, part, current in memory_profile(args.hours * 3600, Rotation(sentences=200)):
+        print(f"{fraction * args.hours:5.1f}h rotated every 200 sentences: part {part:3d}, "
+              f"traced memory {current / 1024:7.1f} KiB")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
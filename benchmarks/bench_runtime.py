@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""比较原来的 10ms poll_loop 与独立线程事件循环（AsyncRuntime + TkBridge）的空闲唤醒、CPU 和命令延迟
+
+用一个无界面的 Tk 替身（HeadlessTk）代替窗口：它和 Tk 一样在主线程中处理定时器和事件，
+并统计主循环被唤醒的次数。事件循环一侧统计 select 返回的次数。
+用法: python benchmarks/bench_runtime.py [--idle 5] [--commands 200]
+"""
+import time
+import heapq
+import asyncio
+import argparse
+import threading
+
+import _common  # 把 src 加入 sys.path
+
+from function.runtime import AsyncRuntime, TkBridge
+
+
+class HeadlessTk:
+    """Tk 替身：after 定时器、bind/event_generate 虚拟事件、mainloop，event_generate 可跨线程调用"""
+
+    def __init__(self):
+        self._timers = []
+        self._events = []
+        self._bindings = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._seq = 0
+        self.wakeups = 0
+
+    def after(self, ms, func, *args):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._timers, (time.monotonic() + ms / 1000, self._seq, func, args))
+            self._cond.notify()
+
+    def bind(self, sequence, func):
+        self._bindings[sequence] = func
+
+    def event_generate(self, sequence, when=None):
+        with self._cond:
+            self._events.append(sequence)
+            self._cond.notify()
+
+    def quit(self):
+        self._running = False
+
+    def mainloop(self):
+        self._running = True
+        while self._running:
+            with self._cond:
+                while not self._events:
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                events, self._events = self._events, []
+                due = []
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    due.append(heapq.heappop(self._timers))
+            self.wakeups += 1
+            for sequence in events:
+                self._bindings[sequence]()
+            for _, _, func, args in due:
+                func(*args)
+
+
+def count_selects(loop):
+    """包装事件循环的 selector，统计 select 返回次数"""
+    selector = loop._selector
+    original = selector.select
+    counter = {"selects": 0}
+
+    def select(timeout=None):
+        counter["selects"] += 1
+        return original(timeout)
+
+    selector.select = select
+    return counter
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_poll_loop(idle, commands):
+    """原来的做法：主线程每 10ms 调用一次 loop.stop + run_forever"""
+    window = HeadlessTk()
+    loop = asyncio.new_event_loop()
+    counter = count_selects(loop)
+    latencies = []
+
+    def poll_loop():
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+        window.after(10, poll_loop)
+
+    def command(sent):
+        async def handle():
+            latencies.append(time.perf_counter() - sent)
+        loop.create_task(handle())
+
+    result = measure(window, poll_loop, command, idle, commands, latencies, counter)
+    loop.close()
+    return result
+
+
+def run_runtime(idle, commands):
+    """新的做法：事件循环在独立线程中运行，结果通过 TkBridge 送回主线程"""
+    window = HeadlessTk()
+    runtime = AsyncRuntime().start().wait_ready()
+    counter = count_selects(runtime.loop)
+    bridge = TkBridge(window, threaded=True)
+    latencies = []
+
+    def command(sent):
+        async def handle():
+            bridge.post(latencies.append, time.perf_counter() - sent)
+        runtime.submit(handle())
+
+    result = measure(window, lambda: None, command, idle, commands, latencies, counter)
+    runtime.stop()
+    return result
+
+
+def measure(window, start, command, idle, commands, latencies, counter):
+    """空闲 idle 秒，然后每 10ms 发送一条命令
+
+    返回空闲期间的 UI 唤醒数、CPU 时间、事件循环 select 次数，以及命令从 UI 发出到
+    在事件循环中执行（新做法还包括结果回到 UI 线程）的延迟。
+    """
+    marks = {}
+
+    def begin_idle():
+        marks["idle"] = (window.wakeups, time.process_time(), counter["selects"])
+        window.after(int(idle * 1000), end_idle)
+
+    def end_idle():
+        wakeups, cpu, selects = marks["idle"]
+        marks["idle"] = (window.wakeups - wakeups, time.process_time() - cpu, counter["selects"] - selects)
+        send(commands)
+
+    def send(left):
+        if left == 0:
+            window.after(200, window.quit)
+            return
+        command(time.perf_counter())
+        window.after(10, send, left - 1)
+
+    window.after(0, start)
+    window.after(100, begin_idle)
+    window.mainloop()
+    idle_wakeups, idle_cpu, idle_selects = marks["idle"]
+    return idle_wakeups, idle_cpu, idle_selects, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--idle", type=float, default=5.0)
+    parser.add_argument("--commands", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, run in (("poll_loop", run_poll_loop), ("runtime", run_runtime)):
+        wakeups, cpu, selects, latencies = run(args.idle, args.commands)
+        print(f"{name:>9}: idle UI wakeups/s={wakeups / args.idle:6.1f}  "
+              f"loop wakeups/s={selects / args.idle:6.1f}  idle CPU={cpu / args.idle * 100:5.2f}%  "
+              f"command latency p50={percentile(latencies, 0.5) * 1000:6.3f}ms "
+              f"p99={percentile(latencies, 0.99) * 1000:6.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""用合成字幕来源比较固定间隔与自适应轮询调度器
+
+统计轮询次数、命中、空轮询以及漏掉的中间状态数量。
+用法: python benchmarks/bench_scheduler.py [--cycles 2] [--speech 2] [--silence 8]
+"""
+import asyncio
+import argparse
+
+from _common import FakeStore
+
+from function import texthook
+from function.source import FakeCaptionSource
+from function.scheduler import PollScheduler
+
+
+async def run(scheduler, cycles, speech, silence, step=0.12):
+    """轮询模式下用脚本化的说话/静默节奏驱动 hook"""
+    source = FakeCaptionSource(event_driven=False)
+    observed = set()
+
+    state = texthook.CaptureState(FakeStore(lambda text: observed.add(state.buffer)))
+    exit_event = asyncio.Event()
+    task = asyncio.ensure_future(texthook.hook("bench", exit_event, source=source, scheduler=scheduler, state=state))
+
+    emitted = 0
+    text = ""
+    for cycle in range(cycles):
+        for i in range(int(speech / step)):
+            text += f" c{cycle}w{i}"
+            source.emit(text)
+            emitted += 1
+            await asyncio.sleep(step)
+        await asyncio.sleep(silence)
+
+    exit_event.set()
+    await task
+    return emitted, len(observed), scheduler.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--speech", type=float, default=2.0)
+    parser.add_argument("--silence", type=float, default=8.0)
+    args = parser.parse_args()
+
+    modes = [
+        ("fixed", PollScheduler(min_interval=0.3, base_interval=0.3, max_interval=0.3)),
+        ("adaptive", PollScheduler()),
+    ]
+    for name, scheduler in modes:
+        emitted, seen, stats = asyncio.run(run(scheduler, args.cycles, args.speech, args.silence))
+        print(f"{name:<9} polls={stats['polls']:<4} hits={stats['hits']:<4} wasted={stats['wasted']:<4} "
+              f"states_seen={seen}/{emitted}")
+
+
+if __name__ == "__main__":
+    main()
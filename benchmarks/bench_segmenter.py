@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""句子切分微基准：比较原来的 re.sub + re.split + while 配对与 Segmenter 的吞吐量（MB/s）
+
+语料由合成会话的字幕片段拼成，分英文、中文和含缩写/小数/省略号的英文三组；
+另外打印一组边界用例两种做法的切分结果。
+用法: python benchmarks/bench_segmenter.py [--mb 4] [--repeat 3]
+"""
+import re
+import time
+import random
+import argparse
+
+import _common  # 把 src 加入 sys.path
+
+from function.segmenter import Segmenter
+from function.source import synthetic_snapshots
+
+_TRICKY = ("Mr. Smith paid 3.14 dollars for it.", "We tried e.g. apples and pears.",
+           "I think... maybe not.", "Dr. Lee arrived at 9 a.m. today.",
+           "The U.S. team won.", "Is it done?! Yes.")
+
+CASES = (
+    "Mr. Smith paid 3.14 dollars. Then he left!",
+    "I think... maybe not. Wait... What?",
+    "We use e.g. apples. J. K. Rowling wrote it.",
+    "我们开始\n会议。今天讨论\n数据！好的",
+)
+
+
+def old_split(text):
+    """原 merge_cache_to_file 的切分方式"""
+    text = re.sub(r'\s+', ' ', text).strip()
+    sentences = re.split(r'([.!?。！？])', text)
+    merged = []
+    i = 0
+    while i < len(sentences):
+        if i < len(sentences) - 1 and sentences[i+1] in '.!?。！？':
+            merged.append((sentences[i] + sentences[i+1]).strip())
+            i += 2
+        else:
+            if sentences[i].strip():
+                merged.append(sentences[i].strip())
+            i += 1
+    return merged
+
+
+def corpus(language, megabytes, tricky=False, seed=0):
+    """取合成会话窗口的最后一行拼成约 megabytes 大小的文本"""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    target = megabytes * 1024 * 1024
+    last = ""
+    for _, window in synthetic_snapshots(10 ** 9, language=language, seed=seed):
+        line = window.rsplit("\n", 1)[-1]
+        if line == last or not line.startswith(last.rstrip(".?!。？！")[:1]):
+            last = line
+            continue
+        piece = line[len(last):] if line.startswith(last) else ""
+        last = line
+        if not piece:
+            continue
+        if tricky and rng.random() < 0.05:
+            piece += " " + rng.choice(_TRICKY)
+        if rng.random() < 0.1:
+            piece += "\n"
+        parts.append(piece)
+        size += len(piece.encode("utf-8"))
+        if size >= target:
+            break
+    return "".join(parts)
+
+
+def measure(function, text, repeat):
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(function(text))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    segmenter = Segmenter()
+    for name, language, tricky in (("en", "en", False), ("zh", "zh", False), ("en+abbrev", "en", True)):
+        text = corpus(language, args.mb, tricky)
+        megabytes = len(text.encode("utf-8")) / 1e6
+        old_time, old_count = measure(old_split, text, args.repeat)
+        new_time, new_count = measure(segmenter.split, text, args.repeat)
+        print(f"{name:>10}: {megabytes:5.1f} MB  old {megabytes / old_time:6.1f} MB/s ({old_count:,} sentences)  "
+              f"segmenter {megabytes / new_time:6.1f} MB/s ({new_count:,} sentences)")
+
+    print()
+    for case in CASES:
+        print(f"input:     {case!r}")
+        print(f"old:       {old_split(case)}")
+        print(f"segmenter: {segmenter.split(case)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""同一个事件循环中同时运行多个 RecordingSession 的吞吐量和隔离性测试
+
+--sessions 个会话各自回放一段不同种子的合成字幕（脚本化的假来源），由 SessionManager 同时启动，
+测量总的快照/句子吞吐量和峰值内存；然后把每个种子单独录制一遍作为参照，
+检查并发录制的每个文件与单独录制的句子完全相同（会话之间没有串数据）。
+用法: python benchmarks/bench_sessions.py [--sessions 50] [--seconds 600] [--speed 0]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function.recorder import RecordingSession, SessionManager
+from function.source import SyntheticCaptionSource
+
+
+def read_sentences(filename):
+    try:
+        with open(filename, encoding="utf-8") as f:
+            return [line.split("] ", 1)[1] for line in f if "] " in line]
+    except FileNotFoundError:
+        return []
+
+
+def peak_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def concurrent(args, directory):
+    sources = []
+
+    def factory(seed):
+        def create():
+            source = SyntheticCaptionSource(args.seconds, speed=args.speed or None, seed=seed,
+                                            language="zh" if seed % 5 == 4 else "en")
+            sources.append(source)
+            return source
+        return create
+
+    manager = SessionManager(directory)
+    start = time.perf_counter()
+    sessions = [await manager.start(factory(n), label=f"s{n:03d}") for n in range(args.sessions)]
+    await manager.wait_all()
+    elapsed = time.perf_counter() - start
+    snapshots = sum(source.reads for source in sources)
+    return elapsed, snapshots, [(n, session.filename) for n, session in enumerate(sessions)]
+
+
+async def reference(args, directory, seed):
+    session = RecordingSession(directory, lambda: SyntheticCaptionSource(
+        args.seconds, speed=None, seed=seed, language="zh" if seed % 5 == 4 else "en"))
+    await session.start()
+    await session.wait()
+    return session.filename
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=600.0, help="每个合成会话的时长")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放倍速，0 表示不等待")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            elapsed, snapshots, files = asyncio.run(concurrent(args, directory))
+        rss = peak_rss_mib()
+        results = [(n, read_sentences(filename)) for n, filename in files]
+        sentences = sum(len(r) for _, r in results)
+        names = len(set(filename for _, filename in files))
+
+        mismatched = []
+        with tempfile.TemporaryDirectory() as ref_dir, contextlib.redirect_stdout(devnull):
+            for n, got in results:
+                expected = read_sentences(asyncio.run(reference(args, ref_dir, n)))
+                if got != expected:
+                    mismatched.append(n)
+        leftovers = [name for name in os.listdir(directory) if name.endswith("_cache.tmp")]
+
+    print(f"{args.sessions} sessions x {args.seconds:.0f}s captions: {elapsed:.2f}s, "
+          f"{snapshots / elapsed:,.0f} reads/s, {sentences / elapsed:,.0f} sentences/s, peak RSS {rss:.1f} MiB")
+    print(f"distinct files {names}/{args.sessions}, sessions matching a solo run "
+          f"{args.sessions - len(mismatched)}/{args.sessions}, leftover caches {len(leftovers)}")
+    if mismatched:
+        print(f"mismatched sessions: {mismatched[:10]}")
+    return 1 if mismatched or leftovers or names != args.sessions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""界面启动时间：导入耗时和从进程启动到窗口出现、找到 Live Captions 的时间
+
+uiautomation 用一个临时生成的替身模块代替（Linux 上也能运行）：导入时等待 --uia-import 秒，
+模拟 comtypes 生成 COM 包装；查找窗口时等待 --search 秒，模拟桌面搜索。
+1. python -X importtime -c "import main"：main.py 导入期间的模块和耗时，确认录制模块、uiautomation 不在其中。
+2. 无界面：在子进程中按原来的顺序（导入录制模块 → 在启动线程中初始化 COM → 查找窗口 → 才能显示窗口）
+   和现在的顺序（导入 main → 启动事件循环线程 → 可以显示窗口，导入和查找在后台进行）分别计时。
+3. 有显示器（DISPLAY 或 xvfb-run）时：运行 main.dashboard，记录窗口第一次显示和查找结束的时间。
+时间都从父进程创建子进程时开始计算，包括解释器启动。
+用法: python benchmarks/bench_startup.py [--uia-import 1.0] [--search 0.5] [--runs 5]
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from _common import SRC
+
+STUB = '''\
+import os
+import time
+time.sleep(float(os.environ.get("STUB_UIA_IMPORT", "0")))
+_SEARCH = float(os.environ.get("STUB_UIA_SEARCH", "0"))
+
+
+def SetGlobalSearchTimeout(seconds):
+    pass
+
+
+class _Control:
+    NativeWindowHandle = 1
+
+    def Control(self, **kwargs):
+        return _Control()
+
+    def Exists(self, maxSearchSeconds=0, searchIntervalSeconds=0.5):
+        time.sleep(_SEARCH)
+        return True
+
+
+def GetRootControl():
+    return _Control()
+
+
+class UIAutomationInitializerInThread:
+    def Uninitialize(self):
+        pass
+'''
+
+# 原来的启动顺序：全部完成后 dashboard 才进入主循环画出窗口
+BEFORE = '''\
+import time, json, contextlib, io, asyncio
+from function.texthook import lc_detect
+from function.recorder import RecordingSession
+from function.runtime import AsyncRuntime
+from function.source import init_com_thread
+import tkinter
+recorder = RecordingSession()
+imported = time.time()
+runtime = AsyncRuntime(thread_init=init_com_thread).start()
+runtime.submit(asyncio.sleep(0)).result()  # 原来的 start() 等待 thread_init 完成
+with contextlib.redirect_stdout(io.StringIO()):
+    found = lc_detect()
+ready = time.time()
+print(json.dumps({"imported": imported, "window": ready, "ready": ready, "found": found}))
+runtime.stop()
+'''
+
+# 现在的启动顺序：事件循环线程启动后立即可以显示窗口，prepare() 在后台导入和查找
+AFTER = '''\
+import time, json, contextlib, io
+import main
+from function.runtime import AsyncRuntime
+imported = time.time()
+runtime = AsyncRuntime().start()
+window = time.time()
+with contextlib.redirect_stdout(io.StringIO()):
+    found = runtime.submit(main.prepare()).result()
+ready = time.time()
+print(json.dumps({"imported": imported, "window": window, "ready": ready, "found": found}))
+runtime.stop()
+'''
+
+GUI = '''\
+import time, json, contextlib, io
+import main
+from function.runtime import AsyncRuntime
+marks = {"imported": time.time()}
+
+def on_event(name, window):
+    marks[name] = time.time()
+    if name != "shown":
+        window.after(0, window.destroy)
+
+runtime = AsyncRuntime().start()
+with contextlib.redirect_stdout(io.StringIO()):
+    main.dashboard(runtime, on_event)
+runtime.stop()
+print(json.dumps(marks))
+'''
+
+
+def run(code, env, wrapper=()):
+    """在子进程中运行 code，返回子进程输出的时间点（相对于创建子进程的时刻，毫秒）"""
+    began = time.time()
+    out = subprocess.run([*wrapper, sys.executable, "-c", code], cwd=SRC, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    marks = json.loads(out.strip().splitlines()[-1])
+    return {k: (v - began) * 1e3 if isinstance(v, float) else v for k, v in marks.items()}
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def import_profile(env, top=8):
+    """-X importtime 的输出：main 的累计导入时间和耗时最多的模块"""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=SRC, env=env,
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)", line)
+        if match:
+            rows.append((match.group(4), int(match.group(2)), (len(match.group(3)) - 1) // 2))
+    main_total = next(cumulative for name, cumulative, depth in rows if name == "main")
+    names = {name for name, _, _ in rows}
+    heaviest = sorted((r for r in rows if r[2] <= 1), key=lambda r: -r[1])[:top]
+    return main_total, heaviest, names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uia-import", type=float, default=1.0, help="替身 uiautomation 的导入耗时（秒）")
+    parser.add_argument("--search", type=float, default=0.5, help="替身查找 Live Captions 的耗时（秒）")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    stub_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(stub_dir, "uiautomation.py"), "w") as f:
+            f.write(STUB)
+        env = dict(os.environ, PYTHONPATH=stub_dir, STUB_UIA_IMPORT=str(args.uia_import),
+                   STUB_UIA_SEARCH=str(args.search), PYTHONDONTWRITEBYTECODE="1")
+
+        main_total, heaviest, names = import_profile(env)
+        print(f"import main: {main_total / 1e3:.1f}ms cumulative (-X importtime)")
+        for name, cumulative, depth in heaviest:
+            print(f"    {'  ' * depth}{name:<28} {cumulative / 1e3:7.1f}ms")
+        loaded = [name for name in ("uiautomation", "function.recorder", "function.save", "function.texthook")
+                  if name in names]
+        print(f"    imported on the critical path: {', '.join(loaded) or 'none of uiautomation / recording modules'}")
+
+        print(f"stub uiautomation: import {args.uia_import:.1f}s, search {args.search:.1f}s; "
+              f"median of {args.runs} runs from process start:")
+        for name, code in (("before", BEFORE), ("after", AFTER)):
+            results = [run(code, env) for _ in range(args.runs)]
+            print(f"    {name:>6}: modules imported {median([r['imported'] for r in results]):6.0f}ms, "
+                  f"window can appear {median([r['window'] for r in results]):6.0f}ms, "
+                  f"Live Captions found {median([r['ready'] for r in results]):6.0f}ms "
+                  f"(found={all(r['found'] for r in results)})")
+
+        wrapper = () if os.environ.get("DISPLAY") else (("xvfb-run", "-a") if shutil.which("xvfb-run") else None)
+        if wrapper is None:
+            print("dashboard: skipped (no DISPLAY and no xvfb-run)")
+        else:
+            results = [run(GUI, env, wrapper) for _ in range(args.runs)]
+            print(f"dashboard: first frame {median([r['shown'] for r in results]):6.0f}ms, "
+                  f"ready {median([r.get('ready', r.get('not_found', 0)) for r in results]):6.0f}ms")
+    finally:
+        shutil.rmtree(stub_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""对照朴素实现随机测试 _overlap_length 的重叠查找，并检查 extract_new_text 的耗时随窗口线性增长
+
+两种用法都测：extract_new_text 允许旧窗口末尾 REWRITE_WINDOW 个字符被改写，
+CaptionModel 在锚点开头滚出窗口时要求重叠接在锚点末尾（rewrite_window=1）。
+
+用法: python benchmarks/fuzz_extract_new_text.py [--rounds 20000] [--seed 0]
+"""
+import time
+import random
+import argparse
+
+import _common  # 把 src 加入 sys.path
+
+from function.texthook import _overlap_length, extract_new_text, MIN_OVERLAP, REWRITE_WINDOW
+
+
+def naive_overlap_length(previous, current, rewrite_window=REWRITE_WINDOW):
+    """O(n²) 参考实现，语义与 _overlap_length 相同"""
+    m = len(current)
+    if m == 0:
+        return 0
+    if current in previous:
+        return m
+    best = 0
+    for i in range(max(0, len(previous) - rewrite_window), len(previous)):
+        e = i + 1
+        for k in range(min(e, m), 0, -1):
+            if previous[e - k:e] == current[:k]:
+                if k >= min(MIN_OVERLAP, m) and k > best:
+                    best = k
+                break
+    return best
+
+
+def random_pair(rng):
+    """生成随机窗口对：小字母表制造大量部分匹配，同时覆盖滚动和改写"""
+    alphabet = rng.choice(["ab", "abc ", "abcdefgh ", "我们的会议 "])
+    base = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 120)))
+    kind = rng.random()
+    if kind < 0.3:
+        cut = rng.randint(0, len(base))
+        tail = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        return base, base[cut:] + tail
+    if kind < 0.6:
+        cut = rng.randint(0, len(base))
+        keep = rng.randint(cut, len(base))
+        tail = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        return base, base[cut:keep] + tail
+    other = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 120)))
+    return base, other
+
+
+def check(rounds, seed):
+    rng = random.Random(seed)
+    for n in range(rounds):
+        previous, current = random_pair(rng)
+        for rewrite_window in (REWRITE_WINDOW, 1):
+            fast = _overlap_length(previous, current, rewrite_window)
+            slow = naive_overlap_length(previous, current, rewrite_window)
+            if fast != slow:
+                raise SystemExit(f"mismatch #{n}: prev={previous!r} cur={current!r} "
+                                 f"rewrite_window={rewrite_window} fast={fast} slow={slow}")
+        # extract_new_text 的结果必须是 current 的后缀（hook 传入的文本已经 strip 过）
+        current, previous = current.strip(), previous.strip()
+        new = extract_new_text(current, previous)
+        if new and not current.endswith(new):
+            raise SystemExit(f"not a suffix #{n}: prev={previous!r} cur={current!r} new={new!r}")
+    print(f"fuzz ok: {rounds} rounds")
+
+
+def timing():
+    """窗口长度翻倍时耗时也应大致翻倍"""
+    rng = random.Random(1)
+    words = ["alpha", "beta", "gamma", "delta", "omega", "sigma"]
+    for size in (1000, 2000, 4000, 8000, 16000):
+        text = " ".join(rng.choice(words) for _ in range(size // 5))[:size]
+        previous = text
+        current = text[size // 4:] + " new words here"
+        loops = 50
+        start = time.perf_counter()
+        for _ in range(loops):
+            extract_new_text(current, previous)
+        per_call = (time.perf_counter() - start) / loops
+        print(f"window={size:<6} {per_call * 1e6:8.1f} us/call  {per_call * 1e9 / size:6.1f} ns/char")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    check(args.rounds, args.seed)
+    timing()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""随机截断、破坏二进制缓存文件，检查解析和启动恢复能应对写了一半的记录
+
+用法: python benchmarks/fuzz_journal.py [--rounds 500] [--seed 0]
+"""
+import os
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import _common  # 把 src 加入 sys.path
+
+from function import save
+from function.journal import Journal, decode
+from function.segmenter import default_segmenter
+
+_TEXTS = ["Hello there.", " How are", " you?", " 我们开始", "会议。", " line\nbreak", " ünïcödé", " tail"]
+
+
+def check_decode(rng, rounds):
+    journal = Journal()
+    records = [journal.fragment(rng.choice(_TEXTS) * rng.randint(1, 5), float(i), 1e9 + i) for i in range(200)]
+    data = b"".join(records)
+    boundaries = []
+    total = 0
+    for record in records:
+        total += len(record)
+        boundaries.append(total)
+
+    for _ in range(rounds):
+        # 截断：必须得到完整记录组成的前缀
+        cut = rng.randint(0, len(data))
+        got = [r.seq for r in decode(data[:cut])]
+        expected = sum(1 for b in boundaries if b <= cut)
+        assert got == list(range(1, expected + 1)), (cut, got[-3:], expected)
+
+        # 随机破坏若干字节：不能抛异常，得到的记录必须是原记录的子序列
+        damaged = bytearray(data)
+        for _ in range(rng.randint(1, 8)):
+            damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+        seqs = [r.seq for r in decode(bytes(damaged))]
+        assert seqs == sorted(set(seqs)) and all(1 <= s <= len(records) for s in seqs), seqs
+    print(f"decode ok: {rounds} truncations and corruptions")
+
+
+async def record_session(directory, fragments):
+    """正常录制到一半时的缓存和最终文件内容（模拟崩溃）"""
+    save.reset_for_new_recording()
+    save.store.cache_filename = os.path.join(directory, "s_cache.tmp")
+    save.store.current_filename = os.path.join(directory, "s_captions.txt")
+    for text in fragments:
+        await save.save_to_cache(text)
+    await save.flush_cache()
+    with open(save.store.cache_filename, "rb") as f:
+        cache = f.read()
+    with open(save.store.current_filename, "rb") as f:
+        transcript = f.read()
+    await save.close_cache()
+    await save.close_file()
+    save.reset_for_new_recording()
+    return cache, transcript
+
+
+def check_recovery(rng, rounds):
+    fragments = [rng.choice(_TEXTS) for _ in range(300)]
+    full_text = default_segmenter.normalize("".join(fragments))
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(open(os.devnull, "w")):
+        cache, transcript = asyncio.run(record_session(tmp, fragments))
+        before = transcript.decode("utf-8").splitlines()
+
+        cache_path = os.path.join(tmp, "s_cache.tmp")
+        transcript_path = os.path.join(tmp, "s_captions.txt")
+        for _ in range(rounds):
+            cut = rng.randint(0, len(cache))
+            with open(cache_path, "wb") as f:
+                f.write(cache[:cut])
+            with open(transcript_path, "wb") as f:
+                f.write(transcript)
+            save.recover_orphaned_caches(tmp)
+            assert not os.path.exists(cache_path)
+            with open(transcript_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            # 原有内容不变，恢复出的句子连起来必须是原始文本中连续的一段
+            assert lines[:len(before)] == before
+            recovered = default_segmenter.normalize(
+                " ".join(line.split("] ", 1)[1] for line in lines[len(before):]))
+            assert recovered in full_text, (cut, recovered[:80])
+    print(f"recovery ok: {rounds} truncated caches")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    check_decode(rng, args.rounds)
+    check_recovery(rng, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""整条字幕处理流程的基准套件：吞吐量、p50/p99 延迟、峰值 RSS 和内存分配，结果存为 JSON 并与基线比较
+
+工作负载（每个字幕流各跑一遍）:
+    extract       extract_new_text：相邻两次窗口文本的差异
+    model         CaptionModel.update：捕获循环对每次读到的窗口做的对齐和提交（hook 实际走的路径）
+    segment       SentenceAssembler + Segmenter：把提交的片段切成句子
+    save          CaptionStore.save_to_cache：写缓存日志和最终文件（真实文件）
+    merge         merge_cache_to_file：异常退出后从带检查点的缓存恢复（只回放最后的尾部）
+    merge_legacy  merge_cache_to_file：旧版 HH:MM:SS|text 缓存，没有检查点，整个回放
+    pipeline      RecordingSession + hook：读取、字幕模型、缓存、句子、文件，不等待地回放
+字幕流: 合成会话（--sizes 1m 1h 8h × --languages en zh），以及 RecordingCaptionSource 记录的快照文件
+（--recorded FILE，可以多个；不指定时用合成字幕生成一个 1 小时的快照文件代替）。
+
+每个用例在独立的子进程中运行：输入在计时前准备好，之后运行 --repeat 次取最好的一次，
+峰值 RSS 是整个子进程的（含输入），RSS 增长是运行期间相对输入准备好时的增长；
+每次运行前后还测一个固定的纯 Python 循环，与基线比较时吞吐量按它折算机器速度的变化（"machine" 一列）；
+再用另一个子进程在 tracemalloc 下运行一次，得到 Python 堆的峰值和运行后仍保留的内存（--no-alloc 跳过）。
+pipeline 的延迟是 captions_latency_seconds（文本第一次读到至保存，不等待回放时只含处理时间）。
+结果写入 --output（默认 benchmarks/results/时间.json）；--baseline 指定之前的结果时逐项比较，
+吞吐量下降、p99 或内存增加超过 --threshold 以及输出变化都标为回归，返回码为 1
+（延迟样本不足 1000 个时不比较 p99；看起来回归的用例会再测一次，两次都回归才算）。
+只依赖标准库，Linux 上无界面运行。
+用法: python benchmarks/run.py [--quick] [--sizes 1m 1h 8h] [--languages en zh] [--workloads extract model save ...]
+      python benchmarks/run.py --baseline benchmarks/results/before.json [--threshold 0.3]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from _common import ROOT
+
+from function import metrics
+from function.save import CaptionStore, SentenceAssembler
+from function.texthook import CaptionModel, extract_new_text
+from function.recorder import RecordingSession
+from function.source import ReplayCaptionSource, synthetic_snapshots, load_snapshots
+
+WORKLOADS = ("extract", "model", "segment", "save", "merge", "merge_legacy", "pipeline")
+SIZES = {"1m": 60, "1h": 3600, "8h": 8 * 3600}
+LANGUAGES = ("en", "zh")
+SAMPLE_RECORDING = 3600  # 没有 --recorded 时生成的快照文件时长（秒）
+# 比较时的噪声下限：变化小于这些绝对值时不算回归
+FLOOR_ELAPSED = 0.005
+FLOOR_LATENCY = 20e-6
+FLOOR_MEMORY = 1024 * 1024
+MIN_SAMPLES = 1000  # 延迟样本少于这个数时最慢的 1% 不到 10 个，p99 只是一两次偶然的停顿，不比较
+
+
+# ---------- 输入 ----------
+
+def stream_label(stream):
+    if stream["kind"] == "recorded":
+        return "recorded-" + os.path.splitext(os.path.basename(stream["path"]))[0]
+    return f"synthetic-{stream['size']}-{stream['language']}"
+
+
+def load_stream(stream):
+    """字幕流的 (秒, 窗口文本) 列表"""
+    if stream["kind"] == "recorded":
+        return list(load_snapshots(stream["path"]))
+    return list(synthetic_snapshots(SIZES[stream["size"]], language=stream["language"], seed=1))
+
+
+def committed_fragments(snapshots):
+    """按 hook 的方式把窗口文本变成提交到缓存的片段（短片段与下一个合并）"""
+    model = CaptionModel()
+    fragments = []
+    pending = ""
+    for t, window in snapshots:
+        text = pending + model.update(window.strip(), t).replace("\n", " ")
+        if len(text.strip()) > 1:
+            fragments.append(text)
+            pending = ""
+        else:
+            pending = text
+    text = pending + model.flush().replace("\n", " ")
+    if text.strip():
+        fragments.append(text)
+    return fragments
+
+
+def write_sample_recording(path):
+    """RecordingCaptionSource 的格式：每行 {"t": ..., "text": ...}"""
+    with open(path, "w", encoding="utf-8") as f:
+        for t, text in synthetic_snapshots(SAMPLE_RECORDING, rewrite_rate=0.3, window_chars=600, seed=7):
+            f.write(json.dumps({"t": t, "text": text}, ensure_ascii=False) + "\n")
+
+
+# ---------- 工作负载：prepare 在计时前执行，run 返回 (项数, 字节数, 计时部分的秒数, 每项延迟列表或 p50/p99/count, 输出摘要) ----------
+
+class Extract:
+    def prepare(self, snapshots, directory):
+        self.snapshots = [text.strip() for _, text in snapshots]
+
+    def run(self):
+        latencies = []
+        clock = time.perf_counter
+        previous = ""
+        produced = 0
+        began = clock()
+        for text in self.snapshots:
+            start = clock()
+            new = extract_new_text(text, previous)
+            latencies.append(clock() - start)
+            produced += len(new)
+            previous = text
+        elapsed = clock() - began
+        size = sum(len(text.encode("utf-8")) for text in self.snapshots)
+        return len(self.snapshots), size, elapsed, latencies, produced
+
+
+class Model:
+    def prepare(self, snapshots, directory):
+        self.snapshots = [(t, text.strip()) for t, text in snapshots]
+
+    def run(self):
+        latencies = []
+        clock = time.perf_counter
+        model = CaptionModel()
+        produced = 0
+        began = clock()
+        for t, text in self.snapshots:
+            start = clock()
+            new = model.update(text, t)
+            latencies.append(clock() - start)
+            produced += len(new)
+        produced += len(model.flush())
+        elapsed = clock() - began
+        size = sum(len(text.encode("utf-8")) for _, text in self.snapshots)
+        return len(self.snapshots), size, elapsed, latencies, produced
+
+
+class Segment:
+    def prepare(self, snapshots, directory):
+        self.fragments = committed_fragments(snapshots)
+
+    def run(self):
+        latencies = []
+        clock = time.perf_counter
+        assembler = SentenceAssembler()
+        sentences = 0
+        began = clock()
+        for n, fragment in enumerate(self.fragments):
+            start = clock()
+            sentences += len(assembler.feed(fragment, n))
+            latencies.append(clock() - start)
+        sentences += len(assembler.finish())
+        elapsed = clock() - began
+        size = sum(len(fragment.encode("utf-8")) for fragment in self.fragments)
+        return len(self.fragments), size, elapsed, latencies, sentences
+
+
+class Save:
+    def prepare(self, snapshots, directory):
+        self.fragments = committed_fragments(snapshots)
+        self.directory = directory
+        self.runs = 0
+
+    def run(self):
+        self.runs += 1
+        return asyncio.run(self._run(os.path.join(self.directory, f"save{self.runs}")))
+
+    async def _run(self, directory):
+        store = CaptionStore()
+        store.choose_save_dir(directory)
+        latencies = []
+        clock = time.perf_counter
+        began = clock()
+        for fragment in self.fragments:
+            start = clock()
+            await store.save_to_cache(fragment)
+            latencies.append(clock() - start)
+        # 停止录制：合并尾部、等待写入、关闭文件
+        store.merge_cache_to_file()
+        await store.flush_cache()
+        await store.close_cache()
+        await store.close_file()
+        elapsed = clock() - began
+        with open(store.current_filename, encoding="utf-8") as f:
+            sentences = sum(1 for _ in f)
+        size = sum(len(fragment.encode("utf-8")) for fragment in self.fragments)
+        return len(self.fragments), size, elapsed, latencies, sentences
+
+
+class Merge:
+    """录制到最后一个片段后“崩溃”：缓存和最终文件留在磁盘上，由新的 CaptionStore 合并"""
+
+    def prepare(self, snapshots, directory):
+        self.fragments = committed_fragments(snapshots)
+        self.directory = directory
+        self.cache, self.transcript = asyncio.run(self._record(os.path.join(directory, "crashed")))
+        self.runs = 0
+
+    async def _record(self, directory):
+        store = CaptionStore()
+        store.choose_save_dir(directory)
+        for fragment in self.fragments:
+            await store.save_to_cache(fragment)
+        await store.flush_cache()
+        cache = shutil.copy(store.cache_filename, os.path.join(self.directory, "cache.tmp"))
+        transcript = shutil.copy(store.current_filename, os.path.join(self.directory, "captions.txt"))
+        await store.close_cache()
+        await store.close_file()
+        return cache, transcript
+
+    def run(self):
+        self.runs += 1
+        store = CaptionStore()
+        store.cache_filename = shutil.copy(self.cache, os.path.join(self.directory, f"run{self.runs}_cache.tmp"))
+        store.current_filename = shutil.copy(self.transcript, os.path.join(self.directory, f"run{self.runs}.txt"))
+        start = time.perf_counter()
+        store.merge_cache_to_file()
+        elapsed = time.perf_counter() - start
+        with open(store.current_filename, encoding="utf-8") as f:
+            sentences = sum(1 for _ in f)
+        return len(self.fragments), os.path.getsize(self.cache), elapsed, [elapsed], sentences
+
+
+class MergeLegacy(Merge):
+    """旧版文本缓存没有检查点，合并时回放全部片段"""
+
+    def prepare(self, snapshots, directory):
+        self.fragments = committed_fragments(snapshots)
+        self.directory = directory
+        self.cache = os.path.join(directory, "legacy_cache.tmp")
+        self.transcript = os.path.join(directory, "legacy.txt")
+        with open(self.cache, "w", encoding="utf-8") as f:
+            for n, fragment in enumerate(self.fragments):
+                f.write(f"{time.strftime('%H:%M:%S', time.gmtime(n))}|{fragment}\n")
+        open(self.transcript, "w").close()
+        self.runs = 0
+
+
+class Pipeline:
+    def prepare(self, snapshots, directory):
+        self.snapshots = snapshots
+        self.directory = directory
+        self.runs = 0
+
+    def run(self):
+        self.runs += 1
+        metrics.registry.reset()
+        metrics.enable()
+        try:
+            elapsed, filename = asyncio.run(self._run(os.path.join(self.directory, f"pipeline{self.runs}")))
+        finally:
+            metrics.disable()
+        with open(filename, encoding="utf-8") as f:
+            sentences = sum(1 for _ in f)
+        latency = metrics.caption_latency
+        size = sum(len(text.encode("utf-8")) for _, text in self.snapshots)
+        return len(self.snapshots), size, elapsed, {"p50": latency.quantile(0.5), "p99": latency.quantile(0.99), "count": latency.count}, sentences
+
+    async def _run(self, directory):
+        session = RecordingSession(directory, lambda: ReplayCaptionSource(self.snapshots, speed=None))
+        began = time.perf_counter()
+        await session.start()
+        await session.wait()
+        return time.perf_counter() - began, session.filename
+
+
+WORKLOAD_CLASSES = {"extract": Extract, "model": Model, "segment": Segment, "save": Save, "merge": Merge,
+                    "merge_legacy": MergeLegacy, "pipeline": Pipeline}
+
+
+# ---------- 子进程 ----------
+
+def current_rss():
+    """当前 RSS（字节），只在 Linux 上可用"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def calibrate(rounds=3):
+    """固定的纯 Python 循环的最短耗时，用来折算机器当时的速度（共享的虚拟机上 CPU 速度会变）"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        total = 0
+        for i in range(200000):
+            total += i * i % 7
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def worker(case, repeat, trace):
+    """在子进程中运行一个用例，返回结果字典"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    workload = WORKLOAD_CLASSES[case["workload"]]()
+    with tempfile.TemporaryDirectory() as directory:
+        workload.prepare(load_stream(case["stream"]), directory)
+        if trace:
+            import tracemalloc
+            tracemalloc.start()
+            workload.run()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return {"alloc_peak": peak, "alloc_retained": retained}
+
+        before = current_rss()
+        runs, normalized = [], None
+        for _ in range(repeat):
+            # 速度在一个用例内也会变，每次运行都用紧挨着它的校准折算
+            reference = calibrate()
+            items, size, elapsed, latencies, output = workload.run()
+            reference = min(reference, calibrate())
+            runs.append((elapsed, latencies))
+            normalized = elapsed / reference if normalized is None else min(normalized, elapsed / reference)
+        # 取最好的一次：机器上其他负载只会让结果变慢，最小值最稳定
+        elapsed = min(e for e, _ in runs)
+        # elapsed / calibration 是折算后最好的一次，compare() 只用这个比值
+        calibration = elapsed / normalized if normalized else calibrate()
+        if isinstance(latencies, dict):
+            p50 = min(l["p50"] for _, l in runs)
+            p99 = min(l["p99"] for _, l in runs)
+            samples = latencies["count"]
+        else:
+            p50 = min(percentile(l, 0.5) for _, l in runs)
+            p99 = min(percentile(l, 0.99) for _, l in runs)
+            samples = len(latencies)
+        peak = peak_rss()
+        return {
+            "items": items, "bytes": size, "output": output, "elapsed": elapsed,
+            "items_per_second": items / elapsed if elapsed else 0.0,
+            "mb_per_second": size / elapsed / 1e6 if elapsed else 0.0,
+            "p50": p50, "p99": p99, "samples": samples, "calibration": calibration,
+            "peak_rss": peak,
+            "rss_growth": max(0, peak - before) if peak is not None and before is not None else None,
+        }
+
+
+def run_case(case, repeat, alloc):
+    command = [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(case), "--repeat", str(repeat)]
+    result = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout.splitlines()[-1])
+    if alloc:
+        traced = subprocess.run(command + ["--trace"], capture_output=True, text=True, check=True).stdout
+        result.update(json.loads(traced.splitlines()[-1]))
+    return result
+
+
+# ---------- 报告与比较 ----------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def mib(value):
+    return "-" if value is None else f"{value / 1048576:.1f}"
+
+
+def print_row(name, result):
+    print(f"{name:<34} {result['items_per_second']:>11,.0f} {result['mb_per_second']:>7.2f} "
+          f"{result['p50'] * 1e6:>9.1f} {result['p99'] * 1e6:>9.1f} {mib(result['peak_rss']):>8} "
+          f"{mib(result['rss_growth']):>7} {mib(result.get('alloc_peak')):>8} {result['output']:>8}")
+
+
+def speed(result, old):
+    """两次运行时机器速度之比（> 1 表示这次机器更慢），时间按它折算"""
+    return result["calibration"] / old["calibration"] if old.get("calibration") else 1.0
+
+
+def check(result, old, threshold):
+    """一个用例与基线相比的问题列表，空列表表示没有回归"""
+    problems = []
+    if result["output"] != old["output"]:
+        problems.append(f"output {old['output']} -> {result['output']}")
+    scale = speed(result, old)
+    elapsed = result["elapsed"] / scale
+    if elapsed > old["elapsed"] * (1 + threshold) and elapsed - old["elapsed"] > FLOOR_ELAPSED:
+        problems.append("throughput")
+    # p99 不折算：尾部延迟主要是 fsync、垃圾回收和调度造成的停顿，不随 CPU 速度变化
+    for key, floor in (("p99", FLOOR_LATENCY), ("rss_growth", FLOOR_MEMORY), ("alloc_peak", FLOOR_MEMORY)):
+        new_value, old_value = result.get(key), old.get(key)
+        if new_value is None or old_value is None or key == "p99" and result["samples"] < MIN_SAMPLES:
+            continue
+        if new_value > old_value * (1 + threshold) and new_value - old_value > floor:
+            problems.append(key)
+    return problems
+
+
+def compare(results, baseline, threshold):
+    """与基线逐项比较并输出，返回回归列表"""
+    regressions = []
+    print(f"\ncompared with {baseline['meta'].get('time')} (commit {baseline['meta'].get('commit')}), "
+          f"threshold {threshold:.0%}:")
+    for name, result in results.items():
+        old = baseline["cases"].get(name)
+        if old is None:
+            print(f"    {name:<34} new case")
+            continue
+        problems = check(result, old, threshold)
+        scale = speed(result, old)
+        change = old["elapsed"] * scale / result["elapsed"] - 1 if result["elapsed"] else 0.0
+        p99 = result["p99"] / old["p99"] - 1 if old["p99"] else 0.0
+        status = "REGRESSION: " + ", ".join(problems) if problems else "ok"
+        if result.get("remeasured"):
+            status += " (re-measured)"
+        print(f"    {name:<34} throughput {change:+6.1%}  p99 {p99:+6.1%}  machine {scale - 1:+6.1%}  {status}")
+        if problems:
+            regressions.append((name, problems))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--sizes", nargs="+", choices=tuple(SIZES), default=list(SIZES))
+    parser.add_argument("--languages", nargs="+", choices=LANGUAGES, default=list(LANGUAGES))
+    parser.add_argument("--recorded", nargs="*", metavar="FILE", help="RecordingCaptionSource 记录的快照文件")
+    parser.add_argument("--quick", action="store_true", help="只跑 1m 和 1h，不统计内存分配")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例运行的次数，取最好的一次")
+    parser.add_argument("--no-alloc", action="store_true", help="不用 tracemalloc 统计内存分配")
+    parser.add_argument("--output", help="结果 JSON（默认 benchmarks/results/时间.json）")
+    parser.add_argument("--baseline", help="之前的结果 JSON，逐项比较并标出回归")
+    parser.add_argument("--threshold", type=float, default=0.3, help="算作回归的相对变化（共享的虚拟机上同一份代码两次运行可相差两成以上）")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker), args.repeat, args.trace)))
+        return 0
+
+    sizes = [s for s in args.sizes if s != "8h"] if args.quick else args.sizes
+    alloc = not (args.no_alloc or args.quick)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    sample_dir = tempfile.mkdtemp()
+    try:
+        streams = [{"kind": "synthetic", "size": size, "language": language}
+                   for size in sizes for language in args.languages]
+        recorded = args.recorded
+        if not recorded:
+            recorded = [os.path.join(sample_dir, "sample-1h.jsonl")]
+            write_sample_recording(recorded[0])
+        streams += [{"kind": "recorded", "path": os.path.abspath(path)} for path in recorded]
+
+        print(f"{'case':<34} {'items/s':>11} {'MB/s':>7} {'p50 us':>9} {'p99 us':>9} "
+              f"{'peak RSS':>8} {'+RSS':>7} {'alloc':>8} {'output':>8}  (memory in MiB)")
+        results = {}
+        started = time.perf_counter()
+        for workload in args.workloads:
+            for stream in streams:
+                name = f"{workload}/{stream_label(stream)}"
+                case = {"workload": workload, "stream": stream}
+                results[name] = dict(run_case(case, args.repeat, alloc), **case)
+                print_row(name, results[name])
+
+        if baseline is not None:
+            # 共享机器上的变慢是一阵一阵的：看起来回归的用例再测一次，保留问题较少的一次，
+            # 真正的回归两次都会出现
+            for name, result in results.items():
+                old = baseline["cases"].get(name)
+                if old is None or not check(result, old, args.threshold):
+                    continue
+                case = {"workload": result["workload"], "stream": result["stream"]}
+                retry = dict(run_case(case, args.repeat, alloc), **case)
+                if len(check(retry, old, args.threshold)) < len(check(result, old, args.threshold)):
+                    result = results[name] = retry
+                result["remeasured"] = True
+    finally:
+        shutil.rmtree(sample_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": git_commit(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "repeat": args.repeat, "seconds": time.perf_counter() - started,
+        },
+        "cases": results,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", time.strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"results written to {output} ({report['meta']['seconds']:.0f}s)")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{len(regressions)} regression(s)" if regressions else "no regressions")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+from datetime import datetime
+
+APPEND_BUFFER_SIZE = 64 * 1024  # 写缓冲大小
+APPEND_FLUSH_INTERVAL = 1.0     # 距上次落盘超过这个秒数时顺带 flush
+
+_appenders = {}
+
+
+class CaptionAppender:
+    """持久的字幕追加器：文件只打开一次，结尾是否为换行记录在内存中，写入经过缓冲
+
+    每次追加的开销与文件已有的长度无关。
+    """
+
+    def __init__(self, filename, buffer_size=APPEND_BUFFER_SIZE, flush_interval=APPEND_FLUSH_INTERVAL):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        # 只在打开时检查一次文件的最后一个字节
+        self.ends_with_newline = True
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                self.ends_with_newline = f.read(1) == b"\n"
+        self._file = open(filename, "a", encoding="utf-8", buffering=buffer_size)
+        self._last_flush = time.monotonic()
+        self.appends = 0
+
+    def append(self, text):
+        """追加一段文本，必要时先补上换行"""
+        if not self.ends_with_newline:
+            self._file.write("\n")
+        self._file.write(text)
+        self.ends_with_newline = text.endswith("\n")
+        self.appends += 1
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_caption(self, caption, timestamp=None):
+        """追加一行 [HH:MM:SS] 字幕"""
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+        self.append(f"[{timestamp}] {caption}\n")
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def get_appender(filename):
+    """按文件名取得共享的追加器，第一次使用时打开文件"""
+    appender = _appenders.get(filename)
+    if appender is None:
+        appender = _appenders[filename] = CaptionAppender(filename)
+    return appender
+
+
+def flush_appenders():
+    """把所有追加器的缓冲写入文件（暂停、预览时调用）"""
+    for appender in _appenders.values():
+        appender.flush()
+
+
+def close_appender(filename=None):
+    """关闭指定文件的追加器，不指定时全部关闭"""
+    names = list(_appenders) if filename is None else [filename]
+    for name in names:
+        appender = _appenders.pop(name, None)
+        if appender is not None:
+            appender.close()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import json
+import asyncio
+from collections import deque, namedtuple
+from . import metrics
+
+# 发布的句子：session 区分不同的录制，seq 在进程内递增，订阅者可以据此发现丢失的句子
+SentenceEvent = namedtuple("SentenceEvent", ["session", "seq", "text", "start", "end", "file"])
+
+DROP_OLDEST = "drop_oldest"    # 队列满时丢弃最早的句子，保证订阅者看到最新内容
+DROP_NEWEST = "drop_newest"    # 队列满时丢弃新来的句子，保留已排队的连续内容
+DISCONNECT = "disconnect"      # 队列满时关闭订阅，由订阅者决定是否重新订阅
+POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+DEFAULT_QUEUE_SIZE = 1024
+
+
+def event_to_dict(event):
+    return {"event": "sentence", **event._asdict()}
+
+
+def event_to_json(event):
+    """一行 JSON（不含换行符）"""
+    return json.dumps(event_to_dict(event), ensure_ascii=False)
+
+
+class Subscription:
+    """一个订阅者的有界队列，用 async for 或 await get() 读取，关闭后迭代结束"""
+
+    def __init__(self, bus, maxsize, policy):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown drop policy: {policy}")
+        self.bus = bus
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque()
+        self._waiter = None
+
+    def _put(self, event):
+        if self.closed:
+            return
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            self.bus.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            if self.policy == DISCONNECT:
+                self.close()
+                return
+            self._queue.popleft()
+        self._queue.append(event)
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self):
+        """等待下一句；订阅关闭且队列读完时返回 None"""
+        while not self._queue:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._queue.popleft()
+
+    def get_nowait(self):
+        return self._queue.popleft() if self._queue else None
+
+    def pending(self):
+        return len(self._queue)
+
+    def close(self):
+        """取消订阅；已经排队的句子仍然可以读出"""
+        if not self.closed:
+            self.closed = True
+            self.bus._subscribers.discard(self)
+            self._wake()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SentenceBus:
+    """进程内的句子发布/订阅
+
+    publish() 在句子写入最终文件时由 save.write_sentences 调用，只做入队，不等待订阅者；
+    每个订阅者有自己的有界队列和满队列策略，读得慢的订阅者不会拖慢录制或其他订阅者。
+    publish() 和订阅者都在事件循环线程中使用。
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self.seq = 0
+        self.dropped = 0  # 所有订阅者丢弃的句子数（包括已经关闭的订阅）
+
+    def subscribe(self, maxsize=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST):
+        subscription = Subscription(self, maxsize, policy)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def pending(self):
+        """各订阅队列中等待读取的句子总数"""
+        return sum(subscription.pending() for subscription in list(self._subscribers))
+
+    def publish(self, sentences, session=None, filename=None):
+        if not self._subscribers:
+            self.seq += len(sentences)
+            return
+        subscribers = list(self._subscribers)
+        for sentence in sentences:
+            self.seq += 1
+            event = SentenceEvent(session, self.seq, sentence.text, sentence.start, sentence.end, filename)
+            for subscription in subscribers:
+                subscription._put(event)
+
+    def close(self):
+        for subscription in list(self._subscribers):
+            subscription.close()
+
+
+sentence_bus = SentenceBus()
+
+metrics.registry.gauge("captions_bus_queue_depth", "Sentences waiting in subscriber queues", sentence_bus.pending)
+metrics.registry.gauge("captions_bus_subscribers", "Sentence subscribers", sentence_bus.subscriber_count)
+metrics.registry.counter("captions_bus_dropped_total", "Sentences dropped by slow subscribers",
+                         lambda: sentence_bus.dropped)
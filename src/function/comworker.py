@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from . import metrics
+
+CALL_TIMEOUT = 2.0  # 事件循环等待一次 UIA 调用的最长秒数
+
+
+class MessagePump:
+    """Windows 上让单线程套间在等待时处理窗口消息
+
+    STA 线程注册的 COM 事件处理器由消息分派调用，线程阻塞在普通的队列上时事件一直送不到。
+    工作线程改为用 MsgWaitForMultipleObjectsEx 同时等待新的调用（notify 设置的事件）和窗口消息。
+    """
+
+    QS_ALLINPUT = 0x04FF
+    MWMO_INPUTAVAILABLE = 0x0004
+    INFINITE = 0xFFFFFFFF
+    WAIT_OBJECT_0 = 0
+    PM_REMOVE = 0x0001
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._kernel32.CreateEventW.restype = wintypes.HANDLE
+        self._kernel32.CreateEventW.argtypes = [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+        self._kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._user32.MsgWaitForMultipleObjectsEx.restype = wintypes.DWORD
+        self._user32.MsgWaitForMultipleObjectsEx.argtypes = [
+            wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+        self._user32.PeekMessageW.argtypes = [
+            ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT, wintypes.UINT]
+        self._msg = wintypes.MSG()
+        self._event = self._kernel32.CreateEventW(None, False, False, None)  # 自动复位
+        if not self._event:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._handles = (wintypes.HANDLE * 1)(self._event)
+        self.dispatched = 0
+
+    def notify(self):
+        """有新的调用（任意线程）"""
+        self._kernel32.SetEvent(self._event)
+
+    def wait(self):
+        """等到 notify() 或者有窗口消息，顺便分派所有待处理的消息"""
+        result = self._user32.MsgWaitForMultipleObjectsEx(
+            1, self._handles, self.INFINITE, self.QS_ALLINPUT, self.MWMO_INPUTAVAILABLE)
+        if result != self.WAIT_OBJECT_0:
+            self.pump()
+
+    def pump(self):
+        user32, msg = self._user32, self._msg
+        while user32.PeekMessageW(self._ctypes.byref(msg), None, 0, 0, self.PM_REMOVE):
+            user32.TranslateMessage(self._ctypes.byref(msg))
+            user32.DispatchMessageW(self._ctypes.byref(msg))
+            self.dispatched += 1
+
+    def close(self):
+        if self._event:
+            self._kernel32.CloseHandle(self._event)
+            self._event = None
+
+
+def default_message_pump():
+    return MessagePump() if sys.platform == "win32" else None
+
+
+class ComWorker:
+    """独占 UI Automation 对象的工作线程（单线程套间）
+
+    所有 UIA 查找、读取和事件订阅都在这个线程中执行，事件循环通过 call() 等待结果，不会被卡住的
+    COM 调用阻塞。COM 调用无法中断：超时后调用仍在线程中运行，在它返回之前新的调用直接超时，
+    不会在它后面排队；还没开始执行的调用被取消时直接跳过。
+    空闲时线程在 MessagePump 中等待并分派窗口消息，在这个线程订阅的 UIA 事件才能送达。
+    """
+
+    def __init__(self, thread_init=None, name="uia-worker", message_pump=default_message_pump):
+        # thread_init 在工作线程中最先调用（初始化 COM），可以返回一个清理函数；默认使用 init_com_thread
+        # message_pump 在工作线程中创建等待对象（notify / wait / close），返回 None 时直接阻塞在队列上
+        self.thread_init = thread_init
+        self.message_pump = message_pump
+        self.name = name
+        self.calls = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.slowest = 0.0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stuck = None  # 已经超时但还在执行的调用
+        self._pump = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        if self.thread_init is None:
+            from .source import init_com_thread
+            cleanup = init_com_thread()
+        else:
+            cleanup = self.thread_init()
+        pump = self.message_pump() if self.message_pump else None
+        self._pump = pump
+        try:
+            while True:
+                item = self._next(pump)
+                if item is None:
+                    break
+                future, func, args = item
+                if not future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                    continue
+                start = time.perf_counter()
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                self.calls += 1
+                self.slowest = max(self.slowest, time.perf_counter() - start)
+        finally:
+            self._pump = None
+            if pump is not None:
+                pump.close()
+            if cleanup:
+                cleanup()
+
+    def _next(self, pump):
+        if pump is None:
+            return self._queue.get()
+        while True:
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                pump.wait()
+
+    def _put(self, item):
+        self._queue.put(item)
+        pump = self._pump
+        if pump is not None:
+            # 线程还没创建 pump 时不用通知：它会先检查队列再等待
+            pump.notify()
+
+    def in_worker_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, func, *args):
+        """在工作线程中执行 func(*args)，返回 concurrent.futures.Future（线程安全）"""
+        self.start()
+        future = concurrent.futures.Future()
+        self._put((future, func, args))
+        return future
+
+    def run(self, func, *args, timeout=None):
+        """在工作线程中执行并等待结果，供不在事件循环中的代码使用"""
+        if self.in_worker_thread():
+            return func(*args)
+        return self.submit(func, *args).result(timeout)
+
+    async def call(self, func, *args, timeout=CALL_TIMEOUT):
+        """在工作线程中执行并等待结果，超时抛出 asyncio.TimeoutError，被取消时跳过还没开始的调用"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        stuck = self._stuck
+        if stuck is not None and not stuck.done():
+            # 上一次超时的调用还没返回，等它到截止时间，不在它后面排队
+            returned = asyncio.Event()
+
+            def wake(_):
+                try:
+                    loop.call_soon_threadsafe(returned.set)
+                except RuntimeError:
+                    pass  # 事件循环已经关闭
+
+            stuck.add_done_callback(wake)
+            try:
+                await asyncio.wait_for(returned.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+        future = self.submit(func, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if future.running():
+                self._stuck = future
+            raise
+
+    def stop(self, timeout=5.0):
+        """处理完已经提交的调用后结束线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._put(None)
+        if threading.current_thread() is not thread:
+            thread.join(timeout)
+
+    def stats(self):
+        pump = self._pump
+        return {"calls": self.calls, "timeouts": self.timeouts, "cancelled": self.cancelled,
+                "slowest": self.slowest, "busy": self._stuck is not None and not self._stuck.done(),
+                "messages": getattr(pump, "dispatched", 0)}
+
+
+com_worker = ComWorker()  # 默认的 UIA 线程，第一次调用时启动
+
+metrics.registry.counter("uia_calls_total", "Calls run on the UIA worker thread", lambda: com_worker.calls)
+metrics.registry.counter("uia_call_timeouts_total", "UIA calls the event loop stopped waiting for",
+                         lambda: com_worker.timeouts)
+metrics.registry.gauge("uia_worker_queue_depth", "Calls waiting for the UIA worker thread",
+                       lambda: com_worker._queue.qsize())
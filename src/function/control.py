@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+import os
+import hmac
+import json
+import stat
+import time
+import socket
+import secrets
+import asyncio
+import getpass
+import logging
+import tempfile
+from .bus import sentence_bus, event_to_dict, DROP_OLDEST, POLICIES
+from . import metrics
+
+DEFAULT_PORT = 47800       # 不支持 Unix socket 时使用的本机 TCP 端口
+CLIENT_QUEUE_SIZE = 256    # 每个客户端待发送回复的上限
+STREAM_QUEUE_SIZE = 1024   # stream 订阅的默认队列长度，可以在请求中用 maxsize 指定
+COMMANDS = ("start", "pause", "resume", "flush", "stop", "status", "stream", "metrics")
+
+log = logging.getLogger(__name__)
+
+
+def default_socket_dir():
+    """默认 Unix socket 所在的目录：$XDG_RUNTIME_DIR，没有时是临时目录里只有本人能访问的子目录"""
+    return os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"savelivecaptions-{getpass.getuser()}")
+
+
+def default_address():
+    """默认控制地址：POSIX 上是 default_socket_dir() 里的 Unix socket，Windows 上是本机 TCP 端口"""
+    if os.name != "nt" and hasattr(socket, "AF_UNIX"):
+        return os.path.join(default_socket_dir(), "savelivecaptions.sock")
+    return f"127.0.0.1:{DEFAULT_PORT}"
+
+
+def ensure_private_dir(directory):
+    """创建权限为 0700 的目录；已经存在时必须属于当前用户且其他人无权访问，
+    否则别人可以预先建好目录或 socket 冒充控制接口
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise OSError(f"control socket directory is not private: {directory}")
+
+
+def token_path(port):
+    """TCP 控制接口的令牌文件，放在用户目录中（Windows 上是 %LOCALAPPDATA%），其他用户读不到
+
+    本机的任何进程都能连上 TCP 端口，只有读得到这个文件的用户才能发送命令。
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, "savelivecaptions", f"control-{port}.token")
+
+
+def write_token(port):
+    """生成新的令牌并写入 token_path(port)（POSIX 上权限为 0600），返回令牌"""
+    token = secrets.token_hex(32)
+    path = token_path(port)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token)
+    if os.name != "nt":
+        os.chmod(path, 0o600)
+    return token
+
+
+def read_token(port):
+    path = token_path(port)
+    try:
+        with open(path, encoding="ascii") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise ConnectionError(f"no control token at {path}; is the control server running?") from None
+
+
+def parse_address(address):
+    """把 "host:port" 解析为 ("tcp", host, port)，其余视为 Unix socket 路径 ("unix", path)"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and host and os.sep not in host:
+        return "tcp", host, int(port)
+    return "unix", address, None
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _Client:
+    """一个控制连接：回复和推送的句子都经过有界队列，由单独的任务依次写出
+
+    推送的句子来自 sentence_bus 的订阅，客户端读得太慢时按订阅的策略丢弃，不影响录制。
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.subscription = None
+        self.handler = None
+        self.task = asyncio.ensure_future(self._send())
+        self._forward = None
+
+    async def reply(self, message):
+        await self.queue.put(message)
+
+    def stream(self, maxsize, policy):
+        if self.subscription is None:
+            self.subscription = sentence_bus.subscribe(maxsize, policy)
+            self._forward = asyncio.ensure_future(self._forward_sentences())
+
+    async def _forward_sentences(self):
+        async for event in self.subscription:
+            await self.queue.put(event_to_dict(event))
+
+    async def finish(self, timeout=1.0):
+        """结束订阅，等待已排队的句子和回复交给连接（连接断开或超时则放弃）"""
+        if self.subscription is not None:
+            self.subscription.close()
+        deadline = time.monotonic() + timeout
+        while not self.task.done() and time.monotonic() < deadline:
+            if self.queue.empty() and (self._forward is None or self._forward.done()):
+                break
+            await asyncio.sleep(0.01)
+
+    def close(self):
+        if self.subscription is not None:
+            self.subscription.close()
+            self._forward.cancel()
+        self.task.cancel()
+        self.writer.close()
+
+    async def _send(self):
+        while True:
+            message = await self.queue.get()
+            self.writer.write(encode(message))
+            await self.writer.drain()
+
+
+class ControlServer:
+    """本机控制接口：每行一个 JSON 请求，例如 {"cmd": "pause", "id": 1}
+
+    TCP 地址上每个连接的第一行必须是 {"cmd": "auth", "token": ...}，令牌在启动时写入
+    token_path(port)，认证失败时回复错误并断开；Unix socket 靠文件权限（0600）限制访问。
+    回复 {"id": 1, "ok": true, "result": {...}}，出错时 {"ok": false, "error": "..."}。
+    "metrics" 返回 function.metrics 的快照（只有启用了指标时才有数据）。
+    "stream" 之后服务端在同一连接上持续推送 {"event": "sentence", ...}（每行一个 JSON，
+    可选 maxsize 和 policy 指定订阅队列的长度和满队列策略，见 function.bus）。
+    可以同时服务多个客户端，所有操作都在事件循环中执行，不阻塞录制。
+    """
+
+    def __init__(self, recorder, address=None):
+        self.recorder = recorder
+        self.address = address or default_address()
+        self._server = None
+        self._clients = set()
+        self._unix_path = None
+        self._token = None
+        self._token_path = None
+
+    async def start(self):
+        kind, host, port = parse_address(self.address)
+        if kind == "tcp":
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self._token = write_token(port)
+            self._token_path = token_path(port)
+        else:
+            if os.path.dirname(host) == default_socket_dir():
+                ensure_private_dir(os.path.dirname(host))
+            self._remove_stale_socket(host)
+            # socket 文件在 bind 时按 umask 创建：只在同步的 bind 期间收紧 umask，
+            # 文件一出现就是 0600，不留下其他用户可以连接的间隙
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            umask = os.umask(0o177)
+            try:
+                sock.bind(host)
+            except OSError:
+                sock.close()
+                raise
+            finally:
+                os.umask(umask)
+            self._server = await asyncio.start_unix_server(self._handle, sock=sock)
+            self._unix_path = host
+        log.info("Control server listening on %s", self.address)
+        return self
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        """上次异常退出留下的 socket 文件没人监听时删除，有人监听时报错"""
+        if not os.path.exists(path):
+            return
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"control socket already in use: {path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # 先把排队的句子发完，再关闭连接，等待各连接的处理任务自行结束，
+        # 不在事件循环退出时留下被取消的任务
+        if self._clients:
+            await asyncio.gather(*(client.finish() for client in self._clients))
+        handlers = [client.handler for client in self._clients]
+        for client in self._clients:
+            client.writer.close()
+        if handlers:
+            await asyncio.wait(handlers, timeout=1.0)
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+        if self._token_path and os.path.exists(self._token_path):
+            os.remove(self._token_path)
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer)
+        client.handler = asyncio.current_task()
+        self._clients.add(client)
+        try:
+            if self._token is not None and not await self._authenticate(client, reader):
+                await client.finish()
+                return
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await client.reply(await self._dispatch(client, line))
+            await client.finish()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(client)
+            client.close()
+
+    async def _authenticate(self, client, reader):
+        request_id, token = None, None
+        try:
+            request = json.loads(await reader.readline())
+            if isinstance(request, dict):
+                request_id = request.get("id")
+                if request.get("cmd") == "auth":
+                    token = request.get("token")
+        except ValueError:
+            pass
+        if isinstance(token, str) and hmac.compare_digest(token, self._token):
+            await client.reply({"id": request_id, "ok": True})
+            return True
+        log.warning("Control connection rejected: missing or wrong token")
+        await client.reply({"id": request_id, "ok": False, "error": "authentication failed"})
+        return False
+
+    async def _dispatch(self, client, line):
+        try:
+            request = json.loads(line)
+            command = request["cmd"]
+        except (ValueError, TypeError, KeyError):
+            return {"ok": False, "error": "expected a JSON object with a \"cmd\" field"}
+        reply = {"id": request.get("id"), "ok": True}
+        try:
+            if command == "status":
+                reply["result"] = self.recorder.status()
+            elif command == "metrics":
+                reply["result"] = metrics.snapshot()
+            elif command == "stream":
+                maxsize = int(request.get("maxsize", STREAM_QUEUE_SIZE))
+                policy = request.get("policy", DROP_OLDEST)
+                if maxsize < 1 or policy not in POLICIES:
+                    raise ValueError(f"stream needs maxsize >= 1 and policy in {', '.join(POLICIES)}")
+                client.stream(maxsize, policy)
+                reply["result"] = {"streaming": True, "maxsize": maxsize, "policy": policy}
+            elif command in COMMANDS:
+                changed = await getattr(self.recorder, command)()
+                reply["result"] = dict(self.recorder.status(), changed=changed)
+            else:
+                return {"id": request.get("id"), "ok": False, "error": f"unknown command: {command}"}
+        except Exception as e:
+            return {"id": request.get("id"), "ok": False, "error": str(e)}
+        return reply
+
+
+async def open_connection(address=None):
+    """连接控制接口，返回 (reader, writer)；TCP 地址先用令牌文件中的令牌完成认证"""
+    kind, host, port = parse_address(address or default_address())
+    if kind != "tcp":
+        return await asyncio.open_unix_connection(host)
+    token = read_token(port)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(encode({"cmd": "auth", "token": token}))
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("control server closed the connection")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise PermissionError(reply.get("error") or "control authentication failed")
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def request(command, address=None, timeout=10.0):
+    """发送一条命令并返回回复"""
+    reader, writer = await open_connection(address)
+    try:
+        writer.write(encode({"cmd": command, "id": 1}))
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("control server closed the connection")
+        return json.loads(line)
+    finally:
+        writer.close()
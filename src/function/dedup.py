@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import time
+import hashlib
+from collections import OrderedDict
+
+DEDUP_MAX_ENTRIES = 2048   # 最多记住的句子数
+DEDUP_TTL = 300.0          # 句子指纹保留的秒数，超过后同样的句子可以再次保存
+
+
+def fingerprint(sentence):
+    """句子的 64 位指纹"""
+    digest = hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class DedupIndex:
+    """有界的去重索引：只保存句子的 64 位指纹，按数量和时间窗口淘汰最早的记录
+
+    用法与原来的 saved_captions 集合相同（in / add），但内存不随录制时长增长，
+    "Yes." "Thank you." 这类正常的重复在时间窗口之后也能再次保存。
+    """
+
+    def __init__(self, max_entries=DEDUP_MAX_ENTRIES, ttl=DEDUP_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # 指纹 -> 加入时间，按加入顺序排列
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expire(self, now):
+        entries = self._entries
+        if self.ttl is not None:
+            deadline = now - self.ttl
+            while entries:
+                key, added = next(iter(entries.items()))
+                if added > deadline:
+                    break
+                entries.popitem(last=False)
+                self.evictions += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, sentence):
+        self._expire(self.clock())
+        if fingerprint(sentence) in self._entries:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, sentence):
+        """记录一个已保存的句子"""
+        now = self.clock()
+        key = fingerprint(sentence)
+        self._entries.pop(key, None)
+        self._entries[key] = now
+        self._expire(now)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """返回命中、未命中和淘汰计数"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+import time
+
+WINDOW_CLASS = "LiveCaptionsDesktopWindow"
+SCROLLVIEWER_ID = "CaptionsScrollViewer"
+TEXT_CHANGED_EVENT_ID = 20015  # UIA_Text_TextChangedEventId
+DETECT_TIMEOUT = 0.5      # 启动时查找窗口的最长秒数
+RESOLVE_TIMEOUT = 0.0     # 录制中重新查找时只查一次，不等待（调用方在事件循环里）
+RESOLVE_BACKOFF = 0.5     # 元素失效后找不到时，第一次重试前等待的秒数
+RESOLVE_BACKOFF_MAX = 8.0  # 重试间隔倍增的上限
+
+
+class UIATree:
+    """通过 uiautomation 查找和读取 Live Captions 的元素，只能在初始化了 COM 的线程中使用"""
+
+    def __init__(self):
+        self._auto = None
+
+    @property
+    def auto(self):
+        if self._auto is None:
+            import uiautomation as auto
+            self._auto = auto
+        return self._auto
+
+    def find_window(self, timeout):
+        window = self.auto.GetRootControl().Control(searchDepth=1, ClassName=WINDOW_CLASS)
+        return window if window.Exists(timeout, 0.1) else None
+
+    def find_scrollviewer(self, window, timeout):
+        element = window.Control(searchDepth=5, AutomationId=SCROLLVIEWER_ID, ClassName="ScrollViewer")
+        return element if element.Exists(timeout, 0.1) else None
+
+    def handle(self, window):
+        return window.NativeWindowHandle
+
+    def is_alive(self, handle):
+        """只调用 user32 的 IsWindow，不跨进程访问 Live Captions"""
+        import ctypes
+        return bool(ctypes.windll.user32.IsWindow(handle))
+
+    def read(self, element):
+        return element.Name
+
+    def subscribe(self, element, callback):
+        """注册 Name 属性变化和文本变化事件，返回 unsubscribe() 需要的列表；失败时抛出异常"""
+        import comtypes
+        auto = self.auto
+        client = auto._AutomationClient.instance()
+        core = client.UIAutomationCore
+        automation = client.IUIAutomation
+        raw = element.Element
+
+        class PropertyChangedHandler(comtypes.COMObject):
+            _com_interfaces_ = [core.IUIAutomationPropertyChangedEventHandler]
+
+            def HandlePropertyChangedEvent(self, sender, propertyId, newValue):
+                callback()
+                return 0
+
+        class TextChangedHandler(comtypes.COMObject):
+            _com_interfaces_ = [core.IUIAutomationEventHandler]
+
+            def HandleAutomationEvent(self, sender, eventId):
+                callback()
+                return 0
+
+        handlers = []
+        property_handler = PropertyChangedHandler()
+        automation.AddPropertyChangedEventHandler(
+            raw, auto.TreeScope.Subtree, None, property_handler,
+            [auto.PropertyId.NamePropertyId])
+        handlers.append((automation, "property", raw, property_handler))
+
+        try:
+            text_handler = TextChangedHandler()
+            automation.AddAutomationEventHandler(
+                TEXT_CHANGED_EVENT_ID, raw,
+                auto.TreeScope.Subtree, None, text_handler)
+            handlers.append((automation, "automation", raw, text_handler))
+        except Exception:
+            # 部分系统不发送文本变化事件，只依赖属性变化即可
+            pass
+        return handlers
+
+    def unsubscribe(self, handlers):
+        for automation, kind, raw, handler in handlers:
+            try:
+                if kind == "property":
+                    automation.RemovePropertyChangedEventHandler(raw, handler)
+                else:
+                    automation.RemoveAutomationEventHandler(TEXT_CHANGED_EVENT_ID, raw, handler)
+            except Exception:
+                pass
+
+
+class FakeAutomationTree:
+    """脚本驱动的假 UI Automation 树，用于在 Linux 上无界面测试
+
+    close() 关闭 Live Captions（旧元素全部失效），open() 重新打开（新的窗口和元素），
+    rebuild() 窗口还在但滚动区域被重建。search_cost 模拟每次查找的耗时。
+    """
+
+    def __init__(self, available=True, search_cost=0.0):
+        self.available = available
+        self.search_cost = search_cost
+        self.text = ""
+        self.searches = 0
+        self.reads = 0
+        self._window = 1
+        self._scrollviewer = 1
+        self._callbacks = []
+
+    def close(self):
+        self.available = False
+        self._window += 1
+
+    def open(self, text=""):
+        self.available = True
+        self._window += 1
+        self.text = text
+
+    def rebuild(self):
+        self._scrollviewer += 1
+
+    def emit(self, text):
+        """更新文本，并通知订阅了当前元素的回调"""
+        self.text = text
+        for element, callback in list(self._callbacks):
+            if element == (self._window, self._scrollviewer):
+                callback()
+
+    def _search(self):
+        self.searches += 1
+        if self.search_cost:
+            time.sleep(self.search_cost)
+
+    def find_window(self, timeout):
+        self._search()
+        return self._window if self.available else None
+
+    def find_scrollviewer(self, window, timeout):
+        self._search()
+        if not self.available or window != self._window:
+            return None
+        return (window, self._scrollviewer)
+
+    def handle(self, window):
+        return window
+
+    def is_alive(self, handle):
+        return self.available and handle == self._window
+
+    def read(self, element):
+        self.reads += 1
+        if not self.available or element != (self._window, self._scrollviewer):
+            raise RuntimeError("element not available")
+        return self.text
+
+    def subscribe(self, element, callback):
+        handler = (element, callback)
+        self._callbacks.append(handler)
+        return [handler]
+
+    def unsubscribe(self, handlers):
+        for handler in handlers:
+            if handler in self._callbacks:
+                self._callbacks.remove(handler)
+
+
+class ElementCache:
+    """Live Captions 窗口和 CaptionsScrollViewer 元素的缓存
+
+    元素只查找一次；每次读取前用窗口句柄检查窗口是否还在（不跨进程访问），读取失败也视为失效。
+    失效后下一次读取立即重新查找，找不到时从 backoff 秒起倍增间隔（最多 max_backoff）重试，
+    期间 read() 返回 None。每次找到新元素 generation 加一，事件订阅据此重新注册。
+    resolves / failed_resolves / invalidations 是查找和失效的次数，outages 是已结束的中断时长。
+    """
+
+    def __init__(self, tree=None, backoff=RESOLVE_BACKOFF, max_backoff=RESOLVE_BACKOFF_MAX, clock=time.monotonic):
+        self.tree = tree if tree is not None else UIATree()
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.window = None
+        self.scrollviewer = None
+        self.handle = None
+        self.generation = 0
+        self.resolves = 0
+        self.failed_resolves = 0
+        self.invalidations = 0
+        self.outages = []
+        self.outage_started = None
+        self.last_error = None
+        self._delay = backoff
+        self._retry_at = 0.0
+
+    def resolve(self, timeout=RESOLVE_TIMEOUT):
+        """查找窗口和滚动区域，找到返回 True；找不到时安排下一次重试的时间"""
+        try:
+            window = self.tree.find_window(timeout)
+            scrollviewer = self.tree.find_scrollviewer(window, timeout) if window is not None else None
+            handle = self.tree.handle(window) if scrollviewer is not None else None
+            self.last_error = None
+        except Exception as e:
+            scrollviewer = None
+            self.last_error = str(e)
+        now = self.clock()
+        if scrollviewer is None:
+            self.failed_resolves += 1
+            self._retry_at = now + self._delay
+            self._delay = min(self._delay * 2, self.max_backoff)
+            return False
+        self.window, self.scrollviewer, self.handle = window, scrollviewer, handle
+        self.generation += 1
+        self.resolves += 1
+        self._delay = self.backoff
+        if self.outage_started is not None:
+            self.outages.append(now - self.outage_started)
+            self.outage_started = None
+        return True
+
+    def valid(self):
+        """缓存的元素是否可用，窗口已经关闭时使缓存失效"""
+        if self.scrollviewer is None:
+            return False
+        try:
+            alive = self.tree.is_alive(self.handle)
+        except Exception:
+            alive = False
+        if not alive:
+            self.invalidate()
+        return alive
+
+    def invalidate(self):
+        """丢弃缓存的元素，开始计算中断时长；下一次 get() 立即重新查找"""
+        if self.scrollviewer is None:
+            return
+        self.window = self.scrollviewer = self.handle = None
+        self.invalidations += 1
+        if self.outage_started is None:
+            self.outage_started = self.clock()
+        self._retry_at = 0.0
+
+    def get(self, timeout=RESOLVE_TIMEOUT):
+        """返回可用的滚动区域元素；不可用且还没到重试时间时返回 None"""
+        if self.valid():
+            return self.scrollviewer
+        if self.clock() < self._retry_at:
+            return None
+        return self.scrollviewer if self.resolve(timeout) else None
+
+    def read(self):
+        """读取滚动区域的文本，元素不可用时返回 None"""
+        element = self.get()
+        if element is None:
+            return None
+        try:
+            return self.tree.read(element)
+        except Exception as e:
+            self.last_error = str(e)
+            self.invalidate()
+            return None
+
+    def outage(self):
+        """当前中断已经持续的秒数，没有中断时为 0"""
+        return 0.0 if self.outage_started is None else self.clock() - self.outage_started
+
+    def stats(self):
+        current = self.outage()
+        return {
+            "available": self.scrollviewer is not None,
+            "resolves": self.resolves,
+            "failed_resolves": self.failed_resolves,
+            "invalidations": self.invalidations,
+            "outages": len(self.outages) + (1 if current else 0),
+            "outage_seconds": sum(self.outages) + current,
+            "longest_outage": max(self.outages + [current]),
+        }
+
+
+live_captions = ElementCache()  # 默认的缓存：lc_detect 找到的元素，录制时直接使用
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import glob
+import heapq
+import sqlite3
+import asyncio
+import threading
+from .bus import sentence_bus
+
+INDEX_NAME = "captions-index.db"   # 默认放在保存目录中
+UPDATE_DELAY = 1.0                  # 收到新句子后等待这么久再读文件，让最终文件的批量写入先落盘
+DAY = 86400
+
+# 行号编码：rowid = 文件编号 << OFFSET_BITS | 行在文件中的字节偏移，单个文件最大 1 TiB
+OFFSET_BITS = 40
+
+_LINE_RE = re.compile(rb"^\[(\d\d):(\d\d):(\d\d)(?:-\d\d:\d\d:\d\d)?\] ([^\r\n]*)", re.M)
+_NAME_RE = re.compile(r"(\d{4})-(\d\d)-(\d\d)_(\d\d)-(\d\d)-(\d\d)")
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_RE = re.compile(f"([{_CJK}])")
+_CJK_RUN_RE = re.compile(f"[{_CJK}]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,   -- 编号不重复使用，重新索引的文件不会匹配到旧词条
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,   -- 已经索引到的字节数
+    first INTEGER,                     -- 第一行的时间
+    last INTEGER NOT NULL              -- 最后一行的时间，也用于判断跨过午夜
+);
+-- 文件中的行按时间排列，按时间搜索时逐个文件按行号读取，不需要时间索引
+CREATE TABLE IF NOT EXISTS lines(id INTEGER PRIMARY KEY, start INTEGER NOT NULL);
+-- 结果按时间排序、不计算相关度，不需要 docsize 表
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(
+    text, content='', columnsize=0, tokenize='unicode61 remove_diacritics 2');
+"""
+
+
+def index_text(text):
+    """中日韩文字之间没有空格，逐字分开后再交给分词器，词组查询按相邻的字匹配"""
+    return text if text.isascii() else _CJK_RE.sub(r" \1 ", text)
+
+
+def fts_query(query):
+    """把搜索语句转换为 FTS5 查询：引号内是词组，词尾 * 是前缀，其余词之间是 AND
+
+    引号外连续的中日韩文字当作一个词组。也可以直接使用 FTS5 的 AND / OR / NOT 语法。
+    """
+    parts = query.split('"')
+    for n in range(0, len(parts), 2):
+        parts[n] = _CJK_RUN_RE.sub(lambda m: '"' + index_text(m.group()) + '"', parts[n])
+    for n in range(1, len(parts), 2):
+        parts[n] = index_text(parts[n])
+    return '"'.join(parts)
+
+
+def recording_start(path):
+    """从文件名 {日期}_{时间}_captions.txt 取得录制开始时间，没有时用文件的修改时间"""
+    match = _NAME_RE.search(os.path.basename(path))
+    if match:
+        fields = [int(v) for v in match.groups()]
+        return int(time.mktime((*fields, 0, 0, -1)))
+    return int(os.path.getmtime(path))
+
+
+def _day_start(stamp):
+    t = time.localtime(stamp)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+class TranscriptIndex:
+    """*_captions.txt 的全文索引（SQLite FTS5）
+
+    只索引文件中新增的完整行，文件只追加时每次更新都是增量的；文件变短（被替换）时重新索引。
+    索引不保存句子原文：FTS5 表不存内容，rowid 编码了文件和行偏移，结果从原文件读出。
+    索引大小与原文相近（英文合成字幕约为原文的 1.3 倍）。同一个对象可以在多个线程中使用，操作依次执行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._paths = {}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, paths):
+        """索引文件或目录（目录下的 *_captions.txt）中新增的行，返回新增的行数"""
+        total = 0
+        for path in paths:
+            if os.path.isdir(path):
+                total += sum(self.update_file(p) for p in sorted(glob.glob(os.path.join(path, "*_captions.txt"))))
+            else:
+                total += self.update_file(path)
+        return total
+
+    def update_file(self, path):
+        """索引一个文件中新增的完整行，返回新增的行数"""
+        path = os.path.abspath(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return 0
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id, size, last FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None and size < row[1]:
+                # 文件被替换或截断：删掉旧的行，换一个文件编号重新索引
+                # （不存内容的 FTS5 表无法删除旧词条，它们没有对应的行，查询时被过滤掉）
+                base = row[0] << OFFSET_BITS
+                self._db.execute("DELETE FROM lines WHERE id BETWEEN ? AND ?", (base, base + (1 << OFFSET_BITS) - 1))
+                self._db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                self._paths.pop(row[0], None)
+                row = None
+            if row is None:
+                last = recording_start(path)
+                file_id = self._db.execute("INSERT INTO files(path, last) VALUES (?, ?)", (path, last)).lastrowid
+                indexed = 0
+            else:
+                file_id, indexed, last = row
+            if size == indexed:
+                return 0
+
+            with open(path, "rb") as f:
+                f.seek(indexed)
+                data = f.read(size - indexed)
+            end = data.rfind(b"\n") + 1  # 只索引完整的行，写了一半的行留到下次
+            times, texts, last = self._parse(file_id, indexed, data[:end], last)
+            self._db.executemany("INSERT INTO lines(id, start) VALUES (?, ?)", times)
+            self._db.executemany("INSERT INTO lines_fts(rowid, text) VALUES (?, ?)", texts)
+            if times:
+                self._db.execute("UPDATE files SET size = ?, first = coalesce(first, ?), last = ? WHERE id = ?",
+                                 (indexed + end, times[0][1], last, file_id))
+            else:
+                self._db.execute("UPDATE files SET size = ? WHERE id = ?", (indexed + end, file_id))
+            return len(times)
+
+    @staticmethod
+    def _parse(file_id, offset, data, last):
+        """解析 [HH:MM:SS] 句子 行，时间按文件名中的日期换算，时间倒退超过半天视为跨过午夜"""
+        base = file_id << OFFSET_BITS
+        day = int(_day_start(last))
+        times, texts = [], []
+        for match in _LINE_RE.finditer(data):
+            h, m, s, text = match.groups()
+            seconds = int(h) * 3600 + int(m) * 60 + int(s)
+            stamp = day + seconds
+            if stamp < last - DAY // 2:
+                day = int(_day_start(last + DAY // 2))
+                stamp = day + seconds
+            last = stamp
+            rowid = base + offset + match.start()
+            times.append((rowid, stamp))
+            texts.append((rowid, index_text(text.decode("utf-8", "replace"))))
+        return times, texts, last
+
+    def search(self, query=None, start=None, end=None, limit=50, newest_first=False):
+        """按全文和/或时间范围搜索，返回 [(时间, 文件, 句子)]，按时间排序"""
+        start = -1 << 62 if start is None else start
+        end = 1 << 62 if end is None else end
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            if query:
+                rows = self._match(fts_query(query), start, end, limit, order)
+            else:
+                rows = self._range(start, end, limit, order)
+        return [(stamp, *self._read_line(rowid)) for rowid, stamp in rows]
+
+    def _match(self, query, start, end, limit, order):
+        """全文搜索：按 rowid（文件编号、行偏移）顺序读取匹配的行，同一文件中的行按时间排列
+
+        文件编号通常随录制时间递增。已经有 limit 行、而后面的文件都不可能有更早（newest_first 时更晚）
+        的行时就停止，不需要取出并排序全部匹配的行；文件时间重叠（同时录制）时结果仍然准确。
+        """
+        newest = order == "DESC"
+        files = self._db.execute(f"SELECT id, first, last FROM files WHERE first IS NOT NULL "
+                                 f"AND last >= ? AND first < ? ORDER BY id {order}", (start, end)).fetchall()
+        if not files:
+            return []
+        # bound[n]：第 n 个及之后的文件中最早的开始时间（newest_first 时为最晚的结束时间）
+        bound, best = [], None
+        for file_id, first, last in reversed(files):
+            value = last if newest else first
+            best = value if best is None else max(best, value) if newest else min(best, value)
+            bound.append(best)
+        bound.reverse()
+        position = {file_id: n for n, (file_id, _, _) in enumerate(files)}
+        low = min(files[0][0], files[-1][0]) << OFFSET_BITS
+        high = ((max(files[0][0], files[-1][0]) + 1) << OFFSET_BITS) - 1
+
+        cursor = self._db.execute(
+            "SELECT l.id, l.start FROM lines_fts JOIN lines l ON l.id = lines_fts.rowid "
+            "WHERE lines_fts MATCH ? AND lines_fts.rowid BETWEEN ? AND ? AND l.start >= ? AND l.start < ? "
+            f"ORDER BY lines_fts.rowid {order}", (query, low, high, start, end))
+        kept = []  # 目前最好的 limit 行，堆顶是其中最差的一行
+        sign = 1 if newest else -1
+        current = None
+        for rowid, stamp in cursor:
+            file_id = rowid >> OFFSET_BITS
+            if file_id != current:
+                current = file_id
+                n = position.get(file_id)
+                if len(kept) == limit and n is not None and sign * bound[n] <= kept[0][0]:
+                    break
+            if len(kept) < limit:
+                heapq.heappush(kept, (sign * stamp, rowid))
+            elif sign * stamp > kept[0][0]:
+                heapq.heapreplace(kept, (sign * stamp, rowid))
+        cursor.close()
+        return sorted(((rowid, sign * key) for key, rowid in kept), key=lambda row: row[1], reverse=newest)
+
+    def _range(self, start, end, limit, order):
+        """只按时间搜索：每个时间重叠的文件按行号顺序取出前 limit 行，再按时间合并"""
+        files = self._db.execute("SELECT id FROM files WHERE first IS NOT NULL AND last >= ? AND first < ?",
+                                 (start, end)).fetchall()
+        per_file = [self._db.execute(
+            f"SELECT id, start FROM lines WHERE id BETWEEN ? AND ? AND start >= ? AND start < ? ORDER BY id {order} LIMIT ?",
+            (file_id << OFFSET_BITS, ((file_id + 1) << OFFSET_BITS) - 1, start, end, limit)).fetchall()
+            for file_id, in files]
+        merged = heapq.merge(*per_file, key=lambda row: row[1], reverse=order == "DESC")
+        return [row for row, _ in zip(merged, range(limit))]
+
+    def _read_line(self, rowid):
+        file_id, offset = rowid >> OFFSET_BITS, rowid & ((1 << OFFSET_BITS) - 1)
+        path = self._paths.get(file_id)
+        if path is None:
+            with self._lock:
+                row = self._db.execute("SELECT path FROM files WHERE id = ?", (file_id,)).fetchone()
+            path = self._paths[file_id] = row[0] if row else None
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                line = f.readline().decode("utf-8", "replace").rstrip("\r\n")
+        except (OSError, TypeError):
+            return path, ""
+        return path, line.split("] ", 1)[1] if "] " in line else line
+
+    def optimize(self):
+        """合并 FTS5 的索引段并把 WAL 写回数据库，批量索引之后调用"""
+        with self._lock:
+            self._db.execute("INSERT INTO lines_fts(lines_fts) VALUES ('optimize')")
+            self._db.commit()
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self):
+        with self._lock:
+            files, indexed = self._db.execute("SELECT count(*), coalesce(sum(size), 0) FROM files").fetchone()
+            lines = self._db.execute("SELECT count(*) FROM lines").fetchone()[0]
+        return {"files": files, "bytes": indexed, "lines": lines}
+
+
+class LiveIndexer:
+    """订阅 sentence_bus，句子写入最终文件后随即更新索引
+
+    收到句子后等待 delay 秒再读取对应的文件，同一段时间内的句子一次处理；
+    SQLite 操作在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, index, delay=UPDATE_DELAY, bus=sentence_bus):
+        self.index = index
+        self.delay = delay
+        self.bus = bus
+        self.updates = 0
+        self._subscription = None
+        self._task = None
+        self._files = set()
+
+    def start(self):
+        self._subscription = self.bus.subscribe()
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def _run(self):
+        while True:
+            event = await self._subscription.get()
+            if event is None:
+                break
+            self._files.add(event.file)
+            await asyncio.sleep(self.delay)
+            while True:
+                event = self._subscription.get_nowait()
+                if event is None:
+                    break
+                self._files.add(event.file)
+            await self.flush()
+
+    async def flush(self):
+        """立即索引已经收到的句子所在的文件（录制停止后调用）"""
+        while self._files:
+            # 处理完才移出集合，中途被取消时 close() 会再处理一次
+            path = next(iter(self._files))
+            if path:
+                self.updates += await asyncio.to_thread(self.index.update_file, path)
+            self._files.discard(path)
+
+    async def close(self):
+        if self._subscription is not None:
+            self._subscription.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
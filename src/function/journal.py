@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import os
+import mmap
+import struct
+import uuid
+import zlib
+from collections import namedtuple
+
+# 记录格式（小端）：
+#   帧头  magic(2) | payload 长度(4) | payload 的 crc32(4)
+#   payload  类型(1) | 序号(8) | 单调时间(8) | 墙上时间(8) | 会话 id(16) | UTF-8 文本
+#   会话 id 是 CaptionStore.session_id 的 ASCII，不足 16 字节补 0
+MAGIC = b"\xc5\x1c"
+_FRAME = struct.Struct("<2sII")
+_HEADER = struct.Struct("<BQdd16s")
+MAX_PAYLOAD = 1 << 20
+
+FRAGMENT = 1    # 一个字幕片段
+CHECKPOINT = 2  # 之前的片段都已写入最终文件，文本是当时未完成的尾部
+
+LOCK_OFFSET = 0x7FFFFFF0  # Windows 下加锁的字节位置（远在文件末尾之后，不影响读取）
+
+Record = namedtuple("Record", ["kind", "seq", "monotonic", "wall", "session", "text"])
+
+
+class Journal:
+    """生成缓存记录：每条记录带会话 id 和递增序号
+
+    session_id 是录制的标识（str 或 bytes），同一次录制的各个分段使用同一个；为 None 时随机生成。
+    """
+
+    def __init__(self, session_id=None):
+        if isinstance(session_id, str):
+            session_id = session_id.encode("ascii")
+        self.session_id = session_id or uuid.uuid4().bytes
+        self.seq = 0
+
+    def _record(self, kind, text, monotonic, wall):
+        self.seq += 1
+        payload = _HEADER.pack(kind, self.seq, monotonic, wall, self.session_id) + text.encode("utf-8")
+        return _FRAME.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+    def fragment(self, text, monotonic, wall):
+        return self._record(FRAGMENT, text, monotonic, wall)
+
+    def checkpoint(self, tail, monotonic, wall):
+        return self._record(CHECKPOINT, tail, monotonic, wall)
+
+
+def _frames(data, offset=0):
+    """逐个找出校验通过的记录，产生 (记录起点, payload 起点, payload 长度)
+
+    遇到损坏的记录（校验失败、长度不合理）时向后寻找下一个 magic 继续；
+    末尾写了一半的记录直接忽略。
+    """
+    end = len(data)
+    frame_size = _FRAME.size
+    while offset + frame_size <= end:
+        magic, length, crc = _FRAME.unpack_from(data, offset)
+        start = offset + frame_size
+        if (magic == MAGIC and _HEADER.size <= length <= MAX_PAYLOAD
+                and start + length <= end
+                and zlib.crc32(data[start:start + length]) == crc):
+            yield offset, start, length
+            offset = start + length
+            continue
+        # 重新同步到下一个 magic
+        offset = data.find(MAGIC, offset + 1, end)
+        if offset < 0:
+            return
+
+
+def decode(data, offset=0):
+    """从 data（bytes 或 mmap）中逐条解析记录"""
+    for _, start, length in _frames(data, offset):
+        kind, seq, monotonic, wall, session = _HEADER.unpack_from(data, start)
+        text = data[start + _HEADER.size:start + length].decode("utf-8", "replace")
+        yield Record(kind, seq, monotonic, wall, session, text)
+
+
+def is_journal(path):
+    """判断文件是否为二进制缓存格式（旧版本是 HH:MM:SS|text 文本行）"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC))
+    except OSError:
+        return False
+    return head == MAGIC or head == b""
+
+
+def read_records(path):
+    """读取缓存文件中的全部有效记录"""
+    with JournalReader(path) as reader:
+        yield from reader.records()
+
+
+class JournalReader:
+    """用 mmap 映射缓存文件，按需解析记录
+
+    文件内容不会整体读入内存，每条记录只在产出时复制自己的文本，
+    几百 MB 的缓存也只占用常数内存。用完后必须 close()，Windows 下映射
+    未关闭时文件不能被清空或删除。
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件不能映射
+            self._data = b""
+
+    def records(self, offset=0):
+        """从 offset 开始逐条产生记录"""
+        return decode(self._data, offset)
+
+    def last_checkpoint(self):
+        """最后一个检查点记录的偏移，没有检查点时返回 0
+
+        从文件末尾向前查找 magic，只有类型字节是检查点的候选才校验 crc，
+        片段记录留给 pending() 顺序解析时校验，每条记录只校验一遍。
+        """
+        data = self._data
+        end = len(data)
+        position = end
+        while True:
+            offset = data.rfind(MAGIC, 0, position)
+            if offset < 0:
+                return 0
+            start = offset + _FRAME.size
+            if start + _HEADER.size <= end and data[start] == CHECKPOINT:
+                _, length, crc = _FRAME.unpack_from(data, offset)
+                if (_HEADER.size <= length <= MAX_PAYLOAD and start + length <= end
+                        and zlib.crc32(data[start:start + length]) == crc):
+                    return offset
+            # 下一次查找允许与这个候选重叠一个字节
+            position = offset + 1
+
+    def pending(self):
+        """最后一个检查点（包含）之后的记录，也就是还没写入最终文件的部分"""
+        return self.records(self.last_checkpoint())
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def lock(f):
+    """对打开的缓存文件加独占锁，表示该录制仍在进行；失败返回 False"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            position = f.tell()
+            f.seek(LOCK_OFFSET)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            finally:
+                f.seek(position)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def is_locked(path):
+    """缓存文件是否被其他正在录制的进程持有"""
+    try:
+        with open(path, "rb") as f:
+            if not lock(f):
+                return True
+            if os.name == "nt":
+                import msvcrt
+                f.seek(LOCK_OFFSET)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        return True
+    return False
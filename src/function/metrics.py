@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "127.0.0.1:47801"  # Prometheus 文本接口的默认地址，只监听本机
+SNAPSHOT_INTERVAL = 10.0              # JSON 快照的默认写入间隔（秒）
+SUB_BUCKETS = 64                      # 直方图每个 2 的幂区间的桶数，分位数相对误差约 1/64
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+enabled = False  # 为 False 时热路径跳过计时和计数，只多一次模块属性判断
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+class Counter:
+    """只增不减的计数；func 不为 None 时取值时调用它（由已有的统计提供）"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, func=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def sample(self):
+        return self.func() if self.func is not None else self.value
+
+    def reset(self):
+        self.value = 0
+
+
+class Gauge(Counter):
+    """当前值，例如队列长度"""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """HDR 风格的对数线性直方图：每个 2 的幂区间等分成 SUB_BUCKETS 个桶，只保存出现过的桶
+
+    observe() 是一次 frexp 和一次字典更新，任意范围的值都有相同的相对精度，内存与观测次数无关。
+    只在事件循环线程中更新。
+    """
+
+    kind = "summary"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.zeros = 0
+        self.buckets = {}
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        key = exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    @staticmethod
+    def _upper(key):
+        exponent, sub = divmod(key, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * SUB_BUCKETS), exponent)
+
+    def quantile(self, q):
+        """第 q 分位数（桶的上界，不超过最大值），没有观测时为 0"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = self.zeros
+        if seen >= rank:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                return min(self._upper(key), self.max)
+        return self.max
+
+    def sample(self):
+        result = {"count": self.count, "sum": self.sum,
+                  "min": self.min if self.count else 0.0, "max": self.max}
+        for q in QUANTILES:
+            result[f"p{q * 100:g}"] = self.quantile(q)
+        return result
+
+
+class Registry:
+    """按名称保存指标，生成 JSON 快照和 Prometheus 文本格式"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, func=None):
+        return self._add(Counter(name, help, func))
+
+    def gauge(self, name, help, func=None):
+        return self._add(Gauge(name, help, func))
+
+    def histogram(self, name, help):
+        return self._add(Histogram(name, help))
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+        self.started = time.time()
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            "time": now,
+            "uptime": now - self.started,
+            "metrics": {name: metric.sample() for name, metric in self.metrics.items()},
+        }
+
+    def prometheus(self):
+        """Prometheus 文本格式（0.0.4），直方图导出为带分位数的 summary"""
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            value = metric.sample()
+            if metric.kind != "summary":
+                lines.append(f"{name} {_number(value)}")
+                continue
+            for q in QUANTILES:
+                lines.append(f'{name}{{quantile="{q:g}"}} {_number(metric.quantile(q))}')
+            lines.append(f"{name}_sum {_number(value['sum'])}")
+            lines.append(f"{name}_count {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()  # 进程内默认的指标，录制的各个环节都写入它
+
+# 捕获：读取 Live Captions
+polls = registry.counter("captions_polls_total", "Reads of the Live Captions window")
+poll_hits = registry.counter("captions_poll_hits_total", "Reads that returned changed text")
+poll_timeouts = registry.counter("captions_poll_timeouts_total", "Reads that timed out")
+read_seconds = registry.histogram("captions_read_seconds", "Time to read the Live Captions window")
+caption_latency = registry.histogram(
+    "captions_latency_seconds", "Time from text first appearing in the window to being saved")
+# 缓存和最终文件
+fragments = registry.counter("captions_fragments_total", "Committed text fragments saved to the cache")
+sentences = registry.counter("captions_sentences_total", "Sentences written to transcripts")
+duplicates = registry.counter("captions_duplicate_sentences_total", "Sentences skipped as duplicates")
+bytes_written = {
+    "cache": registry.counter("captions_cache_bytes_written_total", "Bytes written to cache journals"),
+    "transcript": registry.counter("captions_transcript_bytes_written_total", "Bytes written to transcripts"),
+}
+write_seconds = registry.histogram("captions_write_seconds", "Time to write one batch to a file, including fsync")
+flush_seconds = registry.histogram("captions_flush_seconds", "Time to wait for pending writes in flush_cache")
+merge_seconds = registry.histogram("captions_merge_seconds", "Time to merge the unfinished tail into the transcript")
+
+
+def snapshot():
+    """registry 的快照，另外给出读取命中率和去重命中率"""
+    result = registry.snapshot()
+    values = result["metrics"]
+    read = values[polls.name]
+    saved = values[sentences.name] + values[duplicates.name]
+    result["ratios"] = {
+        "poll_hit_rate": values[poll_hits.name] / read if read else 0.0,
+        "dedup_hit_rate": values[duplicates.name] / saved if saved else 0.0,
+    }
+    return result
+
+
+class SnapshotWriter:
+    """每 interval 秒把 snapshot() 写入 JSON 文件（先写临时文件再替换，读者不会看到半个文件）
+
+    快照中另有 "per_second"：各计数在两次快照之间的增长速度，例如每秒片段数。
+    """
+
+    def __init__(self, path, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.writes = 0
+        self._task = None
+        self._previous = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def build(self):
+        current = snapshot()
+        counters = {name: current["metrics"][name] for name, metric in registry.metrics.items()
+                    if metric.kind == "counter"}
+        if self._previous is not None:
+            then, before = self._previous
+            elapsed = current["time"] - then
+            current["per_second"] = {name: (value - before.get(name, 0)) / elapsed if elapsed > 0 else 0.0
+                                     for name, value in counters.items()}
+        self._previous = (current["time"], counters)
+        return current
+
+    def write(self):
+        data = json.dumps(self.build(), ensure_ascii=False, indent=1)
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp, self.path)
+        self.writes += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.write)
+            except OSError as e:
+                log.warning("Cannot write metrics snapshot %s: %s", self.path, e)
+
+    async def close(self):
+        """停止定时写入，再写最后一次"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.write)
+
+
+class MetricsServer:
+    """本机 HTTP 接口：GET /metrics 返回 Prometheus 文本格式，GET /metrics.json 返回 JSON 快照
+
+    只实现抓取需要的最小 HTTP/1.0，每个请求一个连接；在事件循环中运行，生成一次输出只需遍历指标。
+    """
+
+    def __init__(self, address=None):
+        self.address = address or DEFAULT_ADDRESS
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        host, _, port = self.address.rpartition(":")
+        self._server = await asyncio.start_server(self._handle, host or "127.0.0.1", int(port))
+        # 端口为 0 时由系统分配，记下实际监听的地址
+        self.address = "%s:%d" % self._server.sockets[0].getsockname()[:2]
+        log.info("Metrics on http://%s/metrics", self.address)
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            # 跳过请求头
+            while (await asyncio.wait_for(reader.readline(), 5.0)).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+            if len(parts) < 2 or parts[0] not in ("GET", "HEAD"):
+                status, content_type, body = "405 Method Not Allowed", "text/plain", b"GET only\n"
+            elif path == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+                body = registry.prometheus().encode("utf-8")
+            elif path == "/metrics.json":
+                status, content_type = "200 OK", "application/json"
+                body = json.dumps(snapshot(), ensure_ascii=False).encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"try /metrics or /metrics.json\n"
+            self.requests += 1
+            head = (f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1")
+            writer.write(head if parts and parts[0] == "HEAD" else head + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+import logging
+from .texthook import hook, CaptureState
+from .save import CaptionStore, default_save_dir, recover_orphaned_caches
+
+STOP_TIMEOUT = 5.0  # 停止时等待捕获任务退出的最长秒数
+ROTATION_CHECK_MIN = 0.05  # 分段定时器两次检查的最短间隔（秒）
+
+log = logging.getLogger(__name__)
+
+
+class RecordingSession:
+    """不依赖界面的录制控制，所有方法都在事件循环线程中调用
+
+    start/pause/resume/flush/stop 对应控制栏上的按钮，状态为 stopped、recording、paused。
+    各操作依次执行，不会交错；捕获任务自行结束（来源播放完毕或不可用）时自动停止。
+    source_factory 每次开始录制时创建字幕来源，为 None 时使用 Live Captions。
+    每个会话有自己的文件、缓存、去重索引、暂停标志和捕获状态（store / capture），
+    多个会话可以在同一个事件循环中同时录制，label 会加在文件名的时间后面。
+    rotation（save.Rotation）按时长、大小或句子数把长时间的录制分成多个文件；
+    按时长分段由定时器检查，不依赖新的片段到达，静音或暂停时也按时换文件。
+    """
+
+    def __init__(self, directory=None, source_factory=None, label=None, rotation=None):
+        self.directory = directory
+        self.source_factory = source_factory
+        self.label = label
+        self.store = CaptionStore(rotation)
+        self.capture = CaptureState(self.store)
+        self.state = "stopped"
+        self.started_at = None
+        self._exit_event = None
+        self._hook_task = None
+        self._rotation_task = None
+        self._lock = asyncio.Lock()
+        self._stopped = asyncio.Event()
+        self._stopped.set()
+
+    @property
+    def session_id(self):
+        return self.store.session_id
+
+    @property
+    def filename(self):
+        """当前（分段录制时为最新分段）的最终文件"""
+        return self.store.current_filename
+
+    async def start(self):
+        """开始新的录制，已经在录制时返回 False"""
+        async with self._lock:
+            if self.state != "stopped":
+                return False
+            self.store.reset()
+            self.capture.reset()
+            self._exit_event = asyncio.Event()
+            # 上次异常退出留下的缓存在线程中恢复，不阻塞事件循环上的其他会话和控制接口
+            directory = self.directory or default_save_dir()
+            await asyncio.to_thread(recover_orphaned_caches, directory)
+            filename = self.store.choose_save_dir(directory, self.label, recover=False)
+            source = self.source_factory() if self.source_factory else None
+            self._hook_task = asyncio.create_task(hook(filename, self._exit_event, source, state=self.capture))
+            self._hook_task.add_done_callback(self._capture_done)
+            if self.store.rotation is not None and self.store.rotation.seconds:
+                self._rotation_task = asyncio.create_task(self._rotation_timer())
+            self.state = "recording"
+            self.started_at = time.time()
+            self._stopped.clear()
+            return True
+
+    async def _rotation_timer(self):
+        """到时间就换分段，和其他操作一样持有会话锁"""
+        store = self.store
+        while True:
+            remaining = store.rotation_remaining()
+            if remaining is None:
+                return
+            await asyncio.sleep(max(remaining, ROTATION_CHECK_MIN))
+            async with self._lock:
+                if self.state == "stopped":
+                    return
+                await store.rotate_if_due()
+
+    def _capture_done(self, task):
+        if self._hook_task is task and self.state != "stopped":
+            asyncio.ensure_future(self.stop())
+
+    async def pause(self):
+        """暂停，并把已有内容写入最终文件"""
+        async with self._lock:
+            if self.state != "recording":
+                return False
+            self.store.is_paused = True
+            self.state = "paused"
+            await self._flush()
+            return True
+
+    async def resume(self):
+        async with self._lock:
+            if self.state != "paused":
+                return False
+            self.store.is_paused = False
+            self.state = "recording"
+            return True
+
+    async def flush(self):
+        """整合缓存并等待句子写入最终文件（暂停、预览时调用）"""
+        async with self._lock:
+            if self.state == "stopped":
+                return False
+            await self._flush()
+            return True
+
+    async def _flush(self):
+        # 易变尾部先提交，否则要等捕获循环下一次醒来，那时已经合并过了
+        capture = self.capture
+        await capture.save_committed(capture.caption_model.flush())
+        self.store.merge_cache_to_file()
+        await self.store.flush_cache()
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        """结束捕获，整合缓存，关闭文件并删除缓存"""
+        async with self._lock:
+            if self.state == "stopped":
+                return False
+            self._exit_event.set()
+            timer, self._rotation_task = self._rotation_task, None
+            if timer is not None:
+                timer.cancel()
+            task, self._hook_task = self._hook_task, None
+            if task is not None and not task.done():
+                try:
+                    await asyncio.wait_for(task, timeout)
+                except asyncio.TimeoutError:
+                    log.warning("Capture did not stop in time, cancelled")
+            store = self.store
+            await store.flush_cache()
+            store.merge_cache_to_file()
+            await store.close_cache()
+            await store.close_file()
+            store.cleanup_cache()
+            store.release_name()
+            self.state = "stopped"
+            self._stopped.set()
+            return True
+
+    async def wait(self):
+        """等待当前录制结束（有限来源播放完毕、来源不可用或者被停止）"""
+        await self._stopped.wait()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "session": self.store.session_id,
+            "label": self.label,
+            "filename": self.filename,
+            "cache_filename": self.store.cache_filename,
+            "part": self.store.part,
+            "manifest": self.store.manifest_filename,
+            "started_at": self.started_at,
+            "source": self.capture.source.stats() if self.capture.source is not None else {},
+        }
+
+
+class SessionManager:
+    """在同一个事件循环中同时运行多个 RecordingSession，例如多个来源或按小时分段
+
+    会话按 session id 索引；自行结束的会话保留在列表中，直到 remove() 或 stop_all()。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.sessions = {}
+
+    async def start(self, source_factory=None, label=None, directory=None, rotation=None):
+        """创建并开始一个会话，返回 RecordingSession"""
+        session = RecordingSession(directory or self.directory, source_factory, label, rotation)
+        await session.start()
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def active(self):
+        return [s for s in self.sessions.values() if s.state != "stopped"]
+
+    async def stop(self, session_id):
+        session = self.sessions.get(session_id)
+        return await session.stop() if session else False
+
+    def remove(self, session_id):
+        """移除已经停止的会话"""
+        session = self.sessions.get(session_id)
+        if session is not None and session.state == "stopped":
+            del self.sessions[session_id]
+            return True
+        return False
+
+    async def stop_all(self):
+        """停止全部会话并清空列表"""
+        await asyncio.gather(*(s.stop() for s in self.sessions.values()))
+        self.sessions.clear()
+
+    async def wait_all(self):
+        """等待全部会话结束（有限来源播放完毕或者被停止）"""
+        await asyncio.gather(*(s.wait() for s in self.sessions.values()))
+
+    def status(self):
+        return [s.status() for s in self.sessions.values()]
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+
+
+class AsyncRuntime:
+    """进程内唯一的 asyncio 事件循环，运行在独立线程中
+
+    UI 线程通过 call() / submit() 把命令交给事件循环，不再用 Tk 定时器反复驱动循环；
+    没有任务时事件循环阻塞在 select 上，不产生任何唤醒。
+    UI 线程不要阻塞等待 submit() 的结果，结果应通过 TkBridge.post() 送回 UI 线程。
+    """
+
+    def __init__(self, thread_init=None, name="asyncio-runtime"):
+        # thread_init 在事件循环线程中最先调用（例如初始化 COM），可以返回一个清理函数
+        self.thread_init = thread_init
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._cleanup = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """启动事件循环线程，立即返回自身
+
+        asyncio 在事件循环线程中导入，thread_init（导入 uiautomation 可能需要一秒以上）是事件循环的
+        第一个回调，都不占用界面线程的启动时间；call() / submit() 等到事件循环创建后才提交，
+        任务都排在 thread_init 后面执行。
+        """
+        if self._thread is None:
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        if self.thread_init:
+            loop.call_soon(self._init_thread)
+        self._ready.set()
+        try:
+            loop.run_forever()
+            # 停止后取消剩余的任务，让它们执行各自的清理代码
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+            if self._cleanup:
+                self._cleanup()
+                self._cleanup = None
+
+    def _init_thread(self):
+        try:
+            self._cleanup = self.thread_init()
+        except Exception as e:
+            # logging 只在出错时导入，不拖慢界面启动
+            import logging
+            logging.getLogger(__name__).error("Runtime thread init failed: %s", e)
+
+    def wait_ready(self):
+        """等待事件循环创建完成，需要直接使用 self.loop 时调用，返回自身"""
+        self._ready.wait()
+        return self
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self._thread
+
+    def call(self, func, *args):
+        """在事件循环线程中调用普通函数（线程安全，不等待结果）"""
+        self.wait_ready().loop.call_soon_threadsafe(func, *args)
+
+    def submit(self, coro):
+        """在事件循环中运行协程，返回 concurrent.futures.Future"""
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coro, self.wait_ready().loop)
+
+    def stop(self, timeout=5.0):
+        """停止事件循环；在其他线程调用时等待线程结束"""
+        thread = self._thread
+        if thread is None:
+            return
+        if not self.wait_ready().loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if threading.current_thread() is not thread:
+            thread.join(timeout)
+        self._thread = None
+
+
+def tcl_threaded(widget):
+    """Tcl 是否为线程版本（线程版本才允许在其他线程向 Tk 发送事件）"""
+    try:
+        return widget.tk.eval("set tcl_platform(threaded)") == "1"
+    except Exception:
+        return False
+
+
+class TkBridge:
+    """事件循环线程 → Tk 主线程的状态通道
+
+    post() 可以在任意线程调用：回调放入队列，再用一个虚拟事件唤醒 Tk 主线程执行，
+    同一批回调只唤醒一次。Tcl 不是线程版本时退回到每 fallback_interval 毫秒检查一次队列。
+    """
+
+    EVENT = "<<RuntimeWakeup>>"
+
+    def __init__(self, widget, threaded=None, fallback_interval=50):
+        self.widget = widget
+        self.threaded = tcl_threaded(widget) if threaded is None else threaded
+        self.fallback_interval = fallback_interval
+        self.wakeups = 0
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pending = False
+        self._closed = False
+        self._main_thread = threading.current_thread()
+        widget.bind(self.EVENT, self._drain)
+        if not self.threaded:
+            widget.after(fallback_interval, self._poll)
+
+    def post(self, func, *args):
+        """在 Tk 主线程中执行 func(*args)"""
+        if self._closed:
+            return
+        if threading.current_thread() is self._main_thread:
+            func(*args)
+            return
+        self._queue.put((func, args))
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        if self.threaded:
+            try:
+                self.widget.event_generate(self.EVENT, when="tail")
+            except Exception:
+                # 窗口已经关闭或主循环已经退出
+                self._closed = True
+
+    def _drain(self, event=None):
+        with self._lock:
+            self._pending = False
+        self.wakeups += 1
+        while True:
+            try:
+                func, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                import logging
+                logging.getLogger(__name__).exception("UI callback error: %s", e)
+
+    def _poll(self):
+        if self._closed:
+            return
+        if not self._queue.empty():
+            self._drain()
+        self.widget.after(self.fallback_interval, self._poll)
+
+    def close(self):
+        """窗口销毁前调用，之后的 post() 被忽略"""
+        self._closed = True
@@ -1,192 +1,752 @@
 # -*- coding: utf-8 -*-
-import sys
 import os
 import asyncio
-import tkinter as tk
-from tkinter import filedialog
 import time
-import aiofiles
-import re
+import uuid
+import json
+import logging
+import weakref
+import threading
+from collections import namedtuple
+from itertools import islice
+from .dedup import DedupIndex
+from .segmenter import default_segmenter
+from .bus import sentence_bus
+from . import metrics
+from .journal import Journal, FRAGMENT, CHECKPOINT, JournalReader, is_journal, is_locked, lock
+
+CACHE_BATCH_BYTES = 4096   # 批量写入的大小阈值
+CACHE_BATCH_DELAY = 0.25   # 批量写入的时间阈值（秒）
+CACHE_DURABILITY = "os"    # "os": 每批交给系统；"fsync": 每批强制落盘
+MAX_TAIL_CHARS = 4000      # 未完成句子的最大长度，超过后强制输出
+REPLAY_BATCH = 1000        # 从缓存回放时每批写入的句子数
+SENTENCE_END_TIME = False  # 为 True 时句子写成 [开始-结束] 句子
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+_writers = weakref.WeakSet()  # 正在运行的 CacheWriter，用于统计队列长度
+
+
+class CacheWriter:
+    """后台批量写入任务（缓存文件和最终文件共用）：从队列合并片段，按大小或时间阈值一次写入
+
+    每批只有一次线程切换和一次 write 系统调用，durability 为 "fsync" 时再加一次 fsync。
+    队列中的 flush/truncate/after 命令按顺序执行，保证之前的片段已经处理。
+    exclusive 为 True 时对文件加锁，表示录制仍在进行，启动恢复不会处理它。
+    kind 是 "cache" 或 "transcript"，写入的字节数分别计入对应的指标。
+    """
+
+    def __init__(self, filename, max_bytes=None, max_delay=None, durability=None, exclusive=False, kind="cache"):
+        self.filename = filename
+        self.exclusive = exclusive
+        self.kind = kind
+        self.max_bytes = CACHE_BATCH_BYTES if max_bytes is None else max_bytes
+        self.max_delay = CACHE_BATCH_DELAY if max_delay is None else max_delay
+        self.durability = CACHE_DURABILITY if durability is None else durability
+        if self.durability not in ("os", "fsync"):
+            raise ValueError(f"unknown durability: {self.durability}")
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._file = None
+        self.fragments = 0
+        self.batches = 0
+        self.bytes_written = 0
+
+    def start(self):
+        """在当前事件循环中启动写入任务"""
+        if self._task is None:
+            self._file = open(self.filename, "ab", buffering=0)
+            if self.exclusive and not lock(self._file):
+                log.warning("Cache file is locked by another recording: %s", self.filename)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            _writers.add(self)
+
+    def put(self, data):
+        """放入一段内容（str 或 bytes），不等待写入"""
+        self.fragments += 1
+        self._queue.put_nowait(data)
+
+    def put_after(self, data, writer):
+        """等 writer 之前放入的内容写完后再写入 data（先写最终文件，再写检查点）"""
+        self._queue.put_nowait(("after", (writer, data)))
+
+    async def _command(self, name):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((name, future))
+        await future
+
+    async def flush(self):
+        """屏障：等待之前放入的片段全部写入"""
+        await self._command("flush")
+
+    def truncate(self, after=None):
+        """在之前的片段写入后清空缓存文件（合并完成后使用）
+
+        after 是最终文件的 CacheWriter 时还要等它之前放入的句子写完，和 put_after 一样，
+        否则缓存已经清空而尾部的句子还没落盘，这时崩溃会丢掉它们。
+        """
+        self._queue.put_nowait(("truncate", after))
+
+    async def close(self):
+        """写完剩余片段后关闭文件"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        _writers.discard(self)
+
+    def _write(self, data):
+        self._file.write(data)
+        if self.durability == "fsync":
+            os.fsync(self._file.fileno())
+
+    def _truncate(self):
+        self._file.truncate(0)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        pending = []
+        pending_bytes = 0
+        deadline = None
+        try:
+            while True:
+                item = None
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                elif deadline is None:
+                    item = await self._queue.get()
+                else:
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), max(0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        pass
+
+                if isinstance(item, (str, bytes)):
+                    data = item.encode("utf-8") if isinstance(item, str) else item
+                    pending.append(data)
+                    pending_bytes += len(data)
+                    if deadline is None:
+                        deadline = loop.time() + self.max_delay
+                    if pending_bytes < self.max_bytes and loop.time() < deadline:
+                        continue
+
+                # 达到阈值、超时或收到命令：先写出当前批次
+                if pending:
+                    data = b"".join(pending)
+                    pending = []
+                    pending_bytes = 0
+                    if metrics.enabled:
+                        started = time.perf_counter()
+                        await asyncio.to_thread(self._write, data)
+                        metrics.write_seconds.observe(time.perf_counter() - started)
+                        metrics.bytes_written[self.kind].inc(len(data))
+                    else:
+                        await asyncio.to_thread(self._write, data)
+                    self.batches += 1
+                    self.bytes_written += len(data)
+                deadline = None
+
+                if item is _STOP:
+                    break
+                if isinstance(item, tuple):
+                    command, arg = item
+                    if command == "truncate":
+                        if arg is not None:
+                            await arg.flush()
+                        await asyncio.to_thread(self._truncate)
+                    elif command == "after":
+                        writer, data = arg
+                        await writer.flush()
+                        pending.append(data)
+                        pending_bytes += len(data)
+                        deadline = loop.time() + self.max_delay
+                    elif command == "flush" and not arg.done():
+                        arg.set_result(None)
+        finally:
+            self._file.close()
+
+
+metrics.registry.gauge("captions_write_queue_depth", "Fragments and commands waiting in file writers",
+                       lambda: sum(writer._queue.qsize() for writer in list(_writers)))
+
+# 一个完整的句子：start/end 是首字符和末字符所在片段的时间
+Sentence = namedtuple("Sentence", ["text", "start", "end"])
+
+# 分段条件：当前分段的时长（秒）、最终文件大小（字节）或句子数达到任意一个时换到下一个分段
+Rotation = namedtuple("Rotation", ["seconds", "bytes", "sentences"], defaults=(None, None, None))
+
+
+def format_timestamp(stamp):
+    """把时间戳格式化为 HH:MM:SS（从缓存文件回放的字符串原样返回）"""
+    if isinstance(stamp, str):
+        return stamp
+    return time.strftime("%H:%M:%S", time.localtime(stamp))
+
+
+class SentenceAssembler:
+    """流式句子拼接：片段到达时立即切出完整的句子，内存中只保留未完成的尾部
+
+    尾部同时记录每个片段在尾部中的起始偏移和时间，切句子时顺带查出
+    每个句子首尾字符所属的片段，不需要再扫描一遍文本。
+    断句和空白规范化由 segmenter 完成。
+    """
+
+    RESCAN = 8  # 上一个片段末尾待定的 "3." "..." 需要结合新片段重新判断
+
+    def __init__(self, max_tail=MAX_TAIL_CHARS, segmenter=None):
+        self.max_tail = max_tail
+        self.segmenter = segmenter or default_segmenter
+        self.tail = ""
+        self.marks = []  # (片段在尾部中的起始偏移, 片段时间)
+
+    def feed(self, text, stamp):
+        """输入一个片段，返回已完成的 Sentence 列表"""
+        # 之前的尾部已经确认没有句末，只从它的末尾附近开始找
+        start = max(0, len(self.tail.rstrip()) - self.RESCAN)
+        self.marks.append((len(self.tail), stamp))
+        self.tail += text
+
+        cut = self.segmenter.last_boundary(self.tail, start)
+        if cut is None:
+            if len(self.tail) <= self.max_tail:
+                return []
+            # 长时间没有标点，在最后一个空白处强制断句，保证内存有界
+            cut = max(self.tail.rfind(" "), len(self.tail) // 2) + 1
+        return self._emit(cut)
+
+    def finish(self):
+        """输出未完成的尾部（暂停、停止时调用）"""
+        return self._emit(len(self.tail))
+
+    def _emit(self, cut):
+        done, marks = self.tail[:cut], self.marks
+        sentences = []
+        m = 0
+        # 按句末切分，标点跟在句子后面；最后一段没有标点也算一句
+        for start, end in self.segmenter.spans(done):
+            raw = done[start:end]
+            text = self.segmenter.normalize(raw)
+            if text:
+                first = start + len(raw) - len(raw.lstrip())
+                last = start + len(raw.rstrip()) - 1
+                while m + 1 < len(marks) and marks[m + 1][0] <= first:
+                    m += 1
+                first_stamp = marks[m][1]
+                n = m
+                while n + 1 < len(marks) and marks[n + 1][0] <= last:
+                    n += 1
+                sentences.append(Sentence(text, first_stamp, marks[n][1]))
+
+        # 尾部保留切点之后的文本，以及覆盖这些文本的片段时间
+        self.tail = self.tail[cut:]
+        remaining = []
+        for offset, stamp in marks:
+            if offset <= cut:
+                remaining = [(0, stamp)]
+            else:
+                remaining.append((offset - cut, stamp))
+        self.marks = remaining if self.tail else []
+        return sentences
 
-cache_handle = None
-saved_captions = set()
-save_dir = ""
-current_filename = None
-cache_filename = None
-is_paused = False
-line_buffer = []  # 用于记录每行的信息：(timestamp, text)
 
-def choose_save_dir():
-    global save_dir, current_filename, cache_filename
+def format_sentence(sentence):
+    """最终文件中的一行：[HH:MM:SS] 句子"""
+    timestamp = format_timestamp(sentence.start)
+    if SENTENCE_END_TIME:
+        timestamp += "-" + format_timestamp(sentence.end)
+    return f"[{timestamp}] {sentence.text}\n"
 
-    # 获取当前脚本所在目录的上级目录（项目根目录）
+def default_save_dir():
+    """项目根目录下的 new 文件夹"""
     script_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    default_dir = os.path.join(script_dir, "new")
-
-    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())
-
-    # 默认使用项目根目录下的 new 文件夹
-    save_dir = default_dir
-    os.makedirs(save_dir, exist_ok=True)
+    return os.path.join(script_dir, "new")
+
+def _claim_name(directory, stem):
+    """同一秒开始的多个录制使用不同的文件名：已被占用时加 -2、-3 …"""
+    name, n = stem, 1
+    while (os.path.join(directory, name) in _claimed_names
+           or os.path.exists(os.path.join(directory, f"{name}_captions.txt"))
+           or os.path.exists(os.path.join(directory, f"{name}_cache.tmp"))):
+        n += 1
+        name = f"{stem}-{n}"
+    _claimed_names.add(os.path.join(directory, name))
+    return name
+
+
+class CaptionStore:
+    """一次录制的保存状态：最终文件、缓存日志、句子拼接、去重索引和暂停标志
+
+    每个 RecordingSession 有自己的 CaptionStore，多个录制可以在同一个事件循环中同时进行。
+    模块级的 save_to_cache()、merge_cache_to_file() 等函数操作默认的 store，供单录制的界面使用。
+    """
+
+    def __init__(self, rotation=None):
+        self.rotation = rotation  # Rotation，为 None 时整个录制写入一个文件
+        self._rotating = asyncio.Lock()  # 捕获循环和定时器都可能换分段，同一时间只换一次
+        self.reset()
+
+    def reset(self):
+        """重置状态以开始新的录制"""
+        self.release_name()
+        self.cache_writer = None
+        self.cache_journal = None
+        self.final_writer = None
+        self.assembler = None
+        self.saved_captions = DedupIndex()  # 最近保存过的句子指纹，有界
+        self.save_dir = ""
+        self.current_filename = None
+        self.cache_filename = None
+        self.session_id = None  # 当前录制的标识，随发布的句子一起送给订阅者
+        self.is_paused = False
+        self.clock_origin = None  # (墙上时间, 单调时间)，录制开始时确定
+        self._name = None
+        self.part = 0
+        self.manifest_filename = None
+        self.segment_started = None
+        self.segment_bytes = 0
+        self.segment_sentences = 0
+        self._label = None
+
+    def choose_save_dir(self, directory=None, label=None, recover=True):
+        """确定这次录制的文件名 {时间}[_label]_captions.txt 和对应的缓存文件，返回最终文件名
+
+        设置了 rotation 时文件名为 {分段开始时间}[_label]_partNNN_captions.txt，
+        各分段记录在 {录制开始时间}[_label]_manifest.jsonl 中。
+        recover 为 False 时不恢复异常退出留下的缓存（调用者已经在线程中恢复过）。
+        """
+        # 默认使用项目根目录下的 new 文件夹
+        self.save_dir = directory or default_save_dir()
+        os.makedirs(self.save_dir, exist_ok=True)
+
+        # 上次异常退出留下的缓存先恢复到对应的最终文件
+        if recover:
+            recover_orphaned_caches(self.save_dir)
+
+        self._label = label
+        self.part = 0
+        self.session_id = uuid.uuid4().hex[:12]
+        self._next_segment()
+        if self.rotation is not None:
+            self.manifest_filename = self._name.rsplit("_part", 1)[0] + "_manifest.jsonl"
+        return self.current_filename
+
+    def _next_segment(self):
+        """给下一个分段（不分段时就是整个录制）分配文件名"""
+        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())
+        stem = f"{timestamp}_{self._label}" if self._label else timestamp
+        if self.rotation is not None:
+            self.part += 1
+            stem += f"_part{self.part:03d}"
+        self.release_name()
+        name = _claim_name(self.save_dir, stem)
+        self._name = os.path.join(self.save_dir, name)
+        self.current_filename = os.path.join(self.save_dir, f"{name}_captions.txt")
+        self.cache_filename = os.path.join(self.save_dir, f"{name}_cache.tmp")
+        self.segment_started = time.monotonic()
+        self.segment_bytes = 0
+        self.segment_sentences = 0
+        self._segment_wall = time.time()
+
+    def release_name(self):
+        """录制结束后释放文件名，之后的录制可以重新使用（文件已存在时仍会避开）"""
+        name = getattr(self, "_name", None)
+        if name is not None:
+            _claimed_names.discard(name)
+            self._name = None
+
+    def now(self):
+        """当前墙上时间，由单调时钟推算，录制期间不受系统时间调整影响"""
+        if self.clock_origin is None:
+            self.clock_origin = (time.time(), time.monotonic())
+        wall, mono = self.clock_origin
+        return wall + (time.monotonic() - mono)
+
+    async def save_to_cache(self, text):
+        """保存原始文本片段到缓存文件，带时间戳"""
+        if not self.cache_filename:
+            return
+        if self._rotating.locked():
+            # 定时器正在换分段，等新的缓存和最终文件就绪再写入
+            async with self._rotating:
+                pass
+
+        if self.cache_writer is None:
+            self.cache_writer = CacheWriter(self.cache_filename, exclusive=True)
+            self.cache_writer.start()
+            self.cache_journal = Journal(self.session_id)
+        if self.final_writer is None and self.current_filename:
+            self.final_writer = CacheWriter(self.current_filename, kind="transcript")
+            self.final_writer.start()
+        if self.assembler is None:
+            self.assembler = SentenceAssembler()
+
+        if metrics.enabled:
+            metrics.fragments.inc()
+        monotonic = time.monotonic()
+        stamp = self.now()
+        self.cache_writer.put(self.cache_journal.fragment(text, monotonic, stamp))  # 后台任务批量写入
+
+        # 完整的句子立即写入最终文件，之后记录检查点
+        assembler = self.assembler
+        sentences = assembler.feed(text, stamp)
+        if sentences:
+            self.write_sentences(sentences)
+            checkpoint = self.cache_journal.checkpoint(assembler.tail, monotonic, assembler.marks[0][1] if assembler.marks else stamp)
+            if self.final_writer is not None:
+                self.cache_writer.put_after(checkpoint, self.final_writer)
+            else:
+                self.cache_writer.put(checkpoint)
+
+        if self.rotation is not None and self.rotation_due():
+            await self.rotate_if_due()
+
+    async def rotate_if_due(self):
+        """满足分段条件时换到下一个分段，返回是否换了
+
+        片段到达时由 save_to_cache 检查；只按时长分段时，静音或暂停期间由 RecordingSession 的定时器检查。
+        """
+        async with self._rotating:
+            if self.rotation is None or not self.current_filename or not self.rotation_due():
+                return False
+            await self.rotate()
+            return True
+
+    def rotation_remaining(self):
+        """距离按时长换分段还有多少秒，没有设置时长时返回 None"""
+        if self.rotation is None or not self.rotation.seconds or self.segment_started is None:
+            return None
+        return self.rotation.seconds - (time.monotonic() - self.segment_started)
+
+    def rotation_due(self):
+        rotation = self.rotation
+        if rotation.sentences and self.segment_sentences >= rotation.sentences:
+            return True
+        if rotation.bytes and self.segment_bytes >= rotation.bytes:
+            return True
+        return bool(rotation.seconds) and time.monotonic() - self.segment_started >= rotation.seconds
+
+    async def rotate(self):
+        """结束当前分段，换到新的最终文件和缓存，未完成的句子带到新分段
+
+        只在句子边界换文件：已完成的句子都在旧分段里，去重索引跨分段保留，
+        未完成的尾部作为新缓存的第一个检查点，所以分段之间既没有缺口也没有重复。
+        旧的最终文件先写完，新缓存的检查点落盘后才删除旧缓存，任何时刻崩溃都能恢复。
+        """
+        old_cache, old_cache_filename = self.cache_writer, self.cache_filename
+        if old_cache is not None:
+            # 旧缓存中等待最终文件写完的检查点先处理完，再关闭最终文件
+            await old_cache.flush()
+        await self.close_file()
+        self._next_segment()
+
+        self.cache_writer = CacheWriter(self.cache_filename, exclusive=True)
+        self.cache_writer.start()
+        self.cache_journal = Journal(self.session_id)
+        assembler = self.assembler
+        if assembler is not None and assembler.tail:
+            self.cache_writer.put(self.cache_journal.checkpoint(assembler.tail, time.monotonic(), assembler.marks[0][1]))
+            await self.cache_writer.flush()
+
+        if old_cache is not None:
+            await old_cache.close()
+        if old_cache_filename and os.path.exists(old_cache_filename):
+            os.remove(old_cache_filename)
+        log.info("Rotated to %s", self.current_filename)
+
+    async def flush_cache(self):
+        """等待缓存片段和句子全部写入文件（暂停、预览、停止前调用）"""
+        started = time.perf_counter()
+        if self.cache_writer is not None:
+            await self.cache_writer.flush()
+        if self.final_writer is not None:
+            await self.final_writer.flush()
+        if metrics.enabled:
+            metrics.flush_seconds.observe(time.perf_counter() - started)
+
+    def write_sentences(self, sentences):
+        """把 Sentence 追加到最终文件，每句带自己的开始时间，跳过重复的句子"""
+        lines = []
+        saved = []
+        duplicates = 0
+        saved_captions = self.saved_captions
+        debug = log.isEnabledFor(logging.DEBUG)
+        for sentence in sentences:
+            # 避免重复保存（只在去重窗口内判断）
+            if sentence.text and sentence.text not in saved_captions:
+                lines.append(format_sentence(sentence))
+                saved.append(sentence)
+                saved_captions.add(sentence.text)
+                if debug:
+                    log.debug("Saved sentence: %s...", sentence.text[:60])
+            elif sentence.text:
+                duplicates += 1
+        if metrics.enabled:
+            metrics.sentences.inc(len(lines))
+            metrics.duplicates.inc(duplicates)
+
+        if not lines or not self.current_filename:
+            return
+        # 句子一确定就推送给订阅者，不等最终文件落盘
+        sentence_bus.publish(saved, self.session_id, self.current_filename)
+        data = "".join(lines).encode("utf-8")
+        self.segment_bytes += len(data)
+        self.segment_sentences += len(lines)
+        if self.final_writer is not None:
+            self.final_writer.put(data)
+        else:
+            with open(self.current_filename, "ab") as f:
+                f.write(data)
 
-    current_filename = os.path.join(save_dir, f"{timestamp}_captions.txt")
-    cache_filename = os.path.join(save_dir, f"{timestamp}_cache.tmp")
+    def merge_cache_to_file(self):
+        """把未完成的尾部写入最终文件并清空缓存，只处理尾部，与录制时长无关"""
+        cache_filename = self.cache_filename
+        if not cache_filename or not os.path.exists(cache_filename):
+            return
 
-    return current_filename
+        started = time.perf_counter()
+        try:
+            if self.assembler is None:
+                # 本进程没有处理过片段（例如重启后），从缓存文件回放
+                self.assembler = SentenceAssembler()
+                replay = replay_cache(cache_filename, self.assembler)
+                while True:
+                    # 分批写入，没有检查点的大缓存也不会把全部句子留在内存里
+                    batch = list(islice(replay, REPLAY_BATCH))
+                    if not batch:
+                        break
+                    self.write_sentences(batch)
+
+            self.write_sentences(self.assembler.finish())
+
+            # 清空缓存文件；写入任务还在运行时由它按顺序清空，避免未写完的片段在清空后落盘，
+            # 并且等最终文件写完刚才的句子
+            if self.cache_writer is not None:
+                self.cache_writer.truncate(self.final_writer)
+            else:
+                with open(cache_filename, "w", encoding="utf-8") as f:
+                    f.write("")
+
+        except Exception as e:
+            log.error("Error merging cache: %s", e)
+        if metrics.enabled:
+            metrics.merge_seconds.observe(time.perf_counter() - started)
+
+    async def close_cache(self):
+        """关闭缓存文件"""
+        if self.cache_writer is not None:
+            await self.cache_writer.close()
+            self.cache_writer = None
+
+    async def close_file(self):
+        """关闭最终文件；分段录制时把这个分段记入清单"""
+        if self.final_writer is not None:
+            await self.final_writer.close()
+            self.final_writer = None
+        if self.manifest_filename and self.segment_started is not None:
+            self._write_manifest()
+            self.segment_started = None
+
+    def _write_manifest(self):
+        """清单每行一个 JSON，只追加，录制多久都不占内存"""
+        if not self.segment_sentences and not os.path.exists(self.current_filename):
+            return
+        entry = {
+            "session": self.session_id,
+            "part": self.part,
+            "file": os.path.basename(self.current_filename),
+            "started": self._segment_wall,
+            "ended": time.time(),
+            "sentences": self.segment_sentences,
+            "bytes": self.segment_bytes,
+        }
+        with open(self.manifest_filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def cleanup_cache(self):
+        """删除缓存文件"""
+        if self.cache_filename and os.path.exists(self.cache_filename):
+            try:
+                os.remove(self.cache_filename)
+            except:
+                pass
+
+
+_claimed_names = set()  # 正在录制的文件名（不含 _captions.txt），避免同一秒开始的录制互相覆盖
+_recovery_lock = threading.Lock()  # 恢复在线程中进行，多个会话同时开始时依次恢复
+store = CaptionStore()  # 默认的保存状态，下面的模块级函数都操作它
+
+def now():
+    return store.now()
+
+def choose_save_dir(directory=None, label=None):
+    return store.choose_save_dir(directory, label)
 
 def get_current_filename():
     """获取当前正在使用的文件名"""
-    global current_filename
-    return current_filename
+    return store.current_filename
 
 def get_cache_filename():
     """获取缓存文件名"""
-    global cache_filename
-    return cache_filename
+    return store.cache_filename
+
+def get_session_id():
+    return store.session_id
 
 def set_paused(paused):
     """设置暂停状态"""
-    global is_paused
-    is_paused = paused
+    store.is_paused = paused
 
 def is_recording_paused():
     """检查是否处于暂停状态"""
-    global is_paused
-    return is_paused
+    return store.is_paused
 
 def reset_for_new_recording():
     """重置状态以开始新的录制"""
-    global cache_handle, saved_captions, current_filename, cache_filename, is_paused, line_buffer
-    cache_handle = None
-    saved_captions = set()
-    current_filename = None
-    cache_filename = None
-    is_paused = False
-    line_buffer = []
+    store.reset()
 
 def clear_saved_captions():
-    """清除已保存的字幕集合（用于继续录制时避免重复）"""
-    global saved_captions, line_buffer
-    saved_captions = set()
-    line_buffer = []
+    """清除去重索引（用于继续录制时避免重复）"""
+    store.saved_captions.clear()
 
 async def save_to_cache(text):
     """保存原始文本片段到缓存文件，带时间戳"""
-    global cache_handle, cache_filename, line_buffer
-
-    if not cache_filename:
-        return
+    await store.save_to_cache(text)
 
-    if cache_handle is None:
-        cache_handle = await aiofiles.open(cache_filename, "a+", encoding="utf-8")
+async def flush_cache():
+    """等待缓存片段和句子全部写入文件（暂停、预览、停止前调用）"""
+    await store.flush_cache()
 
-    timestamp = time.strftime("%H:%M:%S", time.localtime())
-    line = f"{timestamp}|{text}"  # 使用 | 分隔时间戳和文本
-    await cache_handle.write(line + "\n")
-    await cache_handle.flush()
-
-    # 记录到内存缓冲区
-    line_buffer.append((timestamp, text))
-    print(f"Saved to cache file: {text}")  # 只是保存到缓存，不是最终文件
+def write_sentences(sentences):
+    store.write_sentences(sentences)
 
 async def save_txt(filename, caption):
     """保存整合后的句子到最终文件 - 不应该在录制时使用"""
     # 这个函数现在不应该被直接调用
     pass
 
-def merge_cache_to_file():
-    """读取缓存文件，智能合并句子后写入最终文件，优化阅读体验"""
-    global cache_filename, current_filename, line_buffer
-
-    if not cache_filename or not os.path.exists(cache_filename):
+def replay_cache(path, assembler):
+    """把缓存文件中最后一个检查点之后的片段重新送入 assembler，逐个产生句子"""
+    if not is_journal(path):
+        # 旧版本的 HH:MM:SS|text 文本缓存
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if "|" in line:
+                    timestamp, text = line.rstrip("\n").split("|", 1)
+                    yield from assembler.feed(text, timestamp)
         return
 
+    # 检查点之前的片段已经写入最终文件，只回放之后的部分；
+    # 缓存经 mmap 按需解析，每条记录只校验一遍，内存占用与文件大小无关
+    with JournalReader(path) as reader:
+        for record in reader.pending():
+            if record.kind == CHECKPOINT:
+                assembler.tail = ""
+                assembler.marks = []
+            if record.text:
+                yield from assembler.feed(record.text, record.wall)
+
+def _recent_sentences(filename, size=64 * 1024):
+    """最终文件末尾已有的句子，恢复时用来跳过崩溃前已经写入的部分"""
+    sentences = set()
     try:
-        # 优先使用内存缓冲区
-        if line_buffer:
-            lines_data = line_buffer
-        else:
-            # 从文件读取
-            with open(cache_filename, "r", encoding="utf-8") as f:
-                lines_data = []
-                for line in f:
-                    if "|" in line:
-                        timestamp, text = line.strip().split("|", 1)
-                        lines_data.append((timestamp, text))
-
-        if not lines_data:
-            return
-
-        # 合并所有文本片段成一个连续的文本
-        all_text = ""
-        first_timestamp = lines_data[0][0] if lines_data else ""
-
-        for timestamp, text in lines_data:
-            all_text += text
-
-        # 清理文本（移除多余空格）
-        all_text = re.sub(r'\s+', ' ', all_text).strip()
-
-        # 按句末标点分割句子
-        sentences = re.split(r'([.!?。！？])', all_text)
+        with open(filename, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - size))
+            data = f.read().decode("utf-8", "replace")
+    except OSError:
+        return sentences
+    for line in data.splitlines():
+        if line.startswith("[") and "] " in line:
+            sentences.add(line.split("] ", 1)[1])
+    return sentences
+
+def _replay_all(path, assembler):
+    """缓存中还没写入最终文件的句子，最后是未完成的尾部"""
+    yield from replay_cache(path, assembler)
+    yield from assembler.finish()
+
+def _recover_cache(path, transcript):
+    """把一个缓存按 REPLAY_BATCH 分批追加到最终文件，返回写入的句子数"""
+    # 崩溃前已经写入最终文件的句子不再写一遍；去重索引有界，内存与缓存大小无关
+    # （回放不是按录制时的节奏进行的，只按数量淘汰）
+    seen = DedupIndex(ttl=None)
+    for text in _recent_sentences(transcript):
+        seen.add(text)
+    replay = _replay_all(path, SentenceAssembler())
+    count = 0
+    f = None
+    try:
+        while True:
+            batch = list(islice(replay, REPLAY_BATCH))
+            if not batch:
+                break
+            lines = []
+            for sentence in batch:
+                if sentence.text and sentence.text not in seen:
+                    seen.add(sentence.text)
+                    lines.append(format_sentence(sentence))
+            if lines:
+                if f is None:
+                    f = open(transcript, "a", encoding="utf-8")
+                f.writelines(lines)
+                count += len(lines)
+    finally:
+        replay.close()
+        if f is not None:
+            f.close()
+    return count
+
+def recover_orphaned_caches(directory):
+    """把异常退出留下的缓存回放到对应的最终文件，然后删除缓存；返回恢复的最终文件列表
+
+    大缓存要回放很久，RecordingSession 在线程中调用；同一进程中的调用依次进行，同一个缓存不会恢复两遍。
+    """
+    recovered = []
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return recovered
+
+    with _recovery_lock:
+        for name in names:
+            if not name.endswith("_cache.tmp"):
+                continue
+            path = os.path.join(directory, name)
+            # 本进程中正在录制的缓存，被其他进程加了锁的缓存，以及已经恢复过的缓存，跳过
+            if path[:-len("_cache.tmp")] in _claimed_names or not os.path.exists(path) or is_locked(path):
+                continue
+            transcript = path[:-len("_cache.tmp")] + "_captions.txt"
+            try:
+                count = _recover_cache(path, transcript)
+                os.remove(path)
+                recovered.append(transcript)
+                log.info("Recovered %d sentences from %s", count, name)
+            except Exception as e:
+                log.error("Error recovering cache %s: %s", name, e)
+    return recovered
 
-        # 重新组合句子（确保标点符号紧跟在句子后面）
-        merged_sentences = []
-        i = 0
-        while i < len(sentences):
-            if i < len(sentences) - 1 and sentences[i+1] in '.!?。！？':
-                sentence = sentences[i] + sentences[i+1]
-                merged_sentences.append(sentence.strip())
-                i += 2
-            else:
-                if sentences[i].strip():
-                    merged_sentences.append(sentences[i].strip())
-                i += 1
-
-        # 写入最终文件
-        if merged_sentences and current_filename:
-            with open(current_filename, "a", encoding="utf-8") as f:
-                for sentence in merged_sentences:
-                    # 避免重复保存
-                    if sentence and sentence not in saved_captions:
-                        f.write(f"[{first_timestamp}] {sentence}\n")
-                        saved_captions.add(sentence)
-                        print(f"Saved sentence: {sentence[:60]}...")
-
-        # 清空缓存文件
-        with open(cache_filename, "w", encoding="utf-8") as f:
-            f.write("")
-
-        # 清空内存缓冲区
-        line_buffer = []
-
-    except Exception as e:
-        print(f"Error merging cache: {e}")
+def merge_cache_to_file():
+    """把未完成的尾部写入最终文件并清空缓存，只处理尾部，与录制时长无关"""
+    store.merge_cache_to_file()
 
 async def close_cache():
     """关闭缓存文件"""
-    global cache_handle
-    if cache_handle is not None:
-        await cache_handle.close()
-        cache_handle = None
+    await store.close_cache()
 
 async def close_file():
     """关闭最终文件"""
-    pass  # 不再需要，因为我们只在合并时写入
+    await store.close_file()
 
 def cleanup_cache():
     """删除缓存文件"""
-    global cache_filename
-    if cache_filename and os.path.exists(cache_filename):
-        try:
-            os.remove(cache_filename)
-        except:
-            pass
+    store.cleanup_cache()
 
 def close_file_sync():
     """同步关闭文件（用于非异步上下文）"""
-    global cache_handle
-    if cache_handle is not None:
+    if store.cache_writer is not None:
         try:
             loop = asyncio.get_event_loop()
             if loop.is_running():
@@ -194,4 +754,4 @@ def close_file_sync():
             else:
                 loop.run_until_complete(close_cache())
         except:
-            cache_handle = None
\ No newline at end of file
+            store.cache_writer = None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+
+class PollScheduler:
+    """自适应轮询间隔：文本变化时进入突发模式缩短间隔，静默时指数退避到上限"""
+
+    def __init__(self, min_interval=0.1, base_interval=0.3, max_interval=2.0,
+                 backoff=1.5, burst_polls=5):
+        if not 0 < min_interval <= base_interval <= max_interval:
+            raise ValueError("need 0 < min_interval <= base_interval <= max_interval")
+        if backoff < 1:
+            raise ValueError("backoff must be >= 1")
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.burst_polls = burst_polls
+        self.reset()
+
+    def reset(self):
+        """恢复初始间隔并清零计数"""
+        self.interval = self.base_interval
+        self.burst_left = 0
+        self.polls = 0
+        self.hits = 0
+        self.wasted = 0
+
+    def record(self, changed):
+        """记录一次读取结果，返回下一次读取前应等待的秒数"""
+        self.polls += 1
+        if changed:
+            self.hits += 1
+            # 正在说话：保持最短间隔，尽量不漏掉会被改写的中间状态
+            self.interval = self.min_interval
+            self.burst_left = self.burst_polls
+        else:
+            self.wasted += 1
+            if self.burst_left > 0:
+                self.burst_left -= 1
+            else:
+                # 静默：从基础间隔开始指数退避
+                self.interval = min(self.max_interval, max(self.base_interval, self.interval * self.backoff))
+        return self.interval
+
+    def stats(self):
+        """返回轮询计数"""
+        return {
+            "polls": self.polls,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "interval": self.interval,
+        }
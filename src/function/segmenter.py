@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import re
+
+# 句点前面是这些词时不断句（不区分大小写）；e.g. a.m. 这类带点的缩写由单个字母规则处理。
+# 口语里常在句末出现的 no、月份缩写等不列入，避免漏切
+ABBREVIATIONS = frozenset((
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "inc", "ltd",
+    "corp", "dept", "approx",
+))
+
+_CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯＀-￯"
+_CLOSERS = "\"'”’」』）)\\]"
+_UPPER = "A-ZÀ-ÖØ-ÞА-Я"
+
+_SPACE_RE = re.compile(r"[^\S ]\s*| \s+")  # 只匹配需要改动的空白，单个空格原样保留
+_CJK_GAP_RE = re.compile(" (?<=[" + _CJK + "] )(?=[" + _CJK + "])")
+
+
+def _boundary_pattern(abbreviations):
+    """编译句末正则：缩写、小数、省略号的判断都在正则里完成，Python 只处理文本末尾的待定情况
+
+    - 强标点 !?。！？ 总是句末
+    - 省略号后面跟空白和大写字母或中日韩文字时才是句末
+    - 句点后面必须是空白或中日韩文字（可隔着右引号），前面不能是缩写或单个字母（"I" 除外）
+    每种情况都可以出现在文本末尾，由 boundaries() 根据 final 决定。
+    """
+    closers = "[" + _CLOSERS + "]*"
+    not_abbreviation = "".join(
+        "(?<!\\b(?i:" + re.escape(word) + ")\\.)" for word in sorted(abbreviations))
+    ends = "(?=\\s+[" + _UPPER + _CJK + "]|$)"
+    # 整个正则以一个字符集开头，引擎可以快速跳到候选标点；具体是哪种标点由后顾判断，
+    # 缩写判断也放在句点之后的后顾里
+    return re.compile(
+        "[.!?！？。…](?:"
+        "(?<=[!?！？。])[.!?！？。]*" + closers +
+        "|(?<=…)…*" + closers + ends +
+        "|(?<=\\.)(?:\\.+" + closers + ends +
+        "|(?<!\\.\\.)(?<!\\b[^\\W\\d_I]\\.)" + not_abbreviation + closers + "(?=[\\s" + _CJK + "]|$)"
+        "))")
+
+
+def _pending(text, match):
+    """文本末尾的候选句末是否可能还没写完：省略号，或 "3.14" 只写到 "3." """
+    mark = match.group().rstrip(_CLOSERS)
+    if mark.endswith("…") or mark.endswith(".."):
+        return True
+    start = match.start()
+    return mark == "." and start > 0 and text[start - 1].isdigit()
+
+
+class Segmenter:
+    """单遍句子切分：一个编译好的正则直接找出句末，不做逐字符的 Python 扫描
+
+    - "Mr." "e.g." "J." 这类缩写和首字母不断句，"3.14" 中的小数点不断句
+    - 省略号后面跟大写字母或中日韩文字才断句
+    - cjk 为 True 时中日韩文字之间的换行、空格直接去掉，不会变成多余的空格
+    - 流式输入时末尾的 "3." "..." 可能还没写完，final 为 False 时暂不作为句末
+    """
+
+    def __init__(self, abbreviations=ABBREVIATIONS, cjk=True):
+        self.abbreviations = frozenset(a.lower() for a in abbreviations)
+        self.cjk = cjk
+        self._boundary_re = _boundary_pattern(self.abbreviations)
+
+    def boundaries(self, text, start=0, final=False):
+        """产生 text[start:] 中每个句子的结束偏移（包含标点和右引号）"""
+        length = len(text)
+        for match in self._boundary_re.finditer(text, start):
+            end = match.end()
+            if end == length and not final and _pending(text, match):
+                return
+            yield end
+
+    def last_boundary(self, text, start=0, final=False):
+        """text[start:] 中最后一个句末的偏移，没有时返回 None"""
+        last = None
+        for last in self.boundaries(text, start, final):
+            pass
+        return last
+
+    def normalize(self, raw):
+        """合并空白：连续空白变成一个空格，中日韩文字之间的空格去掉"""
+        raw = _SPACE_RE.sub(" ", raw).strip()
+        if self.cjk:
+            raw = _CJK_GAP_RE.sub("", raw)
+        return raw
+
+    def spans(self, text):
+        """把整段文本切成 (起点, 终点) 区间，最后一段没有句末标点也算一句"""
+        start = 0
+        for end in self.boundaries(text, final=True):
+            yield start, end
+            start = end
+        if start < len(text):
+            yield start, len(text)
+
+    def split(self, text):
+        """把整段文本切成规范化后的句子列表
+
+        先整体规范化空白，再一次 finditer 找出全部句末，切片时不再逐句处理空白。
+        """
+        text = self.normalize(text)
+        ends = [match.end() for match in self._boundary_re.finditer(text)]
+        if not ends or ends[-1] < len(text):
+            ends.append(len(text))
+        sentences = []
+        start = 0
+        for end in ends:
+            sentence = text[start:end].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = end
+        return sentences
+
+
+default_segmenter = Segmenter()
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import random
+import time
+from .element import live_captions, DETECT_TIMEOUT
+from .comworker import com_worker
+
+POLL_INTERVAL = 0.3      # 轮询模式下的读取间隔（秒）
+EVENT_FALLBACK = 2.0     # 事件模式下的兜底读取间隔（秒），防止漏掉事件
+START_TIMEOUT = 10.0     # 查找、连接字幕来源的最长秒数（第一次调用还要在工作线程中初始化 COM）
+
+log = logging.getLogger(__name__)
+
+
+def init_com_thread():
+    """在当前线程初始化 UI Automation 所需的 COM，返回清理函数
+
+    UIA 对象都在 ComWorker 线程中创建和使用，由它在线程开始时调用。没有 uiautomation 时什么都不做。
+    """
+    try:
+        import uiautomation as auto
+    except ImportError:
+        return None
+    initializer = auto.UIAutomationInitializerInThread()
+    return initializer.Uninitialize
+
+
+class CaptionSource:
+    """字幕来源接口：提供 CaptionsScrollViewer 当前文本以及变化通知
+
+    detect / open / read / close 可能阻塞，捕获循环通过 call() 调用它们：
+    worker 为 None 时直接调用，为 ComWorker 时在该线程中执行，不阻塞事件循环。
+    """
+
+    event_driven = False
+    worker = None
+
+    async def call(self, func, *args, timeout=None):
+        """执行来源的一个阻塞操作，超时抛出 asyncio.TimeoutError"""
+        if self.worker is None:
+            return func(*args)
+        if timeout is None:
+            return await self.worker.call(func, *args)
+        return await self.worker.call(func, *args, timeout=timeout)
+
+    def detect(self):
+        """检查字幕来源是否可用"""
+        return True
+
+    def open(self):
+        """连接字幕来源，成功返回 True"""
+        return True
+
+    def read(self):
+        """读取滚动区域的当前文本"""
+        raise NotImplementedError
+
+    def clock(self):
+        """最近一次读取对应的字幕时间（秒），字幕模型按它判断文本是否稳定"""
+        return time.perf_counter()
+
+    async def wait_changed(self, timeout):
+        """等待文本变化，收到通知返回 True，超时返回 False"""
+        await asyncio.sleep(timeout)
+        return False
+
+    def finished(self):
+        """有限来源（回放、合成）播放完毕后返回 True"""
+        return False
+
+    def stats(self):
+        """来源的统计信息（录制状态中显示），没有时为空"""
+        return {}
+
+    def close(self):
+        """释放来源占用的资源"""
+        pass
+
+
+class EventCaptionSource(CaptionSource):
+    """基于变化通知的字幕来源，notify() 可以在任意线程调用"""
+
+    def __init__(self):
+        self._changed = None
+        self._loop = None
+        self.notifications = 0
+        self.last_notify_time = None
+
+    def _bind_loop(self):
+        if self._changed is None:
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+
+    def notify(self):
+        """通知文本已变化（线程安全）"""
+        self.notifications += 1
+        self.last_notify_time = time.monotonic()
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._changed.set)
+
+    async def wait_changed(self, timeout):
+        self._bind_loop()
+        if not self.event_driven:
+            # 事件不可用时退回固定间隔轮询
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+
+class FakeCaptionSource(EventCaptionSource):
+    """由脚本驱动的假字幕来源，用于在 Linux 上无界面测试"""
+
+    def __init__(self, event_driven=True):
+        super().__init__()
+        self.event_driven = event_driven
+        self._text = ""
+        self.reads = 0
+
+    def emit(self, text):
+        """模拟 Live Captions 更新文本"""
+        self._text = text
+        self.notify()
+
+    def read(self):
+        self.reads += 1
+        return self._text
+
+
+class UIACaptionSource(EventCaptionSource):
+    """通过 UI Automation 读取 Live Captions，优先订阅属性变化事件
+
+    元素由 ElementCache 查找和缓存，默认使用共用的 live_captions（lc_detect 找到的元素录制时直接使用）。
+    Live Captions 关闭或重启时 read() 返回空文本、退回轮询，缓存按退避间隔重新查找，
+    找到后重新订阅事件，录制不中断。
+    所有 UIA 操作都在 worker（默认是共用的 com_worker）线程中执行，缓存也只在那个线程中访问。
+    """
+
+    def __init__(self, use_events=True, cache=None, worker=None):
+        super().__init__()
+        self.use_events = use_events
+        self.cache = cache if cache is not None else live_captions
+        self.worker = worker if worker is not None else com_worker
+        self._handlers = []
+        self._generation = None  # 事件订阅对应的 cache.generation
+        self._available = True
+
+    def detect(self):
+        cache = self.cache
+        if cache.valid() or cache.resolve(DETECT_TIMEOUT):
+            log.info("Live Captions Found")
+            return True
+        if cache.last_error:
+            log.warning("Live Captions Not Found: %s...", cache.last_error[:50])
+        else:
+            log.warning("Live Captions Not Found")
+        return False
+
+    def open(self):
+        if self.cache.get(DETECT_TIMEOUT) is None:
+            return False
+        if self.use_events:
+            self._subscribe()
+        log.info("Capture mode: %s", "events" if self.event_driven else "polling")
+        return True
+
+    def _subscribe(self):
+        """在当前元素上注册变化事件，失败时保持轮询模式"""
+        self._generation = self.cache.generation
+        try:
+            self._handlers = self.cache.tree.subscribe(self.cache.scrollviewer, self.notify)
+            self.event_driven = True
+        except Exception as e:
+            log.warning("UIA events unavailable, fallback to polling: %s...", str(e)[:50])
+            self.event_driven = False
+
+    def _unsubscribe(self):
+        self.cache.tree.unsubscribe(self._handlers)
+        self._handlers = []
+        self.event_driven = False
+
+    def read(self):
+        text = self.cache.read()
+        if text is None:
+            if self._available:
+                log.warning("Live Captions unavailable, waiting for it to come back...")
+                self._available = False
+                # 旧元素上的事件不会再来，中断期间按调度器的间隔轮询
+                self._unsubscribe()
+            return ""
+        if not self._available:
+            log.info("Live Captions back after %.1fs", self.cache.outages[-1])
+            self._available = True
+        if self.use_events and self._generation != self.cache.generation:
+            self._unsubscribe()
+            self._subscribe()
+        return text
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        self._unsubscribe()
+
+
+class ReplayCaptionSource(EventCaptionSource):
+    """回放 (monotonic_time, scrollviewer_text) 快照序列
+
+    speed 为 1.0 时按原始节奏回放，大于 1 时加速；speed 为 None 时每次读取
+    直接前进一个快照，不等待，用于可复现的吞吐量测试。快照可以是惰性生成器。
+    clock() 是快照的时间（不等待时）或按 speed 放大的时间，回放多快提交的文本都和原始节奏一样。
+    """
+
+    def __init__(self, snapshots, speed=1.0, event_driven=True):
+        super().__init__()
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive or None")
+        self.speed = speed
+        self.event_driven = event_driven
+        self._snapshots = iter(snapshots)
+        self._text = ""
+        self._time = 0.0
+        self._exhausted = False
+        self._drained = False
+        self._task = None
+        self.reads = 0
+        self.played = 0
+
+    def open(self):
+        if self.speed is None:
+            self.event_driven = True
+        else:
+            self._task = asyncio.get_running_loop().create_task(self._play())
+        return True
+
+    def _next(self):
+        try:
+            snapshot = next(self._snapshots)
+        except StopIteration:
+            self._exhausted = True
+            return None
+        self.played += 1
+        return snapshot
+
+    async def _play(self):
+        """按快照时间更新文本并发出变化通知"""
+        self._bind_loop()
+        start = time.monotonic()
+        origin = None
+        while True:
+            snapshot = self._next()
+            if snapshot is None:
+                self.notify()
+                return
+            t, text = snapshot
+            if origin is None:
+                origin = t
+            delay = (t - origin) / self.speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._text = text
+            self.notify()
+
+    def read(self):
+        self.reads += 1
+        if self.speed is None:
+            snapshot = self._next()
+            if snapshot is not None:
+                self._time, self._text = snapshot
+            else:
+                self._drained = True
+        elif self._exhausted:
+            # 播放结束后再读一次，保证最后一个快照已经被消费
+            self._drained = True
+        return self._text
+
+    def clock(self):
+        if self.speed is None:
+            return self._time
+        return time.perf_counter() * self.speed
+
+    async def wait_changed(self, timeout):
+        if self.speed is None:
+            await asyncio.sleep(0)
+            return True
+        return await super().wait_changed(timeout)
+
+    def finished(self):
+        return self._drained
+
+    def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+
+class RecordingCaptionSource(CaptionSource):
+    """包装另一个来源，把每次读到的新文本以 JSON 行记录下来，供之后回放（record --save-snapshots）
+
+    阻塞操作在内层来源的 worker 中执行：包装 UIACaptionSource 时读取和记录都在 UIA 线程中进行。
+    """
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self._file = None
+        self._last = None
+
+    @property
+    def event_driven(self):
+        return self.inner.event_driven
+
+    @property
+    def worker(self):
+        return self.inner.worker
+
+    def detect(self):
+        return self.inner.detect()
+
+    def open(self):
+        if not self.inner.open():
+            return False
+        self._file = open(self.path, "a", encoding="utf-8")
+        return True
+
+    def read(self):
+        text = self.inner.read()
+        if text != self._last:
+            self._last = text
+            self._file.write(json.dumps({"t": self.inner.clock(), "text": text}, ensure_ascii=False) + "\n")
+        return text
+
+    def clock(self):
+        return self.inner.clock()
+
+    async def wait_changed(self, timeout):
+        return await self.inner.wait_changed(timeout)
+
+    def finished(self):
+        return self.inner.finished()
+
+    def stats(self):
+        return self.inner.stats()
+
+    def close(self):
+        self.inner.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_snapshots(path):
+    """逐行读取 RecordingCaptionSource 记录的快照文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record["t"], record["text"]
+
+
+_EN_WORDS = ("the", "meeting", "starts", "now", "we", "will", "review", "numbers", "for",
+             "this", "quarter", "and", "then", "talk", "about", "plans", "next", "week",
+             "please", "share", "your", "screen", "thank", "you", "everyone", "okay")
+_ZH_WORDS = ("我们", "今天", "开始", "会议", "讨论", "一下", "这个", "季度", "的", "数据",
+             "然后", "计划", "下周", "请", "大家", "共享", "屏幕", "谢谢", "好的", "没问题")
+
+
+def synthetic_snapshots(duration, words_per_second=2.5, window_chars=400,
+                        rewrite_rate=0.1, sentence_words=12, language="en", seed=0):
+    """生成模拟 Live Captions 滚动窗口的快照，可用于任意时长的长会话
+
+    文本按词追加，偶尔改写最后一个词，句末加标点，超过窗口长度时从顶部整行丢弃。
+    """
+    rng = random.Random(seed)
+    if language == "zh":
+        words, joiner, stops = _ZH_WORDS, "", "。？！"
+    else:
+        words, joiner, stops = _EN_WORDS, " ", ".?!"
+
+    lines = [[]]
+    t = 0.0
+    step = 1.0 / words_per_second
+    in_sentence = 0
+    while t < duration:
+        t += rng.expovariate(1.0 / step)
+        line = lines[-1]
+        if line and rng.random() < rewrite_rate:
+            # Live Captions 事后修正最后一个词
+            line[-1] = rng.choice(words)
+        else:
+            line.append(rng.choice(words))
+            in_sentence += 1
+            if in_sentence >= rng.randint(max(1, sentence_words // 2), sentence_words * 2):
+                line[-1] += rng.choice(stops)
+                in_sentence = 0
+                if rng.random() < 0.5:
+                    lines.append([])
+
+        text = "\n".join(joiner.join(l) for l in lines)
+        while len(text) > window_chars and len(lines) > 1:
+            lines.pop(0)
+            text = "\n".join(joiner.join(l) for l in lines)
+        yield t, text
+
+
+class SyntheticCaptionSource(ReplayCaptionSource):
+    """合成长会话字幕来源"""
+
+    def __init__(self, duration, speed=None, event_driven=True, **kwargs):
+        super().__init__(synthetic_snapshots(duration, **kwargs), speed=speed, event_driven=event_driven)
@@ -2,46 +2,127 @@
 import sys
 import os
 import asyncio
-import uiautomation as auto
-from .save import save_to_cache, is_recording_paused
+import logging
+from collections import deque
+from . import save
+from . import metrics
+from .source import UIACaptionSource, EVENT_FALLBACK, START_TIMEOUT
+from .scheduler import PollScheduler
 import re
 import time
 
-buffer = ""
-last_saved_text = ""
+log = logging.getLogger(__name__)
 
 def lc_detect():
-    try:
-        auto.SetGlobalSearchTimeout(0.5)
-
-        desktop = auto.GetRootControl()
-        captions_window = desktop.Control(
-            searchDepth=1,
-            ClassName="LiveCaptionsDesktopWindow",
-            timeout=0.2
-        )
-
-        if captions_window.Exists(0):
-            print("Live Captions Found")
-            return True
-        else:
-            print(f"Live Captions Not Found")
-            return False
-
-    except Exception as e:
-        print(f"Live Captions Not Found: {str(e)[:50]}...")
-        return False
+    """检查 Live Captions 窗口是否存在（在 UIA 工作线程中查找，等待结果）"""
+    source = UIACaptionSource()
+    return source.worker.run(source.detect)
 
 
 def reset_hook_state():
     """重置hook状态，用于新录制"""
-    global buffer, last_saved_text
-    buffer = ""
-    last_saved_text = ""
+    capture.reset()
+
+
+MIN_OVERLAP = 8        # 认为两个窗口对齐所需的最短重叠字符数
+REWRITE_WINDOW = 64    # 旧窗口末尾允许被改写的字符数
+MIN_ALIGN_WORDS = 4    # 按词模糊对齐时锚点至少要有的词数，太短容易对错位置
+STABLE_SECONDS = 0.6   # 易变尾部的文本保持不变这么久才提交
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_CJK_CHAR = re.compile(f"[{_CJK}]")
+_TOKEN = re.compile(f"[{_CJK}]|[^\\W_{_CJK}]+")
+
+
+def _overlap_length(previous, current, rewrite_window=REWRITE_WINDOW):
+    """在线性时间内找出 current 的最长前缀，它是 previous[:e] 的后缀
+
+    e 只取 previous 末尾 rewrite_window 范围内的位置，这样既能处理顶部整行滚出，
+    也能处理末尾几个词被改写的情况；rewrite_window 为 1 时前缀必须接在 previous 的末尾。
+    current 完整出现在 previous 中时返回 len(current)。
+    """
+    m = len(current)
+    if m == 0:
+        return 0
+
+    # KMP 前缀函数
+    fail = [0] * m
+    k = 0
+    for i in range(1, m):
+        c = current[i]
+        while k and current[k] != c:
+            k = fail[k - 1]
+        if current[k] == c:
+            k += 1
+        fail[i] = k
+
+    start = len(previous) - rewrite_window
+    min_len = min(MIN_OVERLAP, m)
+    best = 0
+    k = 0
+    for i, c in enumerate(previous):
+        while k and current[k] != c:
+            k = fail[k - 1]
+        if current[k] == c:
+            k += 1
+            if k == m:
+                return m
+        if k >= min_len and k > best and i >= start:
+            best = k
+    return best
+
+
+def _word_start(text, pos):
+    """pos 落在单词中间时退回到该词开头（没有空白的中日文按字符处理）"""
+    if 0 < pos < len(text) and not text[pos - 1].isspace() and not text[pos].isspace():
+        space = max(text.rfind(" ", 0, pos), text.rfind("\n", 0, pos))
+        if space >= 0:
+            return space + 1
+        if not _CJK_CHAR.match(text[pos]):
+            # 落在第一个词中间：这个词从开头算起
+            return 0
+    return pos
+
+
+def _tokens(text):
+    """对齐用的词和它在 text 中的结束位置：忽略大小写和标点，中日韩文每个字算一个词"""
+    return [(m.group().casefold(), m.end()) for m in _TOKEN.finditer(text)]
+
+
+def _fuzzy_end(anchor, window):
+    """按词模糊查找 anchor 在 window 中结束的位置，找不到足够相似的位置时返回 None
+
+    Live Captions 事后给已经提交的文本加标点、改大小写或换掉个别词，精确查找会失败。
+    这里是词级的近似匹配（起点任意的编辑距离），最多允许四分之一的词不同，代价相同时取靠后的位置。
+    """
+    pattern = [word for word, _ in _tokens(anchor)]
+    m = len(pattern)
+    if m < MIN_ALIGN_WORDS:
+        return None
+    best, best_end = m // 4 + 1, None
+    column = list(range(m + 1))
+    for word, end in _tokens(window):
+        previous, column[0] = column[0], 0
+        for i in range(1, m + 1):
+            current = column[i]
+            column[i] = min(previous + (pattern[i - 1] != word), current + 1, column[i - 1] + 1)
+            previous = current
+        if column[m] <= best:
+            best, best_end = column[m], end
+    return best_end
+
+
+def _needs_space(left, right):
+    """两段不连续的文本拼接时是否要加空格（中日韩文之间不加）"""
+    return not left.isspace() and right.isalnum() and not _CJK_CHAR.match(left) and not _CJK_CHAR.match(right)
 
 
 def extract_new_text(current_text, previous_text):
-    """提取新增的文本内容"""
+    """提取新增的文本内容（只比较相邻两次窗口）
+
+    捕获循环不调用这个函数：hook 把每次的窗口交给 CaptionModel，按已提交文本的锚点对齐，
+    锚点开头滚出窗口时同样用 _overlap_length 找重叠。保留给只需要两次窗口差异的调用者。
+    """
     if not previous_text:
         # 第一次，返回全部文本
         return current_text
@@ -53,47 +134,276 @@ def extract_new_text(current_text, previous_text):
     elif previous_text.startswith(current_text):
         # 文本缩短了，返回空
         return ""
-    else:
-        # 完全不同的文本，返回全部
-        return current_text
 
+    # 顶部滚出或末尾改写：只返回对齐位置之后的部分
+    overlap = _overlap_length(previous_text, current_text)
+    if overlap:
+        return current_text[_word_start(current_text, overlap):].strip()
+
+    # 完全不同的文本，返回全部
+    return current_text
+
+
+class CaptionModel:
+    """字幕模型：已提交区域 + 易变尾部
 
-async def hook(filename, exit_event):
-    global buffer, last_saved_text
+    Live Captions 会在事后改写最近的几个词。窗口中的文本先留在易变尾部，
+    保持 stable_seconds 秒没有变化，或者离窗口末尾超过 max_tail 个字符
+    （即将滚出窗口）时才移入已提交区域。只有已提交的文本会写入缓存。
+    稳定按时间而不是读取次数判断：事件模式下没有变化就没有读取，由 pending() 告诉捕获循环何时再读。
+    已提交的文本被改写后按词模糊对齐；对不上时窗口中只有最后 max_tail 个字符算未提交，
+    不会把整个窗口再提交一遍。
+    """
 
+    def __init__(self, stable_seconds=STABLE_SECONDS, max_tail=240, anchor_chars=40):
+        self.stable_seconds = stable_seconds
+        self.max_tail = max_tail
+        self.anchor_chars = anchor_chars
+        self.anchor = ""          # 已提交文本的末尾，用于在新窗口中定位
+        self.history = deque()   # (读取时间, 易变尾部)，只保留稳定时长内的读取和之前的最后一次
+        self.committed_chars = 0
+        self.last_char = ""      # 已提交文本的最后一个字符
+        self.realigned = False   # 锚点按改写后的窗口重新设定过，下一段提交的文本与之前的不连续
+        self.seen = deque()      # (已提交字符数 + 尾部长度, 第一次读到的时间)，只在传入 now 时记录
+        self.first_seen = None   # 最近一次提交的文本第一次出现在窗口中的时间
+
+    def _uncommitted(self, window):
+        """窗口中位于已提交文本之后的部分"""
+        if not self.anchor:
+            return window
+        # 提交的文本还很短时锚点容易在后面重复出现，先看窗口是不是以它开头
+        if len(self.anchor) < self.anchor_chars and window.startswith(self.anchor):
+            return window[len(self.anchor):]
+        pos = window.rfind(self.anchor)
+        if pos >= 0:
+            return window[pos + len(self.anchor):]
+        # 锚点的开头已经滚出窗口：窗口以锚点的某个后缀开头（重叠不会比锚点长）
+        length = _overlap_length(self.anchor, window[:len(self.anchor)], rewrite_window=1)
+        if length >= MIN_OVERLAP and self.anchor.endswith(window[:length]):
+            # 整个窗口出现在锚点中间时也会返回，那不是滚动
+            return window[length:]
+        # 已提交的文本被改写了
+        end = _fuzzy_end(self.anchor, window)
+        if end is None:
+            # 离末尾超过 max_tail 的文本一定已经提交过
+            end = _word_start(window, max(0, len(window) - self.max_tail))
+        # 锚点改用窗口中的写法，之后的读取又能精确定位
+        self.anchor = window[:end][-self.anchor_chars:]
+        self.realigned = True
+        return window[end:]
+
+    def _commit(self, text):
+        self.anchor = (self.anchor + text)[-self.anchor_chars:]
+        seen = self.seen
+        while seen and seen[0][0] <= self.committed_chars:
+            seen.popleft()
+        # 提交文本的第一个字符是在哪次读取中出现的
+        self.first_seen = seen[0][1] if seen else None
+        self.committed_chars += len(text)
+        while seen and seen[0][0] <= self.committed_chars:
+            seen.popleft()
+        history = [(t, h[len(text):]) for t, h in self.history if h.startswith(text)]
+        self.history.clear()
+        self.history.extend(history)
+        if self.realigned and text:
+            self.realigned = False
+            # 重新对齐后的文本与之前提交的不连续，避免两个词粘在一起
+            if self.last_char and _needs_space(self.last_char, text[0]):
+                text = " " + text
+        if text:
+            self.last_char = text[-1]
+        return text
+
+    def update(self, window, now=None):
+        """输入一次读取到的窗口文本，返回新提交的文本（可能为空）
+
+        now 是这次读取的字幕时间（秒，默认 perf_counter，来源的 clock()；回放快照时是快照的时间），用于判断稳定。
+        另外按 perf_counter 记录每段文本第一次出现的时间，用于计算字幕延迟。
+        """
+        seen_at = time.perf_counter()
+        if now is None:
+            now = seen_at
+        tail = self._uncommitted(window)
+        history = self.history
+        history.append((now, tail))
+        end = self.committed_chars + len(tail)
+        if not self.seen or end > self.seen[-1][0]:
+            self.seen.append((end, seen_at))
+
+        cutoff = now - self.stable_seconds
+        while len(history) > 1 and history[1][0] <= cutoff:
+            history.popleft()
+        end = 0
+        if history[0][0] <= cutoff:
+            # 从 cutoff 之前到现在每次读取都有的前缀视为稳定
+            stable = history[0][1]
+            for _, h in history:
+                n = 0
+                limit = min(len(stable), len(h))
+                while n < limit and stable[n] == h[n]:
+                    n += 1
+                stable = stable[:n]
+            end = len(stable)
+
+        # 离末尾太远的文本马上会滚出窗口，必须提交
+        end = max(end, len(tail) - self.max_tail)
+        if end <= 0:
+            return ""
+        if end < len(tail):
+            end = _word_start(tail, end)
+        if end <= 0:
+            return ""
+        return self._commit(tail[:end])
+
+    def pending(self, now=None):
+        """易变尾部还要多少秒才会稳定，没有未提交的文本时返回 None"""
+        if not self.history or not self.history[-1][1].strip():
+            return None
+        if now is None:
+            now = time.perf_counter()
+        # 最后一次读到的尾部从什么时候起一直没变
+        last = self.history[-1][1]
+        since = self.history[-1][0]
+        for t, h in reversed(self.history):
+            if h != last:
+                break
+            since = t
+        return max(0.0, since + self.stable_seconds - now)
+
+    def flush(self):
+        """暂停或停止时提交全部易变尾部"""
+        if not self.history:
+            return ""
+        return self._commit(self.history[-1][1])
+
+
+class CaptureState:
+    """一次录制的捕获状态：上次读到的窗口文本、字幕模型和暂未保存的短文本
+
+    已提交的文本写入 store（save.CaptionStore），暂停标志也从 store 读取。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        self.buffer = ""
+        self.last_saved_text = ""
+        self.caption_model = CaptionModel()
+        self.short_text = ""  # 太短而暂未保存的已提交文本
+        self.source = None  # 本次录制的字幕来源（status() 显示它的统计信息）
+        self.started = False  # 找到并打开了字幕来源，开始读取
+
+    async def save_committed(self, text):
+        """把已提交的文本保存到缓存"""
+        # 窗口内的换行只是排版，统一换成空格
+        text = self.short_text + text.replace("\n", " ")
+        if len(text.strip()) > 1:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("New text detected: %s...", text.strip()[:50])
+            first_seen = self.caption_model.first_seen
+            if metrics.enabled and first_seen is not None:
+                metrics.caption_latency.observe(time.perf_counter() - first_seen)
+            await self.store.save_to_cache(text)
+            self.last_saved_text = self.buffer
+            self.short_text = ""
+        else:
+            # 单独的换行、单个字符留到下一次一起保存，丢掉会让前后两个词粘在一起
+            self.short_text = text
+
+
+capture = CaptureState(save.store)  # 默认的捕获状态，写入 save 的默认 store
+
+
+async def hook(filename, exit_event, source=None, scheduler=None, state=None):
+    """捕获循环；state 为 None 时使用模块默认的 capture（单录制的界面）"""
+    state = state or capture
+    caption_model = state.caption_model
+    store = state.store
+
+    exit_waiter = None
     try:
-        lc_flag = lc_detect()
-        if not lc_flag:
+        if source is None:
+            source = UIACaptionSource()
+        state.source = source
+
+        # UIA 的查找和读取在工作线程中执行，事件循环只等待结果
+        if not await source.call(source.detect, timeout=START_TIMEOUT):
             return False
 
-        desktop = auto.GetRootControl()
-        captions_window = desktop.Control(searchDepth=1, ClassName="LiveCaptionsDesktopWindow")
-        captions_scrollviewer = captions_window.Control(searchDepth=5, AutomationId="CaptionsScrollViewer", ClassName="ScrollViewer")
+        if not await source.call(source.open, timeout=START_TIMEOUT):
+            return False
+
+        if scheduler is None:
+            scheduler = PollScheduler()
+
+        log.info("Start capture...")
+        state.started = True
 
-        print("Start capture...")
+        exit_waiter = asyncio.ensure_future(exit_event.wait())
 
-        while not exit_event.is_set():
+        while not exit_event.is_set() and not source.finished():
             # 检查是否暂停
-            if is_recording_paused():
+            if store.is_paused:
+                # 暂停时易变尾部也一并提交
+                await state.save_committed(caption_model.flush())
                 await asyncio.sleep(0.2)
                 continue
 
-            current_text = captions_scrollviewer.Name.strip()
+            measure = metrics.enabled
+            started = time.perf_counter() if measure else None
+            try:
+                current_text = (await source.call(source.read)).strip()
+            except asyncio.TimeoutError:
+                # 读取卡住（Live Captions 没有响应），本轮当作没有变化
+                log.warning("Reading Live Captions timed out")
+                if measure:
+                    metrics.poll_timeouts.inc()
+                current_text = ""
+            changed = bool(current_text) and current_text != state.buffer
+            if changed:
+                state.buffer = current_text
+            if measure:
+                metrics.read_seconds.observe(time.perf_counter() - started)
+                metrics.polls.inc()
+                if changed:
+                    metrics.poll_hits.inc()
 
-            if current_text and current_text != buffer:
-                # 提取新增文本
-                new_text = extract_new_text(current_text, buffer)
-                buffer = current_text
+            # 每次读取都更新模型，稳定下来的文本才保存到缓存
+            if state.buffer:
+                await state.save_committed(caption_model.update(state.buffer, source.clock()))
 
-                # 保存新增内容到缓存
-                if new_text and len(new_text) > 1:
-                    print(f"New text detected: {new_text[:50]}...")
-                    await save_to_cache(new_text)
-                    last_saved_text = buffer
+            # 有限来源播放完毕后不再等待
+            if source.finished():
+                break
 
-            # 检查间隔适中（避免太频繁）
-            await asyncio.sleep(0.3)
+            # 事件模式下等待变化通知，兜底间隔仍会读取一次；轮询模式由调度器决定间隔
+            interval = scheduler.record(changed)
+            if source.event_driven:
+                interval = EVENT_FALLBACK
+            # 有未提交的尾部时到它稳定的时候再读一次，文本不再变化也能按时提交
+            pending = caption_model.pending(source.clock())
+            if pending is not None:
+                interval = min(interval, max(pending, scheduler.min_interval))
+
+            # 等待下一次变化（退出时立即唤醒）
+            change_waiter = asyncio.ensure_future(source.wait_changed(interval))
+            await asyncio.wait([change_waiter, exit_waiter], return_when=asyncio.FIRST_COMPLETED)
+            if not change_waiter.done():
+                change_waiter.cancel()
+
+        # 停止时提交剩余的易变尾部
+        await state.save_committed(caption_model.flush())
 
     except Exception as e:
-        print(f"Exception caught: {e}")
-        return False
\ No newline at end of file
+        log.exception("Exception caught: %s", e)
+        return False
+    finally:
+        if exit_waiter is not None and not exit_waiter.done():
+            exit_waiter.cancel()
+        if source is not None:
+            try:
+                await source.call(source.close)
+            except Exception:
+                pass
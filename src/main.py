@@ -1,33 +1,43 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import logging
 import tkinter as tk
 import tkinter.messagebox as msgbox
-from function.texthook import hook, lc_detect, reset_hook_state
-from function.save import (
-    choose_save_dir, close_file, set_paused,
-    get_current_filename, reset_for_new_recording,
-    merge_cache_to_file, close_cache, cleanup_cache
-)
-import asyncio
-
-file_handle = None
-exit_event = asyncio.Event()
-hook_task = None
-current_filename = None
-current_state = "stopped"  # stopped, recording, paused
-
-async def close_all(window):
-    await asyncio.sleep(0.5)
-    # 在退出前合并缓存
-    merge_cache_to_file()
-    await close_cache()
-    await close_file()
-    cleanup_cache()
-    window.destroy()
-
-def dashboard(loop):
-    global hook_task, current_filename, current_state
+from function.runtime import AsyncRuntime, TkBridge
+
+log = logging.getLogger(__name__)
+
+# 录制模块和 asyncio 在事件循环线程中导入，uiautomation 在 UIA 工作线程中导入，窗口先显示出来
+recorder = None
+current_state = "searching"  # searching, stopped, recording, paused
+
+async def prepare():
+    """导入录制模块并查找 Live Captions，在事件循环线程中执行（查找在 UIA 工作线程中进行）"""
+    global recorder
+    from function.recorder import RecordingSession
+    from function.source import UIACaptionSource, START_TIMEOUT
+    recorder = RecordingSession()
+    source = UIACaptionSource()
+    return await source.call(source.detect, timeout=START_TIMEOUT)
+
+async def close_all(bridge, window):
+    # 在退出前合并缓存、关闭文件；停止时出错也要关闭窗口
+    try:
+        if recorder is not None:
+            await recorder.stop()
+    except Exception:
+        log.exception("Stopping the recording failed")
+    finally:
+        bridge.post(window.destroy)
+
+def dashboard(runtime, on_event=None):
+    """runtime 是运行在独立线程中的事件循环，所有录制相关的操作都交给它执行
+
+    on_event(name, window) 在窗口第一次显示（"shown"）和查找结束（"ready" / "not_found"）时调用，
+    用于测量启动时间。
+    """
+    global current_state
 
     window = tk.Tk()
     window.title("CatchCaptionsTool")
@@ -35,14 +45,47 @@ def dashboard(loop):
     window.overrideredirect(True)
     window.wm_attributes("-topmost", True)
 
-    if not lc_detect():
-        msgbox.showerror("Error", "Live Captions Not Found")
-        window.destroy()
-        return
+    bridge = TkBridge(window)
+
+    def notify(name):
+        if on_event is not None:
+            on_event(name, window)
+
+    def shown(event):
+        # 窗口画出来以后再开始查找，等待事件循环线程启动不占用第一帧的时间
+        window.unbind("<Map>")
+        notify("shown")
+        window.after_idle(lambda: runtime.submit(detect()))
+
+    def detected(found):
+        global current_state
+        if not found:
+            notify("not_found")
+            msgbox.showerror("Error", "Live Captions Not Found")
+            window.destroy()
+            return
+        current_state = "stopped"
+        update_ui_state()
+        notify("ready")
+
+    async def detect():
+        try:
+            found = await prepare()
+        except Exception:
+            log.exception("Startup failed")
+            found = False
+        bridge.post(detected, found)
 
     def update_ui_state():
         """根据当前状态更新按钮可用性"""
-        if current_state == "stopped":
+        start_btn.config(text="…" if current_state == "searching" else "●")
+        if current_state == "searching":
+            # 正在查找 Live Captions，只能退出
+            start_btn.config(state=tk.DISABLED)
+            pause_btn.config(state=tk.DISABLED)
+            resume_btn.config(state=tk.DISABLED)
+            preview_btn.config(state=tk.DISABLED)
+        elif current_state == "stopped":
             start_btn.config(state=tk.NORMAL)
             pause_btn.config(state=tk.DISABLED)
             resume_btn.config(state=tk.DISABLED)
@@ -58,45 +101,58 @@ def dashboard(loop):
             resume_btn.config(state=tk.NORMAL)
             preview_btn.config(state=tk.NORMAL)
 
+    def capture_ended():
+        """录制自行结束（Live Captions 关闭或不可用）时按钮回到可以开始的状态"""
+        global current_state
+        if current_state not in ("recording", "paused"):
+            return
+        current_state = "stopped"
+        update_ui_state()
+        if not recorder.capture.started:
+            msgbox.showerror("Error", "Live Captions Not Found")
+
+    async def record():
+        if await recorder.start():
+            await recorder.wait()
+            bridge.post(capture_ended)
+
     def start_capture():
-        global hook_task, current_filename, current_state
-        reset_for_new_recording()
-        reset_hook_state()
-        exit_event.clear()
-        current_filename = choose_save_dir()
-        hook_task = loop.create_task(hook(current_filename, exit_event))
+        global current_state
+        runtime.submit(record())
         current_state = "recording"
         update_ui_state()
 
     def pause_capture():
         global current_state
-        set_paused(True)
         current_state = "paused"
         update_ui_state()
-        # 暂停时整合缓存到文件
-        merge_cache_to_file()
-        print("Cache merged to file")
+        # 暂停时整合缓存到文件，并等待缓存片段写入磁盘
+        runtime.submit(recorder.pause())
 
     def resume_capture():
         global current_state
-        set_paused(False)
+        runtime.submit(recorder.resume())
         current_state = "recording"
         update_ui_state()
 
-    def preview_file():
-        global current_filename
-        # 在预览前先合并缓存
-        merge_cache_to_file()
-        if current_filename and os.path.exists(current_filename):
-            os.startfile(current_filename)
+    def show_file():
+        if recorder.filename and os.path.exists(recorder.filename):
+            os.startfile(recorder.filename)
         else:
             msgbox.showinfo("Info", "No file to preview")
 
+    async def open_preview():
+        # 在预览前先合并缓存，并等待句子写入最终文件
+        await recorder.flush()
+        bridge.post(show_file)
+
+    def preview_file():
+        runtime.submit(open_preview())
+
     def stop_capture():
         global current_state
-        exit_event.set()
         current_state = "stopped"
-        loop.create_task(close_all(window))
+        runtime.submit(close_all(bridge, window))
 
     def start_move(event):
         window.x = event.x
@@ -116,6 +172,7 @@ def dashboard(loop):
     window.bind("<ButtonPress-1>", start_move)
     window.bind("<ButtonRelease-1>", stop_move)
     window.bind("<B1-Motion>", do_move)
+    window.bind("<Map>", shown)
 
     # 5个按钮：开始、暂停、继续、预览、退出
     start_btn = tk.Button(window, text="●", command=start_capture, width=4)
@@ -133,18 +190,18 @@ def dashboard(loop):
     stop_btn = tk.Button(window, text="◼", command=stop_capture, width=4)
     stop_btn.pack(pady=5)
 
-    # 初始化按钮状态
+    # 初始化按钮状态，窗口显示后再查找 Live Captions
     update_ui_state()
 
-    def poll_loop():
-        loop.call_soon(loop.stop)
-        loop.run_forever()
-        window.after(10, poll_loop)
-
-    window.after(10, poll_loop)
+    # 事件循环在自己的线程中运行，Tk 主循环空闲时不需要定时唤醒
     window.mainloop()
+    bridge.close()
 
 if __name__ == "__main__":
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    dashboard(loop)
\ No newline at end of file
+    # 录制模块的运行信息输出到控制台
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    runtime = AsyncRuntime().start()
+    try:
+        dashboard(runtime)
+    finally:
+        runtime.stop()
\ No newline at end of file
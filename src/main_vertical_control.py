@@ -4,14 +4,17 @@ import os
 import tkinter as tk
 import tkinter.messagebox as msgbox
 import asyncio
+from function.appender import get_appender, flush_appenders, close_appender
+from function.runtime import AsyncRuntime, TkBridge
 
 # 全局变量
-file_handle = None
 exit_event = asyncio.Event()
 current_filename = ""
 hook_task = None
 current_state = 'STOPPED'  # 状态: STOPPED, RECORDING, PAUSED
 pending_tasks = []  # 待处理的异步任务
+runtime = None  # 在独立线程中运行的事件循环
+bridge = None  # 事件循环线程向 Tk 主线程发送界面更新
 
 def safe_create_task(coro_func, *args, **kwargs):
     """安全创建异步任务"""
@@ -32,16 +35,11 @@ def safe_create_task(coro_func, *args, **kwargs):
 
 async def safe_save_caption(filename, caption, is_pause_marker=False):
     """安全保存字幕"""
-    global file_handle
-
-    if file_handle is None:
-        import aiofiles
-        file_handle = await aiofiles.open(filename, "a+", encoding="utf-8")
-
     try:
-        timestamp = time.strftime("%H:%M:%S", time.localtime())
-        await file_handle.write(f"[{timestamp}] {caption}\n")
-        await file_handle.flush()
+        # 持久的追加器：文件只打开一次，写入经过缓冲
+        get_appender(filename).write_caption(caption)
+        if is_pause_marker:
+            flush_appenders()
     except Exception as e:
         print(f"❌ 保存失败: {str(e)}")
 
@@ -82,7 +80,7 @@ def start_new_recording():
 
     try:
         from function.texthook import hook
-        hook_task = asyncio.create_task(hook(current_filename, exit_event))
+        hook_task = runtime.submit(hook(current_filename, exit_event))
         update_ui_state('RECORDING')
         print("✅ 开始录制")
         return hook_task
@@ -96,8 +94,9 @@ def pause_recording():
 
     if current_state == 'RECORDING':
         try:
-            # 在poll_loop中处理异步任务
+            # 交给事件循环线程处理
             pending_tasks.append(('pause', current_filename))
+            runtime.submit(process_pending_tasks())
             update_ui_state('PAUSED')
             print("✅ 暂停已暂停")
             return True
@@ -114,8 +113,9 @@ def resume_recording():
 
     if current_state == 'PAUSED':
         try:
-            # 在poll_loop中处理异步任务
+            # 交给事件循环线程处理
             pending_tasks.append(('resume', current_filename))
+            runtime.submit(process_pending_tasks())
             update_ui_state('RECORDING')
             print("✅ 录制已继续")
             return True
@@ -130,6 +130,7 @@ async def open_current_caption():
     """打开当前字幕文件预览"""
     if current_filename and os.path.exists(current_filename):
         try:
+            flush_appenders()
             os.startfile(current_filename)
             print(f"✅ 已打开字幕文件: {current_filename}")
             return True
@@ -151,8 +152,8 @@ async def close_all(window):
             pass
 
     await safe_save_caption(current_filename, "录制结束", is_pause_marker=True)
-    window.destroy()
-    sys.exit(0)
+    close_appender()
+    bridge.post(window.destroy)
 
 def lc_detect():
     """检测实时字幕功能"""
@@ -203,13 +204,13 @@ async def process_pending_tasks():
 
             from function.texthook import hook
             hook_task = asyncio.create_task(hook(filename, exit_event))
-            update_ui_state('RECORDING')
+            bridge.post(update_ui_state, 'RECORDING')
             print("✅ 开始录制")
 
         elif task_type == 'pause':
             exit_event.set()
             await safe_save_caption(filename, "录制暂停", is_pause_marker=True)
-            update_ui_state('PAUSED')
+            bridge.post(update_ui_state, 'PAUSED')
             print("✅ 暂停已暂停")
 
         elif task_type == 'resume':
@@ -220,12 +221,12 @@ async def process_pending_tasks():
             exit_event.clear()
             await safe_save_caption(filename, "录制继续", is_pause_marker=True)
             hook_task = asyncio.create_task(hook(filename, exit_event))
-            update_ui_state('RECORDING')
+            bridge.post(update_ui_state, 'RECORDING')
             print("✅ 录制已继续")
 
-def dashboard(loop):
+def dashboard():
     """主界面 - 简单垂直控制栏"""
-    global start_btn, pause_btn, resume_btn, preview_btn, exit_btn
+    global start_btn, pause_btn, resume_btn, preview_btn, exit_btn, bridge
 
     # 创建主窗口
     window = tk.Tk()
@@ -234,6 +235,7 @@ def dashboard(loop):
     window.overrideredirect(True)
     window.wm_attributes("-topmost", True)
     window.configure(bg="#2c3e50")  # 专业深色背景
+    bridge = TkBridge(window)
 
     # 顶部状态区域
     status_frame = tk.Frame(window, bg="#2c3e50", height=50)
@@ -313,7 +315,7 @@ def dashboard(loop):
     file_frame = tk.Frame(button_container, bg="#2c3e50", relief="raised", borderwidth=2)
     file_frame.pack(fill=tk.X, pady=5)
 
-    file_btn = tk.Button(file_frame, text="📁", command=open_current_caption,
+    file_btn = tk.Button(file_frame, text="📁", command=lambda: runtime.submit(open_current_caption()),
                          **button_style)
     file_btn.pack(fill=tk.X, padx=5)
 
@@ -326,7 +328,7 @@ def dashboard(loop):
     stop_frame = tk.Frame(button_container, bg="#2c3e50", relief="raised", borderwidth=2)
     stop_frame.pack(fill=tk.X, pady=5)
 
-    stop_btn = tk.Button(stop_frame, text="■", command=lambda: asyncio.run(close_all(window)),
+    stop_btn = tk.Button(stop_frame, text="■", command=lambda: runtime.submit(close_all(window)),
                          **button_style)
     stop_btn.pack(fill=tk.X, padx=5)
 
@@ -359,24 +361,21 @@ def dashboard(loop):
     window.bind("<ButtonRelease-1>", stop_move)
     window.bind("<B1-Motion>", do_move)
 
-    # 异步事件循环
-    def poll_loop():
-        try:
-            if pending_tasks:
-                asyncio.run_coroutine_threadsafe(process_pending_tasks(), loop)
-        except Exception as e:
-            print(f"❌ 任务处理错误: {str(e)}")
-        window.after(100, poll_loop)
-
-    # 主事件循环
-    poll_loop()
+    # 主事件循环；异步任务在 runtime 线程中运行，不需要定时驱动
     window.mainloop()
+    bridge.close()
 
 def main():
     """主程序入口"""
+    global runtime
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
     print("SaveLiveCaptions - Professional Vertical Control")
-    loop = asyncio.new_event_loop()
-    dashboard(loop)
+    runtime = AsyncRuntime().start()
+    try:
+        dashboard()
+    finally:
+        runtime.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,13 +4,16 @@ import os
 import tkinter as tk
 import tkinter.messagebox as msgbox
 import asyncio
-from datetime import datetime
+from function.appender import get_appender, flush_appenders, close_appender
+from function.runtime import AsyncRuntime, TkBridge
 
 # 全局变量
 current_filename = ""
 hook_task = None
 current_state = 'STOPPED'  # 状态: STOPPED, RECORDING, PAUSED
 pending_tasks = []  # 待处理的异步任务
+runtime = None  # 在独立线程中运行的事件循环
+bridge = None  # 事件循环线程向 Tk 主线程发送界面更新
 start_btn = None
 pause_btn = None
 resume_btn = None
@@ -20,19 +23,10 @@ stop_btn = None
 def safe_save_caption(filename, caption, is_pause_marker=False):
     """安全保存字幕"""
     try:
-        timestamp = datetime.now().strftime("%H:%M:%S")
-
-        # 读取现有内容
-        existing_content = ""
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                existing_content = f.read()
-
-        # 添加新内容
-        with open(filename, 'a', encoding='utf-8') as f:
-            if existing_content and not existing_content.endswith('\n'):
-                f.write('\n')
-            f.write(f"[{timestamp}] {caption}\n")
+        # 持久的追加器：文件只打开一次，结尾换行状态记录在内存中，不再每次读取整个文件
+        get_appender(filename).write_caption(caption)
+        if is_pause_marker:
+            flush_appenders()
 
         print(f"✅ 保存字幕: {caption}")
         return True
@@ -83,7 +77,7 @@ async def hook_current_events(filename, exit_event):
         while not exit_event.is_set():
             if sentence_index < len(sentences):
                 caption = sentences[sentence_index]
-                await safe_save_caption(filename, caption)
+                safe_save_caption(filename, caption)
                 sentence_index += 1
             await asyncio.sleep(3)  # 每3秒保存一个测试字幕
 
@@ -134,8 +128,7 @@ def start_new_recording():
             pass
 
     try:
-        import asyncio
-        hook_task = asyncio.create_task(hook_current_events(current_filename, asyncio.Event()))
+        hook_task = runtime.submit(hook_current_events(current_filename, asyncio.Event()))
         update_ui_state('RECORDING')
         print("✅ 开始录制")
         return hook_task
@@ -149,8 +142,9 @@ def pause_recording():
 
     if current_state == 'RECORDING':
         try:
-            # 在poll_loop中处理异步任务
+            # 交给事件循环线程处理
             pending_tasks.append(('pause', current_filename))
+            runtime.submit(process_pending_tasks())
             update_ui_state('PAUSED')
             print("✅ 暂停已暂停")
             return True
@@ -167,8 +161,9 @@ def resume_recording():
 
     if current_state == 'PAUSED':
         try:
-            # 在poll_loop中处理异步任务
+            # 交给事件循环线程处理
             pending_tasks.append(('resume', current_filename))
+            runtime.submit(process_pending_tasks())
             update_ui_state('RECORDING')
             print("✅ 录制已继续")
             return True
@@ -185,6 +180,7 @@ def open_current_caption():
 
     if current_filename and os.path.exists(current_filename):
         try:
+            flush_appenders()
             os.startfile(current_filename)
             print(f"✅ 已打开字幕文件: {current_filename}")
             return True
@@ -205,9 +201,9 @@ async def close_all(window):
         except:
             pass
 
-    await safe_save_caption(current_filename, "录制结束", is_pause_marker=True)
-    window.destroy()
-    sys.exit(0)
+    safe_save_caption(current_filename, "录制结束", is_pause_marker=True)
+    close_appender()
+    bridge.post(window.destroy)
 
 def create_tooltip(widget, text):
     """为控件创建工具提示"""
@@ -240,20 +236,20 @@ async def process_pending_tasks():
                 hook_task.cancel()
 
             hook_task = asyncio.create_task(hook_current_events(filename, asyncio.Event()))
-            update_ui_state('RECORDING')
+            bridge.post(update_ui_state, 'RECORDING')
             print("✅ 开始录制")
 
         elif task_type == 'pause':
-            update_ui_state('PAUSED')
+            bridge.post(update_ui_state, 'PAUSED')
             print("✅ 暂停已暂停")
 
         elif task_type == 'resume':
-            update_ui_state('RECORDING')
+            bridge.post(update_ui_state, 'RECORDING')
             print("✅ 录制已继续")
 
 def dashboard():
     """主界面 - 简单垂直控制栏样式"""
-    global start_btn, pause_btn, resume_btn, file_btn, stop_btn
+    global start_btn, pause_btn, resume_btn, file_btn, stop_btn, bridge
 
     # 创建主窗口
     window = tk.Tk()
@@ -262,6 +258,7 @@ def dashboard():
     window.overrideredirect(True)
     window.wm_attributes("-topmost", True)
     window.configure(bg="#f0f0f0")  # 白色背景
+    bridge = TkBridge(window)
 
     # 顶部状态区域
     status_frame = tk.Frame(window, bg="#f0f0f0", height=50)
@@ -313,7 +310,7 @@ def dashboard():
     create_tooltip(file_btn, "预览文件")
 
     # 停止按钮 - 黑色实心方形
-    stop_btn = tk.Button(control_frame, text="■", command=lambda: asyncio.run(close_all(window)),
+    stop_btn = tk.Button(control_frame, text="■", command=lambda: runtime.submit(close_all(window)),
                        **button_style)
     stop_btn.pack(fill=tk.X, pady=8)
     create_tooltip(stop_btn, "停止并退出")
@@ -342,23 +339,19 @@ def dashboard():
     window.bind("<ButtonRelease-1>", stop_move)
     window.bind("<B1-Motion>", do_move)
 
-    # 异步事件循环
-    def poll_loop():
-        try:
-            if pending_tasks:
-                asyncio.run(process_pending_tasks())
-        except Exception as e:
-            print(f"❌ 任务处理错误: {str(e)}")
-        window.after(100, poll_loop)
-
-    # 主事件循环
-    poll_loop()
+    # 主事件循环；异步任务在 runtime 线程中运行，不需要定时驱动
     window.mainloop()
+    bridge.close()
 
 def main():
     """主程序入口"""
+    global runtime
     print("SaveLiveCaptions - Professional Vertical Control")
-    dashboard()
+    runtime = AsyncRuntime().start()
+    try:
+        dashboard()
+    finally:
+        runtime.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""无界面录制入口，不导入 Tk，不创建窗口
+
+用法（在 src 目录下运行）:
+    python -m savelivecaptions record [--output-dir DIR] [--duration SECONDS]
+    python -m savelivecaptions record --replay snapshots.jsonl [--speed 1.0]
+    python -m savelivecaptions record --save-snapshots snapshots.jsonl
+    python -m savelivecaptions record --synthetic 600 [--speed 0] [--language zh]
+    python -m savelivecaptions record --control [ADDRESS]
+    python -m savelivecaptions record --rotate-minutes 60 [--rotate-mb 5] [--rotate-sentences 5000]
+    python -m savelivecaptions record --metrics [127.0.0.1:47801] [--metrics-json FILE] [--log-level debug]
+    python -m savelivecaptions serve [--control ADDRESS] [--output-dir DIR]
+    python -m savelivecaptions ctl [--control ADDRESS] start|pause|resume|flush|stop|status|stream|metrics
+    python -m savelivecaptions ctl stream --json [--maxsize N] [--policy drop_oldest]
+    python -m savelivecaptions index [DIR_OR_FILE ...] [--db FILE]
+    python -m savelivecaptions search "exact phrase" [--from 2026-10-13] [--to "2026-10-13 18:00"]
+
+SIGINT / SIGTERM 停止并写入最终文件；POSIX 上 SIGUSR1 暂停，SIGUSR2 继续。
+--replay 回放 RecordingCaptionSource 记录的快照，--synthetic 使用合成会话，
+播放完毕后自动停止。--speed 0 表示不等待，尽快播放。
+--save-snapshots 把读到的每个窗口文本另外记录到文件（Live Captions 也可以），之后用 --replay 重现。
+--control 同时打开本机控制接口（见 function.control）；serve 只打开控制接口，
+由客户端决定何时开始和停止录制，收到 SIGINT / SIGTERM 时停止录制并退出。
+--rotate-* 把长时间的录制按时长、大小或句子数分成 *_partNNN_captions.txt，
+分段清单写在 *_manifest.jsonl 中。
+--index 在录制的同时把新句子加入全文索引（默认是保存目录中的 captions-index.db）；
+index 增量索引已有的 *_captions.txt，search 按词组（引号）、前缀（词尾 *）和时间范围搜索。
+--metrics 启用指标并在本机提供 Prometheus 文本格式（/metrics）和 JSON（/metrics.json），
+--metrics-json 每 --metrics-interval 秒把 JSON 快照写入文件；都不指定时不计时也不计数。
+运行日志写到 stderr，--log-level debug 时包括每个保存的句子。
+ctl 是对应的命令行客户端，stream 持续打印新保存的句子，--json 时每行原样输出一个 JSON 事件，
+可以直接接到索引、翻译等下游程序。
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import json
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from function.recorder import RecordingSession
+from function.save import Rotation, default_save_dir
+from function.index import TranscriptIndex, LiveIndexer, INDEX_NAME
+from function import metrics
+from function.metrics import MetricsServer, SnapshotWriter, SNAPSHOT_INTERVAL
+from function.control import ControlServer, default_address, open_connection, encode, COMMANDS, STREAM_QUEUE_SIZE
+from function.bus import POLICIES, DROP_OLDEST
+from function.source import (ReplayCaptionSource, SyntheticCaptionSource, UIACaptionSource,
+                             RecordingCaptionSource, load_snapshots)
+
+
+def build_source(args):
+    """根据命令行参数创建字幕来源，None 表示使用 Live Captions"""
+    speed = args.speed or None
+    source = None
+    if args.replay:
+        source = ReplayCaptionSource(load_snapshots(args.replay), speed=speed)
+    elif args.synthetic:
+        source = SyntheticCaptionSource(args.synthetic, speed=speed, language=args.language)
+    if args.save_snapshots:
+        source = RecordingCaptionSource(source or UIACaptionSource(), args.save_snapshots)
+    return source
+
+
+def build_rotation(args):
+    """根据命令行参数创建分段条件，None 表示不分段"""
+    if not (args.rotate_minutes or args.rotate_mb or args.rotate_sentences):
+        return None
+    return Rotation(
+        seconds=args.rotate_minutes * 60 if args.rotate_minutes else None,
+        bytes=int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None,
+        sentences=args.rotate_sentences,
+    )
+
+
+def index_path(args):
+    """--index / --db 未指定文件时使用保存目录中的 captions-index.db"""
+    path = args.index if args.command in ("record", "serve") else args.db
+    return path or os.path.join(args.output_dir or default_save_dir(), INDEX_NAME)
+
+
+def open_live_index(args):
+    if args.index is None:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(index_path(args))), exist_ok=True)
+    return LiveIndexer(TranscriptIndex(index_path(args))).start()
+
+
+async def close_live_index(indexer):
+    if indexer is not None:
+        await indexer.close()
+        indexer.index.close()
+        print(f"Indexed {indexer.updates} sentences into {indexer.index.path}")
+
+
+async def open_metrics(args):
+    """--metrics / --metrics-json 启用指标，返回退出时需要关闭的导出器"""
+    exporters = []
+    if args.metrics is None and not args.metrics_json:
+        return exporters
+    metrics.enable()
+    if args.metrics is not None:
+        exporters.append(await MetricsServer(args.metrics).start())
+    if args.metrics_json:
+        exporters.append(SnapshotWriter(args.metrics_json, args.metrics_interval).start())
+    return exporters
+
+
+async def close_metrics(exporters):
+    for exporter in exporters:
+        await exporter.close()
+
+
+def install_signal_handlers(loop, handlers):
+    """注册信号处理；Windows 上事件循环不支持 add_signal_handler，改用 signal.signal"""
+    for name, callback in handlers.items():
+        signum = getattr(signal, name, None)
+        if signum is None:
+            continue
+        try:
+            loop.add_signal_handler(signum, callback)
+        except (NotImplementedError, RuntimeError):
+            signal.signal(signum, lambda *_, callback=callback: loop.call_soon_threadsafe(callback))
+
+
+async def record(args):
+    recorder = RecordingSession(args.output_dir, source_factory=lambda: build_source(args), rotation=build_rotation(args))
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+
+    def request(action, message):
+        async def run():
+            if await action():
+                print(message)
+        return lambda: asyncio.ensure_future(run())
+
+    install_signal_handlers(loop, {
+        "SIGINT": stop_requested.set,
+        "SIGTERM": stop_requested.set,
+        "SIGBREAK": stop_requested.set,
+        "SIGUSR1": request(recorder.pause, "Paused"),
+        "SIGUSR2": request(recorder.resume, "Resumed"),
+    })
+
+    exporters = await open_metrics(args)
+    server = await ControlServer(recorder, args.control).start() if args.control else None
+    indexer = open_live_index(args)
+    await recorder.start()
+    print(f"Recording to {recorder.filename} (pid {os.getpid()})")
+
+    waiters = [asyncio.ensure_future(stop_requested.wait()), asyncio.ensure_future(recorder.wait())]
+    if args.duration:
+        waiters.append(asyncio.ensure_future(asyncio.sleep(args.duration)))
+    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in waiters:
+        waiter.cancel()
+
+    await recorder.stop()
+    if server is not None:
+        await server.close()
+    await close_live_index(indexer)
+    await close_metrics(exporters)
+    if not recorder.capture.started:
+        print("Capture did not start: no caption source found", file=sys.stderr)
+        return 1
+    if os.path.exists(recorder.filename):
+        print(f"Saved {recorder.filename}")
+    elif recorder.store.manifest_filename and os.path.exists(recorder.store.manifest_filename):
+        print(f"Saved segments listed in {recorder.store.manifest_filename}")
+    else:
+        print("No captions were recorded")
+    return 0
+
+
+async def serve(args):
+    """只运行控制接口，录制由客户端的 start/stop 命令控制"""
+    recorder = RecordingSession(args.output_dir, source_factory=lambda: build_source(args), rotation=build_rotation(args))
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    install_signal_handlers(loop, {
+        "SIGINT": stop_requested.set,
+        "SIGTERM": stop_requested.set,
+        "SIGBREAK": stop_requested.set,
+    })
+
+    exporters = await open_metrics(args)
+    server = await ControlServer(recorder, args.control).start()
+    indexer = open_live_index(args)
+    await stop_requested.wait()
+    if await recorder.stop():
+        print(f"Saved {recorder.filename}")
+    await server.close()
+    await close_live_index(indexer)
+    await close_metrics(exporters)
+
+
+async def ctl(args):
+    """发送一条命令并打印回复；stream 之后持续打印推送的句子，直到连接断开或 Ctrl+C"""
+    reader, writer = await open_connection(args.control)
+    try:
+        request = {"cmd": args.action, "id": 1}
+        if args.action == "stream":
+            request.update(maxsize=args.maxsize, policy=args.policy)
+        writer.write(encode(request))
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return 0
+            message = json.loads(line)
+            if "event" in message:
+                print(line.decode("utf-8").rstrip("\n") if args.json else message["text"], flush=True)
+                continue
+            if not message.get("ok"):
+                print(message.get("error"), file=sys.stderr)
+                return 1
+            if args.action != "stream":
+                print(json.dumps(message["result"], ensure_ascii=False, indent=2))
+                return 0
+    finally:
+        writer.close()
+
+
+def parse_when(value, end=False):
+    """解析 --from / --to：YYYY-MM-DD、YYYY-MM-DD HH:MM[:SS]、today、yesterday
+
+    只有日期的 --to 表示包含那一整天。
+    """
+    value = value.strip().lower()
+    day = time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+    if value in ("today", "yesterday"):
+        stamp = day - 86400 * (value == "yesterday")
+        return stamp + 86400 if end else stamp
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    try:
+        stamp = time.mktime(time.strptime(value, "%Y-%m-%d"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"cannot parse time: {value}")
+    return stamp + 86400 if end else stamp
+
+
+def index(args):
+    paths = args.paths or [args.output_dir or default_save_dir()]
+    start = time.perf_counter()
+    with TranscriptIndex(index_path(args)) as transcript_index:
+        added = transcript_index.update(paths)
+        if added:
+            transcript_index.optimize()
+        stats = transcript_index.stats()
+    print(f"Indexed {added} new sentences in {time.perf_counter() - start:.2f}s "
+          f"({stats['files']} files, {stats['lines']} sentences in {index_path(args)})")
+    return 0
+
+
+def search(args):
+    if not (args.query or args.start or args.end):
+        print("Give a query, --from or --to", file=sys.stderr)
+        return 2
+    with TranscriptIndex(index_path(args)) as transcript_index:
+        try:
+            results = transcript_index.search(args.query, args.start, args.end, args.limit, args.newest)
+        except Exception as e:
+            print(f"Invalid query: {e}", file=sys.stderr)
+            return 2
+    for stamp, path, text in results:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stamp))
+        print(f"{when}  {os.path.basename(path)}  {text}" if args.files else f"{when}  {text}")
+    return 0 if results else 1
+
+
+def add_source_arguments(parser):
+    parser.add_argument("--output-dir", help="directory for *_captions.txt (default: <project>/new)")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--replay", metavar="FILE", help="replay a recorded snapshot file")
+    source_group.add_argument("--synthetic", type=float, metavar="SECONDS", help="use a synthetic session")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--save-snapshots", metavar="FILE",
+                        help="also append every caption window read to FILE, for --replay later")
+    parser.add_argument("--language", choices=("en", "zh"), default="en")
+    parser.add_argument("--rotate-minutes", type=float, help="start a new file after this many minutes")
+    parser.add_argument("--rotate-mb", type=float, help="start a new file when it reaches this size")
+    parser.add_argument("--rotate-sentences", type=int, help="start a new file after this many sentences")
+    parser.add_argument("--index", nargs="?", const="", metavar="DB",
+                        help="add new sentences to a full-text index (default: <output dir>/" + INDEX_NAME + ")")
+    parser.add_argument("--metrics", nargs="?", const=metrics.DEFAULT_ADDRESS, metavar="ADDRESS",
+                        help="serve Prometheus metrics on localhost (default: %(const)s)")
+    parser.add_argument("--metrics-json", metavar="FILE", help="write a JSON metrics snapshot to FILE periodically")
+    parser.add_argument("--metrics-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="seconds between JSON snapshots (default: %(default)s)")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), default="info")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m savelivecaptions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record captions without a window")
+    add_source_arguments(record_parser)
+    record_parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    record_parser.add_argument("--control", nargs="?", const=default_address(), metavar="ADDRESS",
+                               help="also listen for control commands (default: %(const)s)")
+    record_parser.add_argument("--stats", action="store_true", help="print run time and peak memory on exit")
+
+    serve_parser = commands.add_parser("serve", help="wait for control commands and record on request")
+    add_source_arguments(serve_parser)
+    serve_parser.add_argument("--control", default=default_address(), metavar="ADDRESS",
+                              help="unix socket path or host:port (default: %(default)s)")
+    serve_parser.add_argument("--stats", action="store_true", help="print run time and peak memory on exit")
+
+    ctl_parser = commands.add_parser("ctl", help="send a command to a running recorder")
+    ctl_parser.add_argument("action", choices=COMMANDS)
+    ctl_parser.add_argument("--json", action="store_true", help="stream: print each event as a JSON line")
+    ctl_parser.add_argument("--maxsize", type=int, default=STREAM_QUEUE_SIZE, help="stream: server-side queue length")
+    ctl_parser.add_argument("--policy", choices=POLICIES, default=DROP_OLDEST,
+                            help="stream: what to drop when the queue is full")
+    ctl_parser.add_argument("--control", default=default_address(), metavar="ADDRESS",
+                            help="unix socket path or host:port (default: %(default)s)")
+
+    index_parser = commands.add_parser("index", help="add new lines of saved transcripts to the search index")
+    index_parser.add_argument("paths", nargs="*", metavar="DIR_OR_FILE", help="default: the output directory")
+    index_parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    index_parser.add_argument("--db", help="index file (default: <output dir>/" + INDEX_NAME + ")")
+
+    search_parser = commands.add_parser("search", help="search indexed transcripts")
+    search_parser.add_argument("query", nargs="?", help='words, "exact phrase", prefix*, or FTS5 syntax')
+    search_parser.add_argument("--from", dest="start", type=parse_when, help="YYYY-MM-DD[ HH:MM[:SS]], today, yesterday")
+    search_parser.add_argument("--to", dest="end", type=lambda v: parse_when(v, end=True), help="same formats")
+    search_parser.add_argument("--limit", type=int, default=50)
+    search_parser.add_argument("--newest", action="store_true", help="newest matches first")
+    search_parser.add_argument("--files", action="store_true", help="show the file of each match")
+    search_parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    search_parser.add_argument("--db", help="index file (default: <output dir>/" + INDEX_NAME + ")")
+
+    args = parser.parse_args(argv)
+    if args.command == "index":
+        return index(args)
+    if args.command == "search":
+        return search(args)
+    if args.command == "ctl":
+        try:
+            return asyncio.run(ctl(args))
+        except KeyboardInterrupt:
+            return 0
+        except OSError as e:
+            print(f"Cannot connect to {args.control}: {e}", file=sys.stderr)
+            return 1
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(message)s",
+                        datefmt="%H:%M:%S")
+    start = time.perf_counter()
+    code = asyncio.run(record(args) if args.command == "record" else serve(args))
+    if args.stats:
+        print(f"elapsed {time.perf_counter() - start:.2f}s")
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"peak RSS {peak / (1024 * 1024 if sys.platform == 'darwin' else 1024):.1f} MiB")
+        except ImportError:
+            pass
+    return code or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())